@@ -8,7 +8,6 @@ load_dotenv()
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-import gradio as gr
 
 from api.configs.config import (
     API_TITLE,
@@ -17,16 +16,25 @@ from api.configs.config import (
     CORS_ORIGINS,
     CORS_CREDENTIALS,
     CORS_METHODS,
-    CORS_HEADERS
+    CORS_HEADERS,
+    CORS_EXPOSE_HEADERS,
+    ADMISSION_ENABLED,
+    METRICS_ENABLED,
+    ENABLE_GRADIO
 )
-from api.configs.pcvk_config import DEVICE
+from api.configs.pcvk_config import DEVICE, SLIM_RUNTIME
 from api.routes.pcvk_route import router
 from api.routes.storage_public_route import public_storage_router
 from api.routes.storage_private_route import private_storage_router
 from api.routes.paddle_ocr_route import router as ocr_router
-from api.services.classification.gradio_interface import create_gradio_interface
+from api.routes.metrics_route import router as metrics_router
 from api.services.classification.model_loader import model_manager
+from api.services.classification.batching import micro_batcher
+from api.services.classification.jobs import job_runner
 from api.services.ocr_service import ocr_service
+from api.services.executor import stage_executor
+from api.services.metrics import PrometheusMiddleware
+from api.services.admission import AdmissionMiddleware
 
 
 @asynccontextmanager
@@ -38,11 +46,15 @@ async def lifespan(app: FastAPI):
     print("=" * 60)
     print(f"Starting {API_TITLE}")
     print(f"Device: {DEVICE}")
+    if SLIM_RUNTIME:
+        print("Slim runtime: ONNX only, Gradio disabled, OCR loaded on first request")
+    elif not ENABLE_GRADIO:
+        print("Gradio UI disabled (run app_gradio.py to serve it separately)")
     print("=" * 60)
     
-    # Load classification models
+    # Load classification models (already loaded and shared when forked by serve_prefork.py)
     # success = model_manager.load_all_models()
-    success = model_manager.load_model("mlpv2_auto-clahe")
+    success = model_manager.is_loaded("mlpv2_auto-clahe") or model_manager.load_model("mlpv2_auto-clahe")
     
     if not success:
         print("WARNING: No classification models were loaded!")
@@ -50,13 +62,17 @@ async def lifespan(app: FastAPI):
         loaded_models = model_manager.get_loaded_models()
         print(f"Successfully loaded {len(loaded_models)} classification model(s): {loaded_models}")
     
-    # Load OCR model
-    print("-" * 60)
-    ocr_success = ocr_service.load_model()
-    if ocr_success:
-        print("OCR model loaded successfully")
-    else:
-        print("WARNING: OCR model failed to load!")
+    # Load OCR model (imports paddle, deferred to the first OCR request in the slim runtime)
+    if not SLIM_RUNTIME:
+        print("-" * 60)
+        ocr_success = ocr_service.load_model()
+        if ocr_success:
+            print("OCR model loaded successfully")
+        else:
+            print("WARNING: OCR model failed to load!")
+    
+    # Asynchronous jobs, including the ones interrupted by the last shutdown
+    await job_runner.start()
     
     print("=" * 60)
     
@@ -64,9 +80,12 @@ async def lifespan(app: FastAPI):
     
     # Shutdown
     print("Shutting down API...")
+    await job_runner.shutdown()
+    await micro_batcher.shutdown()
     print("Unloading models...")
     model_manager.unload_all_models()
     ocr_service.unload_model()
+    stage_executor.shutdown()
     print("Shutdown complete")
 
 
@@ -85,6 +104,12 @@ def create_app() -> FastAPI:
         lifespan=lifespan
     )
     
+    # Concurrency limits and bounded wait queues for predict, batch-predict and OCR.
+    # The last middleware added runs outermost: admission goes first so CORS wraps
+    # its 429/503 responses and answers preflights, and metrics still count refusals
+    if ADMISSION_ENABLED:
+        app.add_middleware(AdmissionMiddleware)
+    
     # Add CORS middleware
     app.add_middleware(
         CORSMiddleware,
@@ -92,16 +117,26 @@ def create_app() -> FastAPI:
         allow_credentials=CORS_CREDENTIALS,
         allow_methods=CORS_METHODS,
         allow_headers=CORS_HEADERS,
+        expose_headers=CORS_EXPOSE_HEADERS,
     )
     
+    # Request rate, errors, in-flight and latency per route for all routers
+    if METRICS_ENABLED:
+        app.add_middleware(PrometheusMiddleware)
+        app.include_router(metrics_router)
+    
     app.include_router(router, prefix="/api")
     app.include_router(ocr_router, prefix="/api")
     app.include_router(public_storage_router, prefix="/api")
     app.include_router(private_storage_router, prefix="/api")
     
-    # Create and mount Gradio app at root
-    gradio_app = create_gradio_interface()
-    app = gr.mount_gradio_app(app, gradio_app, path="/")
+    # Create and mount Gradio app at root (gradio is only imported when mounted)
+    if ENABLE_GRADIO and not SLIM_RUNTIME:
+        import gradio as gr
+        from api.services.classification.gradio_interface import create_gradio_interface
+        
+        gradio_app = create_gradio_interface()
+        app = gr.mount_gradio_app(app, gradio_app, path="/")
     
     return app
 
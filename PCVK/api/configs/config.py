@@ -2,6 +2,8 @@
 Configuration settings for the FastAPI application
 """
 
+import os
+
 # API configuration
 API_TITLE = "Vegetable Classification API"
 API_DESCRIPTION = "API untuk klasifikasi sayuran menggunakan MLP dengan ekstraksi fitur"
@@ -11,8 +13,79 @@ API_VERSION = "1.0.0"
 SERVER_HOST = "0.0.0.0"
 SERVER_PORT = 8000
 
+# Gradio UI: mounted at / by the API unless disabled (always off with SLIM_RUNTIME),
+# or run as its own process with app_gradio.py
+ENABLE_GRADIO = os.getenv("ENABLE_GRADIO", "true").lower() == "true"
+GRADIO_SERVER_HOST = os.getenv("GRADIO_SERVER_HOST", "0.0.0.0")
+GRADIO_SERVER_PORT = int(os.getenv("GRADIO_SERVER_PORT", "7860"))
+
+# Pre-fork launcher (serve_prefork.py): models loaded once in the parent, shared by the workers
+PREFORK_WORKERS = int(os.getenv("PREFORK_WORKERS", str(os.cpu_count() or 1)))
+PREFORK_MODELS = [m.strip() for m in os.getenv("PREFORK_MODELS", "mlpv2_auto-clahe").split(",") if m.strip()]
+PREFORK_MEMORY_REPORT_SECONDS = float(os.getenv("PREFORK_MEMORY_REPORT_SECONDS", "300"))  # 0 = only at startup
+
 # CORS configuration
 CORS_ORIGINS = ["*"] 
 CORS_CREDENTIALS = True
 CORS_METHODS = ["*"]
 CORS_HEADERS = ["*"]
+# Response headers browsers may read besides the CORS-safelisted ones
+CORS_EXPOSE_HEADERS = ["Retry-After"]
+
+# Executor configuration for CPU-bound work, per stage
+# preprocess: decode, segmentation, feature extraction (thread or process)
+# inference: model forward passes (thread only, models live in this process)
+# ocr: PaddleOCR inference (thread only)
+# loader: model loading (thread only)
+# jobs: preprocessing of asynchronous job images (thread only), kept small so batch work
+#       does not compete with interactive requests for the preprocess pool
+EXECUTOR_STAGES = {
+    "preprocess": {
+        "kind": os.getenv("EXECUTOR_PREPROCESS_KIND", "thread").lower(),
+        "workers": int(os.getenv("EXECUTOR_PREPROCESS_WORKERS", str(min(os.cpu_count() or 1, 8)))),
+    },
+    "inference": {
+        "kind": "thread",
+        "workers": int(os.getenv("EXECUTOR_INFERENCE_WORKERS", "2")),
+    },
+    "ocr": {
+        "kind": "thread",
+        "workers": int(os.getenv("EXECUTOR_OCR_WORKERS", "1")),
+    },
+    "loader": {
+        "kind": "thread",
+        "workers": int(os.getenv("EXECUTOR_LOADER_WORKERS", "2")),
+    },
+    "jobs": {
+        "kind": "thread",
+        "workers": int(os.getenv("EXECUTOR_JOBS_WORKERS", "1")),
+    },
+}
+
+# Admission control for expensive routes: per route class, requests run up to "concurrency"
+# at a time, up to "queue" more wait at most "queue_timeout" seconds; beyond that the
+# request is refused with 429 (queue full) or 503 (waited too long) and a Retry-After header
+ADMISSION_ENABLED = os.getenv("ADMISSION_ENABLED", "true").lower() == "true"
+ADMISSION_LIMITS = {
+    "predict": {
+        "paths": ["/api/pcvk/predict", "/api/pcvk/ensemble"],
+        "concurrency": int(os.getenv("ADMISSION_PREDICT_CONCURRENCY", str(2 * EXECUTOR_STAGES["preprocess"]["workers"]))),
+        "queue": int(os.getenv("ADMISSION_PREDICT_QUEUE", "32")),
+        "queue_timeout": float(os.getenv("ADMISSION_PREDICT_QUEUE_TIMEOUT", "5")),
+    },
+    "batch": {
+        "paths": ["/api/pcvk/batch-predict"],
+        "concurrency": int(os.getenv("ADMISSION_BATCH_CONCURRENCY", "2")),
+        "queue": int(os.getenv("ADMISSION_BATCH_QUEUE", "4")),
+        "queue_timeout": float(os.getenv("ADMISSION_BATCH_QUEUE_TIMEOUT", "10")),
+    },
+    "ocr": {
+        "paths": ["/api/ocr/recognize"],
+        "concurrency": int(os.getenv("ADMISSION_OCR_CONCURRENCY", str(2 * EXECUTOR_STAGES["ocr"]["workers"]))),
+        "queue": int(os.getenv("ADMISSION_OCR_QUEUE", "8")),
+        "queue_timeout": float(os.getenv("ADMISSION_OCR_QUEUE_TIMEOUT", "10")),
+    },
+}
+
+# Prometheus metrics exported at /metrics
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
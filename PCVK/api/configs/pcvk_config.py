@@ -1,5 +1,4 @@
 import os
-import torch
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -11,8 +10,11 @@ _MODEL_BASE_DIR = os.path.join(
     "models",
 )
 
+# Slim runtime: onnxruntime/NumPy/OpenCV only, torch is never imported (implies PREFER_ONNX)
+SLIM_RUNTIME = os.getenv("SLIM_RUNTIME", "false").lower() == "true"
+
 # ONNX preference from environment
-PREFER_ONNX = os.getenv("PREFER_ONNX", "false").lower() == "true"
+PREFER_ONNX = SLIM_RUNTIME or os.getenv("PREFER_ONNX", "false").lower() == "true"
 
 # PyTorch model paths
 MODEL_PATHS = {
@@ -29,9 +31,74 @@ ONNX_MODEL_PATHS = {
     "efficientnetv2": os.path.join(_MODEL_BASE_DIR, "classification", "efficientnetv2.onnx"),
 }
 
+# Folded NumPy weights for the MLPs (scripts/mlp_numpy_parity.py --save), load without torch
+NUMPY_MODEL_PATHS = {
+    "mlpv2": os.path.join(_MODEL_BASE_DIR, "classification", "mlpv2.npz"),
+    "mlpv2_auto-clahe": os.path.join(_MODEL_BASE_DIR, "classification", "mlpv2_auto-clahe.npz"),
+}
+
+# Runtime for the MLPs when not served by ONNX: torch or numpy (BatchNorm folded, lib.model_v2_numpy),
+# opt in to numpy after checking parity with scripts/mlp_numpy_parity.py
+MLP_ENGINE = os.getenv("MLP_ENGINE", "torch").lower()
+
+# INT8-quantized ONNX variants written by scripts/pth_to_onnx.py --quantize
+QUANTIZED_ONNX_MODEL_PATHS = {
+    model_type: os.path.splitext(path)[0] + ".int8.onnx"
+    for model_type, path in {**ONNX_MODEL_PATHS, "u2netp": MODEL_PATHS["u2netp"]}.items()
+}
+
+# ONNX precision to load: fp32 or int8 (falls back to fp32 if the int8 file is missing)
+ONNX_PRECISION = os.getenv("ONNX_PRECISION", "fp32").lower()
+
+# ONNX Runtime session tuning
+# Threads per session for one operator (0 = ONNX Runtime default, all physical cores)
+ONNX_INTRA_OP_THREADS = int(os.getenv("ONNX_INTRA_OP_THREADS", "0"))
+# Threads used to run independent graph nodes, only used with ONNX_EXECUTION_MODE=parallel
+ONNX_INTER_OP_THREADS = int(os.getenv("ONNX_INTER_OP_THREADS", "0"))
+# sequential or parallel
+ONNX_EXECUTION_MODE = os.getenv("ONNX_EXECUTION_MODE", "sequential").lower()
+# Sessions per model so concurrent requests do not share one session,
+# keep POOL_SIZE * INTRA_OP_THREADS at or below the number of cores
+ONNX_SESSION_POOL_SIZE = int(os.getenv("ONNX_SESSION_POOL_SIZE", "1"))
+# Bind preallocated input/output buffers for fixed shapes instead of allocating per call
+ONNX_USE_IOBINDING = os.getenv("ONNX_USE_IOBINDING", "true").lower() == "true"
+
+
+def get_onnx_model_path(model_type: str) -> str:
+    """
+    Path of the ONNX model to load for a model type, honouring ONNX_PRECISION
+
+    Args:
+        model_type: Model type (mlpv2, mlpv2_auto-clahe, efficientnetv2, u2netp)
+
+    Returns:
+        Path to the INT8 variant if requested and present, otherwise the fp32 model
+    """
+    fp32_path = ONNX_MODEL_PATHS.get(model_type, MODEL_PATHS.get(model_type))
+
+    if ONNX_PRECISION == "int8":
+        int8_path = QUANTIZED_ONNX_MODEL_PATHS.get(model_type)
+        if int8_path is not None and os.path.exists(int8_path):
+            return int8_path
+        print(f"INT8 model for {model_type} not found at {int8_path}, using fp32")
+
+    return fp32_path
+
+
 CLASS_NAMES = ["Sayur Akar", "Sayur Buah", "Sayur Bunga", "Sayur Daun", "Sayur Polong"]
 
-DEVICE = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+
+
+def _detect_device():
+    """PyTorch device, "cpu" in the slim runtime where torch is not available"""
+    if SLIM_RUNTIME:
+        return "cpu"
+    
+    import torch
+    return torch.device("cuda" if torch.cuda.is_available() else "cpu")
+
+
+DEVICE = _detect_device()
 
 # Validation
 VALID_SEGMENTATION_METHODS = ["hsv", "grabcut", "adaptive", "u2netp", "none"]
@@ -39,3 +106,61 @@ VALID_MODEL_TYPES = list(MODEL_PATHS.keys())
 
 # Feature extraction
 NUM_FEATURES = 44  # Total features extracted
+
+# Decode JPEGs at a reduced scale (1/2, 1/4, 1/8) close to the 224x224 input size
+SCALED_JPEG_DECODE = os.getenv("SCALED_JPEG_DECODE", "true").lower() == "true"
+
+# Micro-batching of concurrent forward passes (per model type)
+MICRO_BATCH_ENABLED = os.getenv("MICRO_BATCH_ENABLED", "true").lower() == "true"
+MICRO_BATCH_MAX_SIZE = int(os.getenv("MICRO_BATCH_MAX_SIZE", "8"))
+MICRO_BATCH_MAX_WAIT_MS = float(os.getenv("MICRO_BATCH_MAX_WAIT_MS", "5"))
+
+# Confidence-gated cascade (model_type=cascade): the first model answers unless its top-class
+# confidence or its margin over the runner-up is below the threshold, then the second model does
+CASCADE_MODEL_TYPE = "cascade"
+CASCADE_FIRST_MODEL = os.getenv("CASCADE_FIRST_MODEL", "mlpv2_auto-clahe")
+CASCADE_SECOND_MODEL = os.getenv("CASCADE_SECOND_MODEL", "efficientnetv2")
+CASCADE_MIN_CONFIDENCE = float(os.getenv("CASCADE_MIN_CONFIDENCE", "0.8"))
+CASCADE_MIN_MARGIN = float(os.getenv("CASCADE_MIN_MARGIN", "0.3"))
+
+# Models combined by /ensemble when the request does not name them
+ENSEMBLE_MODELS = [
+    m.strip() for m in os.getenv("ENSEMBLE_MODELS", "mlpv2,mlpv2_auto-clahe,efficientnetv2").split(",") if m.strip()
+]
+
+# Images of a streamed /batch-predict processed concurrently (bounds memory for large uploads)
+BATCH_STREAM_CONCURRENCY = int(os.getenv("BATCH_STREAM_CONCURRENCY", "8"))
+
+# Results buffered per live WebSocket connection before processing waits for the client to read
+WS_LIVE_SEND_QUEUE_SIZE = max(1, int(os.getenv("WS_LIVE_SEND_QUEUE_SIZE", "2")))
+
+# Prediction result cache (keyed by image content hash + prediction parameters)
+PREDICTION_CACHE_SIZE = int(os.getenv("PREDICTION_CACHE_SIZE", "1024"))  # 0 disables the cache
+PREDICTION_CACHE_TTL_SECONDS = float(os.getenv("PREDICTION_CACHE_TTL_SECONDS", "3600"))  # 0 for no expiry
+
+# Stage caches for the MLP front half (segmented/enhanced 224x224 image and 44-d feature vector)
+SEGMENTATION_CACHE_SIZE = int(os.getenv("SEGMENTATION_CACHE_SIZE", "128"))  # ~150 KB per entry
+FEATURE_CACHE_SIZE = int(os.getenv("FEATURE_CACHE_SIZE", "4096"))
+STAGE_CACHE_TTL_SECONDS = float(os.getenv("STAGE_CACHE_TTL_SECONDS", "3600"))
+
+# Memory budget for resident models (PyTorch, ONNX, U2Net-P session, OCR), 0 for unlimited
+# Least recently used models are evicted when loading a new one would exceed it
+MODEL_MEMORY_BUDGET_MB = float(os.getenv("MODEL_MEMORY_BUDGET_MB", "0"))
+
+# CPU execution of the PyTorch EfficientNetV2 (lib.model_effnet.optimize_for_cpu_inference):
+# jit (TorchScript freeze + oneDNN fusion), compile (torch.compile) or none (eager).
+# Opt in only after scripts/benchmark_effnet_cpu.py passes its parity check
+TORCH_CPU_OPTIMIZE = os.getenv("TORCH_CPU_OPTIMIZE", "none").lower()
+
+# Number of recent samples per pipeline stage kept for the /timings percentiles
+TIMING_WINDOW_SIZE = int(os.getenv("TIMING_WINDOW_SIZE", "1000"))
+
+# Asynchronous jobs (/jobs): SQLite store and uploaded images under JOBS_DIR, survive restarts
+JOBS_DIR = os.getenv("JOBS_DIR", os.path.join(os.path.dirname(_MODEL_BASE_DIR), "data", "jobs"))
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "1"))  # Jobs processed concurrently per API process, 0 disables
+JOB_MAX_IMAGES = int(os.getenv("JOB_MAX_IMAGES", "1000"))
+JOB_MAX_WAIT_SECONDS = float(os.getenv("JOB_MAX_WAIT_SECONDS", "60"))  # Upper bound for long-polling
+# Running jobs without progress for this long are requeued (crashed or restarted worker)
+JOB_STALE_SECONDS = float(os.getenv("JOB_STALE_SECONDS", "300"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))  # Claims before an interrupted job is failed
+JOB_RETENTION_HOURS = float(os.getenv("JOB_RETENTION_HOURS", "24"))  # Finished jobs are deleted after this
@@ -15,6 +15,8 @@ class PredictionResponse(BaseModel):
     segmentation_method: Optional[str]
     apply_brightness_contrast: bool
     prediction_time_ms: float
+    timings: Optional[Dict[str, float]] = None  # Per-stage durations in ms, if requested
+    answered_by: Optional[str] = None  # Model that answered, for model_type=cascade
 
 
 class HealthResponse(BaseModel):
@@ -37,6 +39,9 @@ class ModelInfo(BaseModel):
     """Information about a single model"""
 
     loaded: bool
+    runtime: Optional[str] = None  # pytorch, onnx or numpy
+    load_time_ms: Optional[float] = None
+    resident_bytes: Optional[int] = None
     architecture: Optional[str] = None
     hidden_layers: Optional[str] = None
     dropout: Optional[Union[float, str]] = None
@@ -49,6 +54,8 @@ class ModelsInfoResponse(BaseModel):
     available_models: List[str]
     total_models: int
     models: Dict[str, ModelInfo]
+    resident_bytes: Dict[str, int] = {}  # Includes u2netp and ocr when resident
+    memory_budget_bytes: int = 0  # 0 means unlimited
 
 
 class BatchPredictionResult(PredictionResponse):
@@ -64,6 +71,23 @@ class BatchPredictionResponse(BaseModel):
     total_time_ms: float
 
 
+class BatchPredictionStreamRecord(BatchPredictionResult):
+    """NDJSON record for one image of a streamed batch prediction"""
+
+    type: str = "result"
+    index: int  # Position of the file in the upload
+
+
+class BatchPredictionStreamSummary(BaseModel):
+    """Final NDJSON record of a streamed batch prediction"""
+
+    type: str = "summary"
+    total: int
+    succeeded: int
+    failed: int
+    total_time_ms: float
+
+
 class UnloadModelResponse(BaseModel):
     """Response model for unload model endpoint"""
 
@@ -89,6 +113,7 @@ class WebSocketPredictionResponse(BaseModel):
     has_segmentation_image: bool = (
         False  # Indicates if binary segmentation image will follow
     )
+    timings: Optional[Dict[str, float]] = None  # Per-stage durations in ms, if requested
 
 
 class WebSocketErrorResponse(BaseModel):
@@ -96,6 +121,7 @@ class WebSocketErrorResponse(BaseModel):
 
     type: str = "error"
     message: str
+    retry_after: Optional[int] = None  # Seconds, set when the server is overloaded
 
 
 class WebSocketStatusResponse(BaseModel):
@@ -103,3 +129,93 @@ class WebSocketStatusResponse(BaseModel):
 
     type: str = "status"
     message: str
+
+
+class CacheStats(BaseModel):
+    """Size and hit/miss counters of a single cache"""
+
+    size: int
+    max_size: int
+    ttl_seconds: float
+    hits: int
+    misses: int
+    hit_rate: float
+
+
+class CacheStatsResponse(BaseModel):
+    """Response model for cache stats endpoint"""
+
+    caches: Dict[str, CacheStats]
+
+
+class StageTimingStats(BaseModel):
+    """Latency statistics of a single pipeline stage"""
+
+    count: int
+    total_ms: float
+    mean_ms: float
+    p50_ms: float
+    p95_ms: float
+    p99_ms: float
+    max_ms: float
+
+
+class TimingStatsResponse(BaseModel):
+    """Response model for timings endpoint"""
+
+    window_size: int
+    stages: Dict[str, StageTimingStats]
+
+
+class JobStatusResponse(BaseModel):
+    """Status and progress of an asynchronous classification job"""
+
+    job_id: str
+    status: str  # queued, running, completed, failed
+    model_type: str
+    segmentation_used: bool
+    segmentation_method: Optional[str] = None
+    apply_brightness_contrast: bool
+    total: int
+    completed: int
+    failed: int
+    error: Optional[str] = None
+    created_at: float  # Unix timestamps
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+
+
+class JobResultsResponse(BaseModel):
+    """Results of an asynchronous classification job, partial while it is running"""
+
+    job_id: str
+    status: str
+    results: List[BatchPredictionResult]
+
+
+class EnsembleModelResult(BaseModel):
+    """Prediction of a single ensemble member"""
+
+    model_type: str
+    predicted_class: str
+    confidence: float
+    all_confidences: Dict[str, float]
+    weight: float
+    cached: bool
+
+
+class EnsemblePredictionResponse(BaseModel):
+    """Response model for ensemble prediction endpoint"""
+
+    filename: str
+    predicted_class: str
+    confidence: float
+    all_confidences: Dict[str, float]  # Weighted mean of the member probabilities
+    models: List[EnsembleModelResult]
+    agreement: float  # Share of members whose top class is the fused top class
+    device: str
+    segmentation_used: bool
+    segmentation_method: Optional[str]
+    apply_brightness_contrast: bool
+    prediction_time_ms: float
+    timings: Optional[Dict[str, float]] = None  # Per-stage durations in ms, if requested
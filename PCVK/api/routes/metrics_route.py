@@ -0,0 +1,17 @@
+"""
+Prometheus metrics route
+"""
+
+from fastapi import APIRouter
+from fastapi.responses import Response
+
+from api.services.metrics import CONTENT_TYPE_LATEST, render_metrics
+
+# Create router, served at /metrics (no /api prefix) where Prometheus expects it
+router = APIRouter(tags=["Metrics"])
+
+
+@router.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Export metrics in the Prometheus text format"""
+    return Response(content=render_metrics(), media_type=CONTENT_TYPE_LATEST)
@@ -6,6 +6,7 @@ import io
 from api.models.ocr_models import OCRResult, OCRResponse, OCRHealthResponse
 from api.services.ocr_service import ocr_service
 from api.configs.ocr_config import OCR_CONFIG
+from api.services.executor import stage_executor
 
 
 # Create router
@@ -16,9 +17,15 @@ router = APIRouter(prefix="/ocr", tags=["OCR"])
 async def ocr_health_check():
     """OCR health check endpoint"""
     model_loaded = ocr_service.is_loaded()
+    if model_loaded:
+        status = "healthy"
+    elif ocr_service.is_available():
+        status = "not_loaded"
+    else:
+        status = "not_installed"
 
     return OCRHealthResponse(
-        status="healthy" if model_loaded else "not_loaded",
+        status=status,
         model_loaded=model_loaded,
         detection_model=OCR_CONFIG["text_detection_model_name"],
         recognition_model=OCR_CONFIG["text_recognition_model_name"],
@@ -38,6 +45,10 @@ async def recognize_text(
     Returns:
         OCR results with detected text, confidence scores, and bounding boxes
     """
+    # The slim image ships without PaddleOCR unless built with WITH_OCR=true
+    if not ocr_service.is_available():
+        raise HTTPException(status_code=503, detail="OCR is not installed on this server")
+
     # Validate file type
     if not file.content_type.startswith("image/"):
         raise HTTPException(status_code=400, detail="File must be an image")
@@ -50,8 +61,8 @@ async def recognize_text(
         image_bytes = await file.read()
         image = Image.open(io.BytesIO(image_bytes))
 
-        # Perform OCR using service
-        ocr_detections = ocr_service.perform_ocr(image)
+        # Perform OCR using service, off the event loop
+        ocr_detections = await stage_executor.run("ocr", ocr_service.perform_ocr, image)
 
         # Process results
         results = []
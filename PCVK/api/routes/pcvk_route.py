@@ -2,15 +2,17 @@
 API route handlers
 """
 
+import asyncio
 import os
 import time
 import json
 import cv2
 from fastapi import APIRouter, File, UploadFile, HTTPException, Query, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
 from PIL import Image
 import io
 import numpy as np
-from typing import List
+from typing import Awaitable, Callable, List, Optional, Tuple
 
 from api.models.pcvk_models import (
     PredictionResponse,
@@ -20,19 +22,56 @@ from api.models.pcvk_models import (
     ModelInfo,
     BatchPredictionResponse,
     BatchPredictionResult,
+    BatchPredictionStreamRecord,
+    BatchPredictionStreamSummary,
     UnloadModelResponse,
     WebSocketPredictionResponse,
     WebSocketErrorResponse,
-    WebSocketStatusResponse
+    WebSocketStatusResponse,
+    CacheStats,
+    CacheStatsResponse,
+    StageTimingStats,
+    TimingStatsResponse,
+    JobStatusResponse,
+    JobResultsResponse,
+    EnsembleModelResult,
+    EnsemblePredictionResponse
 )
 from api.configs.pcvk_config import (
     CLASS_NAMES,
     DEVICE,
     MODEL_PATHS,
-    VALID_SEGMENTATION_METHODS
+    VALID_SEGMENTATION_METHODS,
+    BATCH_STREAM_CONCURRENCY,
+    WS_LIVE_SEND_QUEUE_SIZE,
+    JOB_MAX_IMAGES,
+    JOB_MAX_WAIT_SECONDS,
+    CASCADE_MODEL_TYPE,
+    CASCADE_FIRST_MODEL,
+    ENSEMBLE_MODELS
 )
 from api.services.classification.model_loader import model_manager
-from api.services.classification.inference import predict_image
+from api.services.classification.inference import (
+    predict_batch,
+    prepare_model_input_from_bytes,
+    segmentation_degraded
+)
+from api.services.classification.batching import micro_batcher
+from api.services.classification import ws_codec
+from api.services.classification.jobs import job_runner
+from api.services.classification.cascade import predict_cascade
+from api.services.classification.ensemble import predict_ensemble
+from api.services.classification.cache import (
+    prediction_cache,
+    segmentation_cache,
+    feature_cache,
+    prediction_cache_key,
+    hash_image_bytes
+)
+from api.services.classification.timing import timing_aggregator
+from api.services.metrics import record_prediction, record_dropped_frame, record_cascade_answer
+from api.services.executor import stage_executor
+from api.services.admission import admission_controller, AdmissionRejected
 
 
 # Create router
@@ -69,6 +108,9 @@ async def get_models_info():
         
         info_dict = {
             "loaded": model_loaded,
+            "runtime": model_manager.get_model_type(model_type),
+            "load_time_ms": model_manager.load_durations_ms.get(model_type),
+            "resident_bytes": model_manager.resident_bytes.get(model_type),
         }
         
         if model_type == "mlpv2":
@@ -92,7 +134,30 @@ async def get_models_info():
     return ModelsInfoResponse(
         available_models=model_manager.get_loaded_models(),
         total_models=len(MODEL_PATHS),
-        models=models_info
+        models=models_info,
+        resident_bytes=dict(model_manager.resident_bytes),
+        memory_budget_bytes=model_manager.memory_budget_bytes
+    )
+
+
+@router.get("/cache", response_model=CacheStatsResponse)
+async def get_cache_stats():
+    """Get size and hit/miss counters of the prediction and stage caches"""
+    return CacheStatsResponse(
+        caches={
+            "prediction": CacheStats(**prediction_cache.stats()),
+            "segmentation": CacheStats(**segmentation_cache.stats()),
+            "features": CacheStats(**feature_cache.stats()),
+        }
+    )
+
+
+@router.get("/timings", response_model=TimingStatsResponse)
+async def get_timings():
+    """Get per-stage latency statistics (decode, resize, segmentation, features, forward, ...)"""
+    return TimingStatsResponse(
+        window_size=timing_aggregator.window_size,
+        stages={stage: StageTimingStats(**stats) for stage, stats in timing_aggregator.stats().items()}
     )
 
 
@@ -101,8 +166,11 @@ async def predict(
     file: UploadFile = File(..., description="Image file to classify"),
     use_segmentation: bool = Query(True, description="Whether to use segmentation"),
     seg_method: str = Query("u2netp", description="Segmentation method: hsv, grabcut, adaptive, u2netp, none"),
-    model_type: str = Query("mlpv2_auto-clahe", description="Model type to use: mlpv2, mlpv2_auto-clahe, efficientnetv2"),
-    apply_brightness_contrast: bool = Query(True, description="Apply brightness and contrast enhancement (CLAHE)")
+    model_type: str = Query("mlpv2_auto-clahe", description="Model type to use: mlpv2, mlpv2_auto-clahe, efficientnetv2, cascade"),
+    apply_brightness_contrast: bool = Query(True, description="Apply brightness and contrast enhancement (CLAHE)"),
+    include_timings: bool = Query(False, description="Include per-stage timings (ms) in the response"),
+    cascade_min_confidence: Optional[float] = Query(None, ge=0, le=1, description="Cascade: escalate below this top-class confidence"),
+    cascade_min_margin: Optional[float] = Query(None, ge=0, le=1, description="Cascade: escalate below this top-two margin")
 ):
     """
     Predict vegetable class from image
@@ -111,20 +179,23 @@ async def predict(
         file: Image file (JPG, PNG, etc.)
         use_segmentation: Whether to apply segmentation
         seg_method: Segmentation method (hsv, grabcut, adaptive, u2netp, none)
-        model_type: Type of model to use for prediction 
+        model_type: Type of model to use for prediction, or cascade to run the MLP first and
+            escalate uncertain images to EfficientNetV2 (answered_by tells which one answered)
+        include_timings: Whether to return the per-stage latency breakdown
+        cascade_min_confidence: Overrides CASCADE_MIN_CONFIDENCE for this request
+        cascade_min_margin: Overrides CASCADE_MIN_MARGIN for this request
     
     Returns:
         Prediction results with confidence scores
     """
-    # Load model if not already loaded
-    if not model_manager.is_loaded(model_type):
-        print(f"Model {model_type} not loaded, loading now...")
-        success = model_manager.load_model(model_type)
-        if not success:
-            raise HTTPException(
-                status_code=503,
-                detail=f"Failed to load model '{model_type}'"
-            )
+    is_cascade = model_type == CASCADE_MODEL_TYPE
+    
+    # Load model if not already loaded (the cascade loads its second tier only when escalating)
+    if not await model_manager.ensure_loaded_async(CASCADE_FIRST_MODEL if is_cascade else model_type):
+        raise HTTPException(
+            status_code=503,
+            detail=f"Failed to load model '{model_type}'"
+        )
     
     # Validate file type
     if not file.content_type.startswith("image/"):
@@ -143,26 +214,61 @@ async def predict(
         
         # Read image
         image_bytes = await file.read()
-        image = Image.open(io.BytesIO(image_bytes))
-        
-        # Get model
-        model = model_manager.get_model(model_type)
-        is_onnx = model_manager.get_model_type(model_type) == 'onnx'
         
-        # Perform prediction
-        predicted_class, confidence_value, all_confidences, _ = predict_image(
-            model=model,
-            image=image,
-            use_segmentation=use_segmentation,
-            seg_method=seg_method,
-            apply_brightness_contrast=apply_brightness_contrast,
-            model_type=model_type,
-            return_segmented_image=False,
-            is_onnx=is_onnx
+        # Re-submitted photos are answered from the result cache
+        image_hash = hash_image_bytes(image_bytes)
+        cache_key = prediction_cache_key(
+            image_hash, model_type, seg_method, use_segmentation, apply_brightness_contrast
         )
+        cached = None if is_cascade else prediction_cache.get(cache_key)
+        answered_by = None
+        
+        if is_cascade:
+            # Every tier goes through the prediction cache on its own
+            timings = {}
+            prediction, answered_by, from_cache = await predict_cascade(
+                image_bytes,
+                use_segmentation=use_segmentation,
+                seg_method=seg_method,
+                apply_brightness_contrast=apply_brightness_contrast,
+                min_confidence=cascade_min_confidence,
+                min_margin=cascade_min_margin,
+                image_hash=image_hash,
+                timings=timings
+            )
+            predicted_class, confidence_value, all_confidences = prediction
+            if from_cache:
+                cached = prediction
+            record_cascade_answer(answered_by)
+        elif cached is not None:
+            predicted_class, confidence_value, all_confidences = cached
+            timings = {}
+        else:
+            # Decode, segmentation and feature extraction off the event loop
+            model_input, _, timings = await stage_executor.run(
+                "preprocess",
+                prepare_model_input_from_bytes,
+                image_bytes,
+                use_segmentation=use_segmentation,
+                seg_method=seg_method,
+                apply_brightness_contrast=apply_brightness_contrast,
+                model_type=model_type,
+                image_hash=image_hash
+            )
+            
+            # Forward pass, batched with concurrent requests for the same model
+            predicted_class, confidence_value, all_confidences = await micro_batcher.submit(
+                model_type, model_input, timings=timings
+            )
+            # A segmentation fallback is not the requested method, keep it out of the cache
+            if not segmentation_degraded(timings):
+                prediction_cache.set(cache_key, (predicted_class, confidence_value, all_confidences))
         
         # Calculate prediction time
         prediction_time_ms = (time.time() - start_time) * 1000
+        timings["total"] = prediction_time_ms
+        timing_aggregator.record(timings)
+        record_prediction(model_type, seg_method if use_segmentation else None, timings, cached=cached is not None)
         
         return PredictionResponse(
             filename=file.filename,
@@ -174,7 +280,9 @@ async def predict(
             segmentation_used=use_segmentation,
             segmentation_method=seg_method if use_segmentation else None,
             apply_brightness_contrast=apply_brightness_contrast,
-            prediction_time_ms=prediction_time_ms
+            prediction_time_ms=prediction_time_ms,
+            timings=timings if include_timings else None,
+            answered_by=answered_by
         )
     
     except Exception as e:
@@ -184,13 +292,142 @@ async def predict(
         raise HTTPException(status_code=500, detail=f"Error during prediction: {str(e)}")
 
 
+@router.post("/ensemble", response_model=EnsemblePredictionResponse)
+async def predict_with_ensemble(
+    file: UploadFile = File(..., description="Image file to classify"),
+    models: Optional[str] = Query(None, description="Comma-separated model types (default: ENSEMBLE_MODELS)"),
+    weights: Optional[str] = Query(None, description="Comma-separated weights in the order of models (default: equal)"),
+    use_segmentation: bool = Query(True, description="Whether to use segmentation"),
+    seg_method: str = Query("u2netp", description="Segmentation method: hsv, grabcut, adaptive, u2netp, none"),
+    apply_brightness_contrast: bool = Query(True, description="Apply brightness and contrast enhancement (CLAHE)"),
+    include_timings: bool = Query(False, description="Include per-stage timings (ms) in the response")
+):
+    """
+    Predict vegetable class with several models and fuse their probabilities
+    
+    The image is decoded once, the segmented and enhanced image and the feature vector
+    are shared by the MLP variants, and the forward passes run concurrently.
+    
+    Args:
+        file: Image file (JPG, PNG, etc.)
+        models: Models to combine, ENSEMBLE_MODELS if not given
+        weights: Weight per model, equal weights if not given
+        use_segmentation: Whether to apply segmentation
+        seg_method: Segmentation method (hsv, grabcut, adaptive, u2netp, none)
+        apply_brightness_contrast: Whether to apply brightness and contrast enhancement
+        include_timings: Whether to return the per-stage latency breakdown
+    
+    Returns:
+        Fused prediction with the result of every model
+    """
+    model_types = [m.strip() for m in models.split(",") if m.strip()] if models else list(ENSEMBLE_MODELS)
+    model_types = list(dict.fromkeys(model_types))
+    
+    invalid = [m for m in model_types if m not in MODEL_PATHS]
+    if not model_types or invalid:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid ensemble models {invalid}. Must be a subset of: {list(MODEL_PATHS.keys())}"
+        )
+    
+    if weights:
+        try:
+            weight_values = [float(w) for w in weights.split(",")]
+        except ValueError:
+            raise HTTPException(status_code=400, detail="weights must be comma-separated numbers")
+        if len(weight_values) != len(model_types) or any(w < 0 for w in weight_values) or sum(weight_values) <= 0:
+            raise HTTPException(
+                status_code=400,
+                detail=f"weights must be {len(model_types)} non-negative numbers with a positive sum"
+            )
+    else:
+        weight_values = [1.0] * len(model_types)
+    
+    # Load models if not already loaded (fails fast with 503; a model evicted before its
+    # forward pass is reloaded by the micro-batcher)
+    loaded = await asyncio.gather(*(model_manager.ensure_loaded_async(m) for m in model_types))
+    failed = [m for m, ok in zip(model_types, loaded) if not ok]
+    if failed:
+        raise HTTPException(
+            status_code=503,
+            detail=f"Failed to load models {failed}"
+        )
+    
+    # Validate file type
+    if not file.content_type.startswith("image/"):
+        raise HTTPException(status_code=400, detail="File must be an image")
+    
+    # Validate segmentation method
+    if seg_method not in VALID_SEGMENTATION_METHODS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid segmentation method. Must be one of: {VALID_SEGMENTATION_METHODS}"
+        )
+    
+    try:
+        start_time = time.time()
+        image_bytes = await file.read()
+        
+        timings = {}
+        fused, predictions, cached_models = await predict_ensemble(
+            image_bytes,
+            model_types,
+            weights=weight_values,
+            use_segmentation=use_segmentation,
+            seg_method=seg_method,
+            apply_brightness_contrast=apply_brightness_contrast,
+            timings=timings
+        )
+        predicted_class, confidence_value, all_confidences = fused
+        
+        prediction_time_ms = (time.time() - start_time) * 1000
+        timings["total"] = prediction_time_ms
+        timing_aggregator.record(timings)
+        record_prediction("ensemble", seg_method if use_segmentation else None, timings, cached=all(cached_models.values()))
+        
+        model_results = [
+            EnsembleModelResult(
+                model_type=m,
+                predicted_class=predictions[m][0],
+                confidence=predictions[m][1],
+                all_confidences=predictions[m][2],
+                weight=w,
+                cached=cached_models[m]
+            )
+            for m, w in zip(model_types, weight_values)
+        ]
+        agreement = sum(r.predicted_class == predicted_class for r in model_results) / len(model_results)
+        
+        return EnsemblePredictionResponse(
+            filename=file.filename,
+            predicted_class=predicted_class,
+            confidence=confidence_value,
+            all_confidences=all_confidences,
+            models=model_results,
+            agreement=agreement,
+            device=str(DEVICE),
+            segmentation_used=use_segmentation,
+            segmentation_method=seg_method if use_segmentation else None,
+            apply_brightness_contrast=apply_brightness_contrast,
+            prediction_time_ms=prediction_time_ms,
+            timings=timings if include_timings else None
+        )
+    
+    except Exception as e:
+        print(f"Error during ensemble prediction: {e}")
+        import traceback
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=f"Error during ensemble prediction: {str(e)}")
+
+
 @router.post("/batch-predict", response_model=BatchPredictionResponse)
 async def batch_predict(
     files: List[UploadFile] = File(..., description="Multiple image files to classify"),
     use_segmentation: bool = Query(True, description="Whether to use segmentation"),
     seg_method: str = Query("u2netp", description="Segmentation method: hsv, grabcut, adaptive, u2netp, none"),
     model_type: str = Query("mlpv2_auto-clahe", description="Model type to use: mlpv2, mlpv2_auto-clahe, efficientnetv2"),
-    apply_brightness_contrast: bool = Query(True, description="Apply brightness and contrast enhancement (CLAHE)")
+    apply_brightness_contrast: bool = Query(True, description="Apply brightness and contrast enhancement (CLAHE)"),
+    stream: bool = Query(False, description="Stream results as NDJSON as soon as each image is done")
 ):
     """
     Predict multiple images at once
@@ -200,88 +437,213 @@ async def batch_predict(
         use_segmentation: Whether to apply segmentation
         seg_method: Segmentation method
         model_type: Type of model to use for prediction
+        stream: Return application/x-ndjson, one BatchPredictionStreamRecord per image in
+            completion order followed by a BatchPredictionStreamSummary
     
     Returns:
         List of prediction results
     """
     # Load model if not already loaded
-    if not model_manager.is_loaded(model_type):
-        print(f"Model {model_type} not loaded, loading now...")
-        success = model_manager.load_model(model_type)
-        if not success:
-            raise HTTPException(
-                status_code=503,
-                detail=f"Failed to load model '{model_type}'"
-            )
-    
-    # Get model
-    model = model_manager.get_model(model_type)
-    is_onnx = model_manager.get_model_type(model_type) == 'onnx'
+    if not await model_manager.ensure_loaded_async(model_type):
+        raise HTTPException(
+            status_code=503,
+            detail=f"Failed to load model '{model_type}'"
+        )
     
     # Start timing for total batch
     batch_start_time = time.time()
+    seg_label = seg_method if use_segmentation else None
     
-    results = []
+    def error_result(filename: str, error: str) -> BatchPredictionResult:
+        return BatchPredictionResult(
+            filename=filename,
+            error=error,
+            predicted_class="",
+            confidence=0.0,
+            all_confidences={},
+            device=str(DEVICE),
+            model_type=model_type,
+            segmentation_used=use_segmentation,
+            segmentation_method=seg_method if use_segmentation else None,
+            apply_brightness_contrast=apply_brightness_contrast,
+            prediction_time_ms=0.0
+        )
     
-    for file in files:
-        try:
-            # Validate file type
-            if not file.content_type.startswith("image/"):
-                results.append(BatchPredictionResult(
-                    filename=file.filename,
-                    error="File must be an image"
-                ))
-                continue
+    def success_result(filename: str, prediction, prediction_time_ms: float) -> BatchPredictionResult:
+        predicted_class, confidence_value, all_confidences = prediction
+        return BatchPredictionResult(
+            filename=filename,
+            predicted_class=predicted_class,
+            confidence=confidence_value,
+            all_confidences=all_confidences,
+            device=str(DEVICE),
+            model_type=model_type,
+            segmentation_used=use_segmentation,
+            segmentation_method=seg_method if use_segmentation else None,
+            apply_brightness_contrast=apply_brightness_contrast,
+            prediction_time_ms=prediction_time_ms
+        )
+    
+    async def prepare(content_type: str, read_bytes: Callable[[], Awaitable[bytes]]):
+        # Validate file type
+        if not content_type.startswith("image/"):
+            raise ValueError("File must be an image")
+        
+        pred_start_time = time.time()
+        image_bytes = await read_bytes()
+        image_hash = hash_image_bytes(image_bytes)
+        cache_key = prediction_cache_key(
+            image_hash, model_type, seg_method, use_segmentation, apply_brightness_contrast
+        )
+        cached = prediction_cache.get(cache_key)
+        if cached is not None:
+            return cache_key, None, cached, (time.time() - pred_start_time) * 1000, {}
+        
+        model_input, _, timings = await stage_executor.run(
+            "preprocess",
+            prepare_model_input_from_bytes,
+            image_bytes,
+            use_segmentation=use_segmentation,
+            seg_method=seg_method,
+            apply_brightness_contrast=apply_brightness_contrast,
+            model_type=model_type,
+            image_hash=image_hash
+        )
+        return cache_key, model_input, None, (time.time() - pred_start_time) * 1000, timings
+    
+    async def predict_streamed(
+        index: int,
+        filename: str,
+        content_type: str,
+        payloads: List[Optional[bytes]],
+        slots: asyncio.Semaphore
+    ):
+        async def take_payload() -> bytes:
+            # Drop the list's reference so the bytes are freed once this image is preprocessed
+            payload, payloads[index] = payloads[index], None
+            return payload
+        
+        async with slots:
+            try:
+                outcome = await prepare(content_type, take_payload)
+            except Exception as e:
+                return index, error_result(filename, str(e))
             
-            # Start timing for individual prediction
-            pred_start_time = time.time()
+            cache_key, model_input, cached, prediction_time_ms, timings = outcome
+            if cached is not None:
+                record_prediction(model_type, seg_label, {"total": prediction_time_ms}, cached=True)
+                return index, success_result(filename, cached, prediction_time_ms)
             
-            # Read and process image
-            image_bytes = await file.read()
-            image = Image.open(io.BytesIO(image_bytes))
+            # Forward passes of concurrent images are batched by the micro-batcher
+            forward_start_time = time.time()
+            try:
+                prediction = await micro_batcher.submit(model_type, model_input, timings=timings)
+            except Exception as e:
+                return index, error_result(filename, str(e))
             
-            # Perform prediction
-            predicted_class, confidence_value, all_confidences, _ = predict_image(
-                model=model,
-                image=image,
-                use_segmentation=use_segmentation,
-                seg_method=seg_method,
-                apply_brightness_contrast=apply_brightness_contrast,
-                model_type=model_type,
-                return_segmented_image=False,
+            if not segmentation_degraded(timings):
+                prediction_cache.set(cache_key, prediction)
+            prediction_time_ms += (time.time() - forward_start_time) * 1000
+            timings["total"] = prediction_time_ms
+            timing_aggregator.record(timings)
+            record_prediction(model_type, seg_label, timings)
+            return index, success_result(filename, prediction, prediction_time_ms)
+    
+    async def stream_results(uploads: List[Tuple[str, str]], payloads: List[Optional[bytes]]):
+        # Bounded concurrency keeps only a few decoded images in memory at a time
+        slots = asyncio.Semaphore(max(1, BATCH_STREAM_CONCURRENCY))
+        tasks = [
+            asyncio.create_task(predict_streamed(index, filename, content_type, payloads, slots))
+            for index, (filename, content_type) in enumerate(uploads)
+        ]
+        succeeded = 0
+        
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                index, result = await next_done
+                if result.error is None:
+                    succeeded += 1
+                record = BatchPredictionStreamRecord(index=index, **result.model_dump())
+                yield record.model_dump_json() + "\n"
+            
+            summary = BatchPredictionStreamSummary(
+                total=len(uploads),
+                succeeded=succeeded,
+                failed=len(uploads) - succeeded,
+                total_time_ms=(time.time() - batch_start_time) * 1000
+            )
+            yield summary.model_dump_json() + "\n"
+        finally:
+            # Client went away: stop work that has not finished yet
+            for task in tasks:
+                task.cancel()
+            payloads.clear()
+    
+    if stream:
+        # FastAPI closes uploaded files when this handler returns, before the body is
+        # streamed: read the bytes now and close each spooled file right away
+        uploads = []
+        payloads: List[Optional[bytes]] = []
+        for file in files:
+            uploads.append((file.filename, file.content_type))
+            payloads.append(await file.read())
+            await file.close()
+        
+        return StreamingResponse(stream_results(uploads, payloads), media_type="application/x-ndjson")
+    
+    # Decode, segment and extract features for all files concurrently
+    prepared = await asyncio.gather(
+        *(prepare(file.content_type, file.read) for file in files),
+        return_exceptions=True
+    )
+    
+    results: List[Optional[BatchPredictionResult]] = [None] * len(files)
+    ready = []
+    for index, (file, outcome) in enumerate(zip(files, prepared)):
+        if isinstance(outcome, Exception):
+            results[index] = error_result(file.filename, str(outcome))
+            continue
+        
+        cache_key, model_input, cached, preprocess_time_ms, timings = outcome
+        if cached is not None:
+            results[index] = success_result(file.filename, cached, preprocess_time_ms)
+            record_prediction(model_type, seg_label, {"total": preprocess_time_ms}, cached=True)
+        else:
+            ready.append((index, cache_key, model_input, preprocess_time_ms, timings))
+    
+    if ready:
+        try:
+            # One batched forward pass over all stacked model inputs
+            forward_start_time = time.time()
+            # The model may have been evicted (memory budget) while the batch was preprocessed
+            handle = await model_manager.acquire_async(model_type)
+            if handle is None:
+                raise RuntimeError(f"Failed to load model '{model_type}'")
+            model, runtime = handle
+            is_onnx = runtime == 'onnx'
+            predictions = await stage_executor.run(
+                "inference",
+                predict_batch,
+                model,
+                [model_input for _, _, model_input, _, _ in ready],
                 is_onnx=is_onnx
             )
+            forward_time_ms = (time.time() - forward_start_time) * 1000
             
-            # Calculate prediction time
-            prediction_time_ms = (time.time() - pred_start_time) * 1000
-            
-            results.append(BatchPredictionResult(
-                filename=file.filename,
-                predicted_class=predicted_class,
-                confidence=confidence_value,
-                all_confidences=all_confidences,
-                device=str(DEVICE),
-                model_type=model_type,
-                segmentation_used=use_segmentation,
-                segmentation_method=seg_method if use_segmentation else None,
-                apply_brightness_contrast=apply_brightness_contrast,
-                prediction_time_ms=prediction_time_ms
-            ))
+            for (index, cache_key, _, preprocess_time_ms, timings), prediction in zip(ready, predictions):
+                if not segmentation_degraded(timings):
+                    prediction_cache.set(cache_key, prediction)
+                results[index] = success_result(files[index].filename, prediction, preprocess_time_ms + forward_time_ms)
+                
+                # The forward pass is shared by the whole batch
+                timings["forward_batch"] = forward_time_ms
+                timings["total"] = preprocess_time_ms + forward_time_ms
+                timing_aggregator.record(timings)
+                record_prediction(model_type, seg_label, timings)
         
         except Exception as e:
-            results.append(BatchPredictionResult(
-                filename=file.filename,
-                error=str(e),
-                predicted_class="",
-                confidence=0.0,
-                all_confidences={},
-                device=str(DEVICE),
-                model_type=model_type,
-                segmentation_used=use_segmentation,
-                segmentation_method=seg_method if use_segmentation else None,
-                apply_brightness_contrast=apply_brightness_contrast,
-                prediction_time_ms=0.0
-            ))
+            for index, _, _, _, _ in ready:
+                results[index] = error_result(files[index].filename, str(e))
     
     # Calculate total batch time
     total_time_ms = (time.time() - batch_start_time) * 1000
@@ -289,6 +651,121 @@ async def batch_predict(
     return BatchPredictionResponse(results=results, total_time_ms=total_time_ms)
 
 
+def _job_status_response(job: dict) -> JobStatusResponse:
+    """Build the status response of a job row"""
+    params = job["params"]
+    return JobStatusResponse(
+        job_id=job["id"],
+        status=job["status"],
+        model_type=params["model_type"],
+        segmentation_used=params["use_segmentation"],
+        segmentation_method=params["seg_method"] if params["use_segmentation"] else None,
+        apply_brightness_contrast=params["apply_brightness_contrast"],
+        total=job["total"],
+        completed=job["completed"],
+        failed=job["failed"],
+        error=job["error"],
+        created_at=job["created_at"],
+        started_at=job["started_at"],
+        finished_at=job["finished_at"]
+    )
+
+
+@router.post("/jobs", response_model=JobStatusResponse, status_code=202)
+async def submit_job(
+    files: List[UploadFile] = File(..., description="Image files to classify"),
+    use_segmentation: bool = Query(True, description="Whether to use segmentation"),
+    seg_method: str = Query("u2netp", description="Segmentation method: hsv, grabcut, adaptive, u2netp, none"),
+    model_type: str = Query("mlpv2_auto-clahe", description="Model type to use: mlpv2, mlpv2_auto-clahe, efficientnetv2"),
+    apply_brightness_contrast: bool = Query(True, description="Apply brightness and contrast enhancement (CLAHE)")
+):
+    """
+    Queue images for asynchronous classification
+    
+    The images are stored with the job and processed in the background at lower
+    priority than interactive requests. Poll GET /jobs/{job_id} (optionally with
+    ?wait= to long-poll) and fetch GET /jobs/{job_id}/results.
+    
+    Args:
+        files: Image files
+        use_segmentation: Whether to apply segmentation
+        seg_method: Segmentation method
+        model_type: Type of model to use for prediction
+        apply_brightness_contrast: Whether to apply brightness and contrast enhancement
+    
+    Returns:
+        Status of the queued job
+    """
+    if model_type not in MODEL_PATHS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid model type. Must be one of: {list(MODEL_PATHS.keys())}"
+        )
+    if seg_method not in VALID_SEGMENTATION_METHODS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid segmentation method. Must be one of: {VALID_SEGMENTATION_METHODS}"
+        )
+    if len(files) > JOB_MAX_IMAGES:
+        raise HTTPException(status_code=413, detail=f"A job can contain at most {JOB_MAX_IMAGES} images")
+    for file in files:
+        if not (file.content_type or "").startswith("image/"):
+            raise HTTPException(status_code=400, detail=f"File '{file.filename}' must be an image")
+    
+    params = {
+        "model_type": model_type,
+        "seg_method": seg_method,
+        "use_segmentation": use_segmentation,
+        "apply_brightness_contrast": apply_brightness_contrast
+    }
+    job = await job_runner.submit(params, [(file.filename, file.file) for file in files])
+    return _job_status_response(job)
+
+
+@router.get("/jobs/{job_id}", response_model=JobStatusResponse)
+async def get_job(
+    job_id: str,
+    wait: float = Query(0, ge=0, description="Seconds to wait for the job to finish (long-poll)")
+):
+    """
+    Get the status of an asynchronous job
+    
+    Args:
+        job_id: Id returned by POST /jobs
+        wait: Long-poll up to this many seconds (capped at JOB_MAX_WAIT_SECONDS), returns early when the job finishes
+    
+    Returns:
+        Job status and progress
+    """
+    job = await job_runner.get(job_id, wait=min(wait, JOB_MAX_WAIT_SECONDS))
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job '{job_id}' not found")
+    return _job_status_response(job)
+
+
+@router.get("/jobs/{job_id}/results", response_model=JobResultsResponse)
+async def get_job_results(job_id: str):
+    """
+    Get the results of an asynchronous job
+    
+    Args:
+        job_id: Id returned by POST /jobs
+    
+    Returns:
+        Per-image results in upload order; only the processed images while the job is running
+    """
+    job = await job_runner.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job '{job_id}' not found")
+    
+    results = await job_runner.results(job_id)
+    return JobResultsResponse(
+        job_id=job_id,
+        status=job["status"],
+        results=[BatchPredictionResult(**result) for result in results]
+    )
+
+
 @router.post("/unload", response_model=UnloadModelResponse)
 async def unload_model(
     model_type: str = Query("", description="Model type to unload (mlpv2, mlpv2_auto-clahe, efficientnetv2). Empty to unload all")
@@ -349,7 +826,7 @@ async def websocket_predict(websocket: WebSocket):
     WebSocket endpoint for real-time predictions
     
     Protocol:
-    1. Client sends configuration as JSON text: {"use_segmentation": true, "seg_method": "u2netp", "model_type": "mlpv2_auto-clahe", "apply_brightness_contrast": true, "return_processed_image": false}
+    1. Client sends configuration as JSON text: {"use_segmentation": true, "seg_method": "u2netp", "model_type": "mlpv2_auto-clahe", "apply_brightness_contrast": true, "return_processed_image": false, "include_timings": false}
     2. Client sends image data as binary bytes
     3. Server responds with prediction results as JSON
     4. Optionally sends processed image as binary JPEG if return_processed_image is true and model is not efficientnetv2
@@ -361,7 +838,8 @@ async def websocket_predict(websocket: WebSocket):
         "seg_method": "u2netp",
         "model_type": "mlpv2_auto-clahe",
         "apply_brightness_contrast": True,
-        "return_processed_image": False
+        "return_processed_image": False,
+        "include_timings": False
     }
     
     # Buffer for chunked image data - using BytesIO for better performance
@@ -434,6 +912,8 @@ async def websocket_predict(websocket: WebSocket):
                                 config["apply_brightness_contrast"] = received_data["apply_brightness_contrast"]
                             if "return_processed_image" in received_data:
                                 config["return_processed_image"] = received_data["return_processed_image"]
+                            if "include_timings" in received_data:
+                                config["include_timings"] = received_data["include_timings"]
                             
                             await websocket.send_json(
                                 WebSocketStatusResponse(
@@ -473,20 +953,17 @@ async def websocket_predict(websocket: WebSocket):
                 
                 # Load model if not already loaded
                 model_type = config["model_type"]
-                if not model_manager.is_loaded(model_type):
-                    print(f"Model {model_type} not loaded, loading now...")
-                    success = model_manager.load_model(model_type)
-                    if not success:
-                        await websocket.send_json(
-                            WebSocketErrorResponse(
-                                message=f"Failed to load model '{model_type}'"
-                            ).model_dump()
-                        )
-                        continue
+                if not await model_manager.ensure_loaded_async(model_type):
+                    await websocket.send_json(
+                        WebSocketErrorResponse(
+                            message=f"Failed to load model '{model_type}'"
+                        ).model_dump()
+                    )
+                    continue
                 
-                # Decode image from bytes
+                # Validate image header before queueing the heavy work
                 try:
-                    image = Image.open(io.BytesIO(image_bytes))
+                    Image.open(io.BytesIO(image_bytes))
                 except Exception as e:
                     await websocket.send_json(
                         WebSocketErrorResponse(
@@ -495,27 +972,57 @@ async def websocket_predict(websocket: WebSocket):
                     )
                     continue
                 
-                # Get model
-                model = model_manager.get_model(model_type)
-                is_onnx = model_manager.get_model_type(model_type) == 'onnx'
-                
                 # Determine if we should return processed image
                 return_processed = config["return_processed_image"] and model_type != "efficientnetv2"
                 
-                # Perform prediction
-                predicted_class, confidence_value, all_confidences, processed_img = predict_image(
-                    model=model,
-                    image=image,
-                    use_segmentation=config["use_segmentation"],
-                    seg_method=config["seg_method"],
-                    apply_brightness_contrast=config["apply_brightness_contrast"],
-                    model_type=model_type,
-                    return_segmented_image=return_processed,
-                    is_onnx=is_onnx
+                # Cached results are only usable when no processed image is needed
+                image_hash = hash_image_bytes(image_bytes)
+                cache_key = prediction_cache_key(
+                    image_hash,
+                    model_type,
+                    config["seg_method"],
+                    config["use_segmentation"],
+                    config["apply_brightness_contrast"]
                 )
+                cached = None if return_processed else prediction_cache.get(cache_key)
+                processed_img = None
+                
+                if cached is not None:
+                    predicted_class, confidence_value, all_confidences = cached
+                    timings = {}
+                else:
+                    # Same bounded queue as /predict, refused frames get an error message
+                    async with admission_controller.admit("predict"):
+                        # Decode, segmentation and feature extraction off the event loop
+                        model_input, processed_img, timings = await stage_executor.run(
+                            "preprocess",
+                            prepare_model_input_from_bytes,
+                            image_bytes,
+                            use_segmentation=config["use_segmentation"],
+                            seg_method=config["seg_method"],
+                            apply_brightness_contrast=config["apply_brightness_contrast"],
+                            model_type=model_type,
+                            image_hash=image_hash,
+                            return_processed_image=return_processed
+                        )
+                    
+                        # Perform prediction
+                        predicted_class, confidence_value, all_confidences = await micro_batcher.submit(
+                            model_type, model_input, timings=timings
+                        )
+                        if not segmentation_degraded(timings):
+                            prediction_cache.set(cache_key, (predicted_class, confidence_value, all_confidences))
                 
                 # Calculate prediction time
                 prediction_time_ms = (time.time() - start_time) * 1000
+                timings["total"] = prediction_time_ms
+                timing_aggregator.record(timings)
+                record_prediction(
+                    model_type,
+                    config["seg_method"] if config["use_segmentation"] else None,
+                    timings,
+                    cached=cached is not None
+                )
                 
                 # Prepare response
                 response = WebSocketPredictionResponse(
@@ -528,7 +1035,8 @@ async def websocket_predict(websocket: WebSocket):
                     segmentation_method=config["seg_method"] if config["use_segmentation"] else None,
                     apply_brightness_contrast=config["apply_brightness_contrast"],
                     prediction_time_ms=prediction_time_ms,
-                    has_processed_image=return_processed and processed_img is not None
+                    has_processed_image=return_processed and processed_img is not None,
+                    timings=timings if config["include_timings"] else None
                 )
                 
                 # Send prediction response as JSON
@@ -569,6 +1077,13 @@ async def websocket_predict(websocket: WebSocket):
             except WebSocketDisconnect:
                 print("WebSocket client disconnected")
                 break
+            except AdmissionRejected as e:
+                await websocket.send_json(
+                    WebSocketErrorResponse(
+                        message=f"Server busy ({e.reason}), retry in {e.retry_after} s",
+                        retry_after=e.retry_after
+                    ).model_dump()
+                )
             except Exception as e:
                 print(f"Error during WebSocket prediction: {e}")
                 import traceback
@@ -585,3 +1100,290 @@ async def websocket_predict(websocket: WebSocket):
         print(f"WebSocket error: {e}")
         import traceback
         traceback.print_exc()
+
+
+@router.websocket("/ws/v2/predict")
+async def websocket_predict_v2(
+    websocket: WebSocket,
+    verbose: bool = Query(False, description="Also send JSON status messages (connected, processing)"),
+    live: bool = Query(False, description="Latest-frame-wins camera mode, stale frames are dropped")
+):
+    """
+    WebSocket endpoint for real-time predictions, binary protocol v2
+    
+    One binary request frame (header with request id, config and length, then the image)
+    is answered by exactly one binary result or error frame with the same request id.
+    Nothing else is sent unless the client connects with ?verbose=true. Frame layout is
+    documented in api/services/classification/ws_codec.py.
+    
+    With ?live=true only the most recent unprocessed frame is kept: frames arriving while
+    the previous one is processed replace each other, and results are live result frames
+    carrying the number of dropped frames.
+    """
+    await websocket.accept()
+    
+    try:
+        if verbose:
+            await websocket.send_json(
+                WebSocketStatusResponse(
+                    message=f"Connected. Protocol v{ws_codec.PROTOCOL_VERSION}"
+                            f"{' (live)' if live else ''}, send binary request frames."
+                ).model_dump()
+            )
+        
+        if live:
+            await _websocket_live_session(websocket)
+            return
+        
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                print("WebSocket v2 client disconnected")
+                break
+            
+            if message.get("text") is not None:
+                # Only JSON ping is understood on the text channel
+                try:
+                    if json.loads(message["text"]).get("ping"):
+                        await websocket.send_json({"pong": True})
+                        continue
+                except (json.JSONDecodeError, AttributeError):
+                    pass
+                await websocket.send_bytes(
+                    ws_codec.encode_error(0, ws_codec.ERROR_BAD_FRAME, "Expected a binary request frame")
+                )
+                continue
+            
+            frame = message.get("bytes")
+            if frame is None:
+                continue
+            
+            try:
+                request = ws_codec.decode_request(frame)
+            except ws_codec.ProtocolError as e:
+                await websocket.send_bytes(ws_codec.encode_error(e.request_id, e.code, str(e)))
+                continue
+            
+            if verbose:
+                await websocket.send_json(
+                    WebSocketStatusResponse(
+                        message=f"Processing request {request.request_id} ({len(request.image_bytes)} bytes)..."
+                    ).model_dump()
+                )
+            
+            await websocket.send_bytes(await _predict_v2_frame(request))
+    
+    except WebSocketDisconnect:
+        print("WebSocket v2 connection closed")
+    except Exception as e:
+        print(f"WebSocket v2 error: {e}")
+        import traceback
+        traceback.print_exc()
+
+
+async def _websocket_live_session(websocket: WebSocket):
+    """
+    Latest-frame-wins loop for a live v2 connection
+    
+    The receive loop only fills a single-slot mailbox, a processor task predicts whatever
+    frame is newest when it becomes free, and a sender task drains a bounded queue. A
+    client that reads slowly fills the queue, which stalls processing, so newer frames
+    keep replacing the slot instead of piling up.
+    
+    Args:
+        websocket: Accepted WebSocket connection
+    """
+    latest: Optional[ws_codec.PredictRequestFrame] = None
+    frame_ready = asyncio.Event()
+    dropped_frames = 0
+    send_queue: asyncio.Queue = asyncio.Queue(maxsize=WS_LIVE_SEND_QUEUE_SIZE)
+    
+    def send_control(message: dict):
+        # Pongs and protocol errors are skipped rather than blocking receive under backpressure
+        try:
+            send_queue.put_nowait(message)
+        except asyncio.QueueFull:
+            pass
+    
+    async def process():
+        nonlocal latest
+        while True:
+            await frame_ready.wait()
+            frame_ready.clear()
+            request, latest = latest, None
+            if request is None:
+                continue
+            result = await _predict_v2_frame(request, dropped_frames=dropped_frames)
+            await send_queue.put({"type": "websocket.send", "bytes": result})
+    
+    async def send():
+        while True:
+            await websocket.send(await send_queue.get())
+    
+    tasks = [asyncio.create_task(process()), asyncio.create_task(send())]
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                print(f"WebSocket v2 live client disconnected ({dropped_frames} frames dropped)")
+                break
+            
+            if message.get("text") is not None:
+                try:
+                    if json.loads(message["text"]).get("ping"):
+                        send_control({"type": "websocket.send", "text": json.dumps({"pong": True})})
+                        continue
+                except (json.JSONDecodeError, AttributeError):
+                    pass
+                send_control({
+                    "type": "websocket.send",
+                    "bytes": ws_codec.encode_error(0, ws_codec.ERROR_BAD_FRAME, "Expected a binary request frame")
+                })
+                continue
+            
+            frame = message.get("bytes")
+            if frame is None:
+                continue
+            
+            try:
+                request = ws_codec.decode_request(frame)
+            except ws_codec.ProtocolError as e:
+                send_control({"type": "websocket.send", "bytes": ws_codec.encode_error(e.request_id, e.code, str(e))})
+                continue
+            
+            # An unprocessed frame still in the slot is stale now
+            if latest is not None:
+                dropped_frames += 1
+                record_dropped_frame()
+            latest = request
+            frame_ready.set()
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def _predict_v2_frame(
+    request: ws_codec.PredictRequestFrame,
+    dropped_frames: Optional[int] = None
+) -> bytes:
+    """
+    Run one v2 request through the cache, preprocess stage and micro-batcher
+    
+    Args:
+        request: Decoded request frame
+        dropped_frames: Dropped frame count of a live connection, None otherwise
+    
+    Returns:
+        Encoded result or error frame
+    """
+    start_time = time.time()
+    model_type = request.model_type
+    is_cascade = model_type == CASCADE_MODEL_TYPE
+    
+    if not await model_manager.ensure_loaded_async(CASCADE_FIRST_MODEL if is_cascade else model_type):
+        return ws_codec.encode_error(
+            request.request_id, ws_codec.ERROR_MODEL_UNAVAILABLE, f"Failed to load model '{model_type}'"
+        )
+    
+    # Validate image header before queueing the heavy work
+    try:
+        Image.open(io.BytesIO(request.image_bytes))
+    except Exception as e:
+        return ws_codec.encode_error(
+            request.request_id, ws_codec.ERROR_INVALID_IMAGE, f"Invalid image data: {str(e)}"
+        )
+    
+    # The cascade does not keep the processed image of its tiers
+    return_processed = request.return_processed_image and model_type not in ("efficientnetv2", CASCADE_MODEL_TYPE)
+    escalated = False
+    
+    try:
+        # Cached results are only usable when no processed image is needed
+        image_hash = hash_image_bytes(request.image_bytes)
+        cache_key = prediction_cache_key(
+            image_hash,
+            model_type,
+            request.seg_method,
+            request.use_segmentation,
+            request.apply_brightness_contrast
+        )
+        cached = None if return_processed or is_cascade else prediction_cache.get(cache_key)
+        processed_img = None
+        
+        if is_cascade:
+            # Same bounded queue as /predict, refused frames get an ERROR_OVERLOADED frame
+            async with admission_controller.admit("predict"):
+                timings = {}
+                result, answered_by, from_cache = await predict_cascade(
+                    request.image_bytes,
+                    use_segmentation=request.use_segmentation,
+                    seg_method=request.seg_method,
+                    apply_brightness_contrast=request.apply_brightness_contrast,
+                    image_hash=image_hash,
+                    timings=timings
+                )
+                predicted_class, _, all_confidences = result
+                if from_cache:
+                    cached = result
+                escalated = answered_by != CASCADE_FIRST_MODEL
+                record_cascade_answer(answered_by)
+        elif cached is not None:
+            predicted_class, _, all_confidences = cached
+            timings = {}
+        else:
+            async with admission_controller.admit("predict"):
+                model_input, processed_img, timings = await stage_executor.run(
+                    "preprocess",
+                    prepare_model_input_from_bytes,
+                    request.image_bytes,
+                    use_segmentation=request.use_segmentation,
+                    seg_method=request.seg_method,
+                    apply_brightness_contrast=request.apply_brightness_contrast,
+                    model_type=model_type,
+                    image_hash=image_hash,
+                    return_processed_image=return_processed
+                )
+                result = await micro_batcher.submit(model_type, model_input, timings=timings)
+                if not segmentation_degraded(timings):
+                    prediction_cache.set(cache_key, result)
+                predicted_class, _, all_confidences = result
+        
+        # Processed image goes in the same frame, already BGR as cv2 expects
+        processed_bytes = None
+        if return_processed and processed_img is not None:
+            _, buffer = cv2.imencode('.jpg', processed_img)
+            processed_bytes = buffer.tobytes()
+        
+        prediction_time_ms = (time.time() - start_time) * 1000
+        timings["total"] = prediction_time_ms
+        timing_aggregator.record(timings)
+        record_prediction(
+            model_type,
+            request.seg_method if request.use_segmentation else None,
+            timings,
+            cached=cached is not None
+        )
+        
+        return ws_codec.encode_result(
+            request.request_id,
+            CLASS_NAMES.index(predicted_class),
+            [all_confidences.get(name, 0.0) for name in CLASS_NAMES],
+            prediction_time_ms,
+            cached=cached is not None,
+            processed_image=processed_bytes,
+            dropped_frames=dropped_frames,
+            escalated=escalated
+        )
+    
+    except AdmissionRejected as e:
+        return ws_codec.encode_error(
+            request.request_id, ws_codec.ERROR_OVERLOADED, f"Server busy ({e.reason}), retry in {e.retry_after} s"
+        )
+    except Exception as e:
+        print(f"Error during WebSocket v2 prediction: {e}")
+        import traceback
+        traceback.print_exc()
+        return ws_codec.encode_error(
+            request.request_id, ws_codec.ERROR_INTERNAL, f"Error during prediction: {str(e)}"
+        )
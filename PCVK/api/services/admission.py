@@ -0,0 +1,229 @@
+"""
+Admission control for expensive routes
+
+Segmentation, EfficientNetV2 and OCR requests are limited per route class: a fixed
+number run at once, a bounded number wait in FIFO order, and everything beyond is
+refused immediately with 429 (queue full) or, after waiting too long, 503. Both carry
+a Retry-After estimated from the recent service time, so a spike degrades into fast
+refusals instead of every request slowing down together.
+"""
+
+import asyncio
+import json
+import math
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Deque, Dict, List, Optional
+
+from api.configs.config import ADMISSION_ENABLED, ADMISSION_LIMITS
+from api.services.metrics import record_admission_state, record_admission_rejected
+
+# Weight of the newest request in the service time average
+SERVICE_TIME_SMOOTHING = 0.2
+
+# Bounds of the Retry-After header in seconds
+MIN_RETRY_AFTER_SECONDS = 1
+MAX_RETRY_AFTER_SECONDS = 60
+
+
+class AdmissionRejected(Exception):
+    """A request was refused by a limiter"""
+
+    def __init__(self, status_code: int, reason: str, retry_after: int):
+        super().__init__(reason)
+        self.status_code = status_code
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionLimiter:
+    """Concurrency limit with a bounded FIFO wait queue for one route class"""
+
+    def __init__(self, name: str, concurrency: int, queue: int, queue_timeout: float):
+        """
+        Args:
+            name: Route class, used as metric label
+            concurrency: Requests running at once
+            queue: Requests allowed to wait for a slot
+            queue_timeout: Seconds a request may wait before it is refused
+        """
+        self.name = name
+        self.concurrency = max(1, concurrency)
+        self.max_queue = max(0, queue)
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self._service_time = 1.0
+        self._publish()
+
+    @property
+    def queued(self) -> int:
+        """Requests waiting for a slot"""
+        return len(self._waiters)
+
+    def retry_after(self) -> int:
+        """Seconds until the current queue is expected to have drained"""
+        estimate = self._service_time * (self.queued + 1) / self.concurrency
+        return int(min(MAX_RETRY_AFTER_SECONDS, max(MIN_RETRY_AFTER_SECONDS, math.ceil(estimate))))
+
+    async def acquire(self) -> None:
+        """
+        Wait for a slot
+
+        Raises:
+            AdmissionRejected: 429 if the queue is full, 503 if no slot freed up within queue_timeout
+        """
+        if self.active < self.concurrency and not self._waiters:
+            self.active += 1
+            self._publish()
+            return
+
+        if len(self._waiters) >= self.max_queue:
+            record_admission_rejected(self.name, "queue_full")
+            raise AdmissionRejected(429, "queue_full", self.retry_after())
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        self._publish()
+        try:
+            # shield: a timeout must not cancel a slot that was handed over at the same moment
+            await asyncio.wait_for(asyncio.shield(waiter), self.queue_timeout)
+        except asyncio.TimeoutError:
+            if waiter.done():
+                # The slot was handed over as the timeout fired
+                return
+            waiter.cancel()
+            self._waiters.remove(waiter)
+            self._publish()
+            record_admission_rejected(self.name, "queue_timeout")
+            raise AdmissionRejected(503, "queue_timeout", self.retry_after())
+        except asyncio.CancelledError:
+            # Client gone while waiting: give up the place in the queue, or the slot if it arrived
+            if waiter.done():
+                self.release()
+            else:
+                waiter.cancel()
+                self._waiters.remove(waiter)
+                self._publish()
+            raise
+
+    def release(self, service_time: Optional[float] = None) -> None:
+        """
+        Free a slot, handing it to the longest-waiting request if any
+
+        Args:
+            service_time: Seconds the request held the slot, updates the Retry-After estimate
+        """
+        if service_time is not None:
+            self._service_time += SERVICE_TIME_SMOOTHING * (service_time - self._service_time)
+
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                self._publish()
+                return
+        self.active -= 1
+        self._publish()
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        """
+        Hold a slot for the duration of a block
+
+        Raises:
+            AdmissionRejected: See acquire
+        """
+        await self.acquire()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.release(time.perf_counter() - start)
+
+    def _publish(self) -> None:
+        record_admission_state(self.name, self.active, self.queued)
+
+
+class AdmissionController:
+    """Maps request paths to the limiter of their route class"""
+
+    def __init__(self, limits: Dict[str, Dict[str, Any]]):
+        """
+        Args:
+            limits: Route class -> {"paths", "concurrency", "queue", "queue_timeout"}
+        """
+        self.limiters: Dict[str, AdmissionLimiter] = {}
+        self._by_path: Dict[str, AdmissionLimiter] = {}
+        for name, limit in limits.items():
+            limiter = AdmissionLimiter(name, limit["concurrency"], limit["queue"], limit["queue_timeout"])
+            self.limiters[name] = limiter
+            for path in limit["paths"]:
+                self._by_path[path.rstrip("/")] = limiter
+
+    def limiter_for(self, path: str) -> Optional[AdmissionLimiter]:
+        """Limiter of a request path, None if the path is not admission-controlled"""
+        return self._by_path.get(path.rstrip("/"))
+
+    @asynccontextmanager
+    async def admit(self, route_class: str) -> AsyncIterator[None]:
+        """
+        Hold a slot of a route class for a block of work outside the HTTP middleware,
+        e.g. one WebSocket frame (no-op with ADMISSION_ENABLED=false or an unknown class)
+
+        Raises:
+            AdmissionRejected: The route class is overloaded
+        """
+        limiter = self.limiters.get(route_class) if ADMISSION_ENABLED else None
+        if limiter is None:
+            yield
+            return
+        async with limiter.slot():
+            yield
+
+
+class AdmissionMiddleware:
+    """ASGI middleware applying admission control to HTTP requests before the body is read"""
+
+    def __init__(self, app, controller: Optional["AdmissionController"] = None):
+        self.app = app
+        self.controller = controller or admission_controller
+
+    async def __call__(self, scope, receive, send):
+        limiter = None
+        # CORS preflights are cheap and must not take (or be refused) a slot
+        if scope["type"] == "http" and scope["method"] != "OPTIONS":
+            limiter = self.controller.limiter_for(scope["path"])
+        if limiter is None:
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            await limiter.acquire()
+        except AdmissionRejected as e:
+            await self._reject(send, limiter, e)
+            return
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            limiter.release(time.perf_counter() - start)
+
+    @staticmethod
+    async def _reject(send, limiter: AdmissionLimiter, rejection: AdmissionRejected) -> None:
+        body = json.dumps({
+            "detail": f"Server busy ({limiter.name}: {rejection.reason}), retry in {rejection.retry_after} s"
+        }).encode()
+        headers: List = [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            (b"retry-after", str(rejection.retry_after).encode()),
+        ]
+        await send({"type": "http.response.start", "status": rejection.status_code, "headers": headers})
+        await send({"type": "http.response.body", "body": body})
+
+
+# Global admission controller instance
+admission_controller = AdmissionController(ADMISSION_LIMITS)
@@ -0,0 +1,196 @@
+"""
+Dynamic micro-batching of forward passes
+"""
+
+import asyncio
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from api.configs.pcvk_config import MICRO_BATCH_ENABLED, MICRO_BATCH_MAX_SIZE, MICRO_BATCH_MAX_WAIT_MS
+from api.services.classification.model_loader import model_manager
+from api.services.classification.inference import predict_batch
+from api.services.executor import stage_executor
+
+
+class _PendingBatch:
+    """Requests waiting for the next forward pass of one model type"""
+
+    def __init__(self):
+        # (model_input, future, timings, enqueued_at)
+        self.items: List[Tuple[np.ndarray, asyncio.Future, Optional[Dict[str, float]], float]] = []
+        # Items taken by the worker and not resolved yet, failed if the worker dies
+        self.in_flight: List[Tuple[np.ndarray, asyncio.Future, Optional[Dict[str, float]], float]] = []
+        self.not_empty = asyncio.Event()
+        self.full = asyncio.Event()
+
+
+class MicroBatcher:
+    """
+    Holds concurrent requests per model type for a short window and runs them
+    as a single forward pass, resolving each caller with its own result
+    """
+
+    def __init__(self, max_batch_size: int = 8, max_wait_ms: float = 5.0, enabled: bool = True):
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait_s = max(0.0, max_wait_ms) / 1000.0
+        self.enabled = enabled and self.max_batch_size > 1
+        self._pending: Dict[str, _PendingBatch] = {}
+        self._workers: Dict[str, asyncio.Task] = {}
+
+    async def submit(
+        self,
+        model_type: str,
+        model_input: np.ndarray,
+        timings: Optional[Dict[str, float]] = None
+    ) -> Tuple[str, float, Dict[str, float]]:
+        """
+        Queue a prepared model input and wait for its prediction
+
+        Args:
+            model_type: Type of model to run
+            model_input: Output of prepare_model_input
+            timings: Optional dict receiving batch_wait and forward durations in milliseconds
+
+        Returns:
+            Tuple of (predicted_class, confidence, all_confidences)
+        """
+        if not self.enabled:
+            return (await self._run_batch(model_type, [model_input], [timings]))[0]
+
+        pending = self._get_pending(model_type)
+        future = asyncio.get_running_loop().create_future()
+        pending.items.append((model_input, future, timings, time.perf_counter()))
+        pending.not_empty.set()
+        if len(pending.items) >= self.max_batch_size:
+            pending.full.set()
+
+        return await future
+
+    def queue_depth(self, model_type: str) -> int:
+        """Number of requests waiting for a forward pass of the given model"""
+        pending = self._pending.get(model_type)
+        return len(pending.items) if pending is not None else 0
+
+    async def shutdown(self) -> None:
+        """Stop all batch workers"""
+        for task in self._workers.values():
+            task.cancel()
+        await asyncio.gather(*self._workers.values(), return_exceptions=True)
+        self._workers.clear()
+        self._pending.clear()
+
+    def _get_pending(self, model_type: str) -> _PendingBatch:
+        pending = self._pending.get(model_type)
+        if pending is None:
+            pending = _PendingBatch()
+            self._pending[model_type] = pending
+            self._start_worker(model_type, pending)
+        return pending
+
+    def _start_worker(self, model_type: str, pending: _PendingBatch) -> None:
+        task = asyncio.create_task(self._worker(model_type, pending))
+        task.add_done_callback(lambda done: self._on_worker_done(model_type, pending, done))
+        self._workers[model_type] = task
+
+    def _on_worker_done(self, model_type: str, pending: _PendingBatch, task: asyncio.Task) -> None:
+        """Fail the callers a stopped worker left behind and restart it unless shut down"""
+        if task.cancelled():
+            error: BaseException = RuntimeError("Micro-batcher stopped")
+        else:
+            error = task.exception() or RuntimeError(f"Micro-batch worker for '{model_type}' exited")
+
+        stranded = pending.in_flight + pending.items
+        pending.in_flight = []
+        pending.items.clear()
+        pending.not_empty.clear()
+        pending.full.clear()
+        for _, future, _, _ in stranded:
+            if not future.done():
+                future.set_exception(error)
+
+        if task.cancelled() or self._pending.get(model_type) is not pending:
+            return
+        print(f"Micro-batch worker for {model_type} died ({error!r}), failed {len(stranded)} request(s), restarting")
+        self._start_worker(model_type, pending)
+
+    async def _worker(self, model_type: str, pending: _PendingBatch) -> None:
+        while True:
+            await pending.not_empty.wait()
+
+            # Batch window opens with the first request and closes on timeout or when full
+            if len(pending.items) < self.max_batch_size and self.max_wait_s > 0:
+                try:
+                    await asyncio.wait_for(pending.full.wait(), timeout=self.max_wait_s)
+                except asyncio.TimeoutError:
+                    pass
+
+            batch = pending.items[:self.max_batch_size]
+            pending.in_flight = batch
+            del pending.items[:self.max_batch_size]
+            if len(pending.items) < self.max_batch_size:
+                pending.full.clear()
+            if not pending.items:
+                pending.not_empty.clear()
+
+            # Skip callers that went away while waiting
+            batch = [item for item in batch if not item[1].done()]
+            if not batch:
+                pending.in_flight = []
+                continue
+
+            started_at = time.perf_counter()
+            for _, _, timings, enqueued_at in batch:
+                if timings is not None:
+                    timings["batch_wait"] = (started_at - enqueued_at) * 1000
+
+            try:
+                results = await self._run_batch(
+                    model_type,
+                    [model_input for model_input, _, _, _ in batch],
+                    [timings for _, _, timings, _ in batch]
+                )
+            except Exception as e:
+                for _, future, _, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                pending.in_flight = []
+                continue
+
+            for (_, future, _, _), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+            pending.in_flight = []
+
+    async def _run_batch(
+        self,
+        model_type: str,
+        inputs: List[np.ndarray],
+        timings: List[Optional[Dict[str, float]]]
+    ) -> List[Tuple[str, float, Dict[str, float]]]:
+        # The model may have been evicted under the memory budget since the request arrived
+        handle = await model_manager.acquire_async(model_type)
+        if handle is None:
+            raise RuntimeError(f"Failed to load model '{model_type}'")
+
+        model, runtime = handle
+        is_onnx = runtime == 'onnx'
+        started_at = time.perf_counter()
+        results = await stage_executor.run("inference", predict_batch, model, inputs, is_onnx=is_onnx)
+
+        # Every sample of the batch shares the same forward pass
+        forward_ms = (time.perf_counter() - started_at) * 1000
+        for sample_timings in timings:
+            if sample_timings is not None:
+                sample_timings["forward"] = forward_ms
+
+        return results
+
+
+# Global micro-batcher instance
+micro_batcher = MicroBatcher(
+    max_batch_size=MICRO_BATCH_MAX_SIZE,
+    max_wait_ms=MICRO_BATCH_MAX_WAIT_MS,
+    enabled=MICRO_BATCH_ENABLED
+)
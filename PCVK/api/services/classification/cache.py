@@ -0,0 +1,167 @@
+"""
+In-process caches for prediction results and intermediate pipeline stages
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+from api.configs.pcvk_config import (
+    PREDICTION_CACHE_SIZE,
+    PREDICTION_CACHE_TTL_SECONDS,
+    SEGMENTATION_CACHE_SIZE,
+    FEATURE_CACHE_SIZE,
+    STAGE_CACHE_TTL_SECONDS
+)
+
+
+class LRUCache:
+    """Thread-safe LRU cache with optional TTL and hit/miss counters"""
+
+    def __init__(self, max_size: int = 1024, ttl_seconds: float = 0):
+        """
+        Initialize cache
+
+        Args:
+            max_size: Maximum number of entries, 0 disables the cache
+            ttl_seconds: Entry lifetime in seconds, 0 for no expiry
+        """
+        self.max_size = max(0, max_size)
+        self.ttl_seconds = max(0.0, ttl_seconds)
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_size > 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """
+        Get a cached value, refreshing its LRU position
+
+        Args:
+            key: Cache key
+
+        Returns:
+            Cached value or None on miss / expiry
+        """
+        if not self.enabled:
+            return None
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            stored_at, value = entry
+            if self.ttl_seconds and time.monotonic() - stored_at > self.ttl_seconds:
+                del self._entries[key]
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        """
+        Store a value, evicting the least recently used entries when full
+
+        Args:
+            key: Cache key
+            value: Value to store
+        """
+        if not self.enabled:
+            return
+
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, predicate: Callable[[Hashable], bool]) -> int:
+        """
+        Remove all entries whose key matches a predicate
+
+        Args:
+            predicate: Function returning True for keys to drop
+
+        Returns:
+            Number of removed entries
+        """
+        with self._lock:
+            keys = [key for key in self._entries if predicate(key)]
+            for key in keys:
+                del self._entries[key]
+            return len(keys)
+
+    def clear(self) -> None:
+        """Remove all entries"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Get size and hit/miss counters"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
+
+
+def hash_image_bytes(image_bytes: bytes) -> str:
+    """Content hash of an encoded image"""
+    return hashlib.blake2b(image_bytes, digest_size=16).hexdigest()
+
+
+def prediction_cache_key(
+    image_hash: str,
+    model_type: str,
+    seg_method: str,
+    use_segmentation: bool,
+    apply_brightness_contrast: bool
+) -> Tuple[str, str, str, bool, bool]:
+    """Key for prediction_cache, model_type is always the second element"""
+    return (image_hash, model_type, seg_method, use_segmentation, apply_brightness_contrast)
+
+
+def stage_cache_key(
+    image_hash: str,
+    use_segmentation: bool,
+    seg_method: str,
+    apply_brightness_contrast: bool
+) -> Tuple[str, str, bool]:
+    """
+    Key for the segmentation and feature caches
+
+    Only the parameters that change the MLP front half are part of the key, so
+    mlpv2 and mlpv2_auto-clahe share entries.
+    """
+    effective_seg_method = seg_method if use_segmentation else "none"
+    return (image_hash, effective_seg_method, apply_brightness_contrast)
+
+
+def invalidate_model_predictions(model_type: str) -> int:
+    """Drop cached predictions produced by a model type"""
+    return prediction_cache.invalidate(lambda key: key[1] == model_type)
+
+
+# Global prediction result cache: key -> (predicted_class, confidence, all_confidences)
+prediction_cache = LRUCache(max_size=PREDICTION_CACHE_SIZE, ttl_seconds=PREDICTION_CACHE_TTL_SECONDS)
+
+# Global stage caches, keyed by stage_cache_key
+# segmentation_cache: segmented/enhanced 224x224 BGR image (read-only array)
+# feature_cache: 44-d feature vector (read-only array)
+segmentation_cache = LRUCache(max_size=SEGMENTATION_CACHE_SIZE, ttl_seconds=STAGE_CACHE_TTL_SECONDS)
+feature_cache = LRUCache(max_size=FEATURE_CACHE_SIZE, ttl_seconds=STAGE_CACHE_TTL_SECONDS)
@@ -0,0 +1,146 @@
+"""
+Confidence-gated model cascade
+
+The cheap MLP pipeline answers first. Only when its top-class confidence or its margin
+over the runner-up falls below the configured thresholds is the image escalated to the
+CNN, so easy images never pay for EfficientNetV2.
+"""
+
+from typing import Dict, Optional, Tuple
+
+from api.configs.pcvk_config import (
+    CASCADE_FIRST_MODEL,
+    CASCADE_SECOND_MODEL,
+    CASCADE_MIN_CONFIDENCE,
+    CASCADE_MIN_MARGIN
+)
+from api.services.classification.model_loader import model_manager
+from api.services.classification.inference import prepare_model_input_from_bytes, segmentation_degraded
+from api.services.classification.batching import micro_batcher
+from api.services.classification.cache import prediction_cache, prediction_cache_key, hash_image_bytes
+from api.services.executor import stage_executor
+
+Prediction = Tuple[str, float, Dict[str, float]]
+
+
+def should_escalate(
+    all_confidences: Dict[str, float],
+    min_confidence: float = CASCADE_MIN_CONFIDENCE,
+    min_margin: float = CASCADE_MIN_MARGIN
+) -> bool:
+    """
+    Whether a prediction is too uncertain to be the final answer
+
+    Args:
+        all_confidences: Class name -> probability
+        min_confidence: Minimum top-class probability
+        min_margin: Minimum difference between the top two probabilities
+
+    Returns:
+        True if the next tier should answer
+    """
+    ranked = sorted(all_confidences.values(), reverse=True)
+    top = ranked[0] if ranked else 0.0
+    runner_up = ranked[1] if len(ranked) > 1 else 0.0
+    return top < min_confidence or top - runner_up < min_margin
+
+
+async def _predict_tier(
+    model_type: str,
+    image_bytes: bytes,
+    image_hash: str,
+    use_segmentation: bool,
+    seg_method: str,
+    apply_brightness_contrast: bool,
+    timings: Dict[str, float],
+    stage_prefix: str = ""
+) -> Tuple[Prediction, bool]:
+    """
+    Predict with one tier through the prediction cache, preprocess stage and micro-batcher
+
+    Returns:
+        Tuple of (prediction, cached)
+    """
+    cache_key = prediction_cache_key(
+        image_hash, model_type, seg_method, use_segmentation, apply_brightness_contrast
+    )
+    cached = prediction_cache.get(cache_key)
+    if cached is not None:
+        return cached, True
+
+    model_input, _, tier_timings = await stage_executor.run(
+        "preprocess",
+        prepare_model_input_from_bytes,
+        image_bytes,
+        use_segmentation=use_segmentation,
+        seg_method=seg_method,
+        apply_brightness_contrast=apply_brightness_contrast,
+        model_type=model_type,
+        image_hash=image_hash
+    )
+    prediction = await micro_batcher.submit(model_type, model_input, timings=tier_timings)
+    if not segmentation_degraded(tier_timings):
+        prediction_cache.set(cache_key, prediction)
+
+    for stage, duration_ms in tier_timings.items():
+        timings[stage_prefix + stage] = duration_ms
+    return prediction, False
+
+
+async def predict_cascade(
+    image_bytes: bytes,
+    use_segmentation: bool = True,
+    seg_method: str = "u2netp",
+    apply_brightness_contrast: bool = True,
+    min_confidence: Optional[float] = None,
+    min_margin: Optional[float] = None,
+    image_hash: Optional[str] = None,
+    timings: Optional[Dict[str, float]] = None
+) -> Tuple[Prediction, str, bool]:
+    """
+    Predict with the first tier and escalate uncertain images to the second
+
+    The caller must have loaded CASCADE_FIRST_MODEL. If the second model cannot be
+    loaded, the first tier's answer is returned.
+
+    Args:
+        image_bytes: Encoded image
+        use_segmentation: Whether to apply segmentation (first tier)
+        seg_method: Segmentation method (first tier)
+        apply_brightness_contrast: Whether to apply brightness and contrast enhancement (first tier)
+        min_confidence: Escalation threshold for the top-class probability, CASCADE_MIN_CONFIDENCE if None
+        min_margin: Escalation threshold for the top-two margin, CASCADE_MIN_MARGIN if None
+        image_hash: Content hash of image_bytes, computed here if not given
+        timings: Optional dict receiving per-stage durations in milliseconds,
+            stages of the second tier are prefixed with "escalation_"
+
+    Returns:
+        Tuple of (prediction, answered_by, cached) where answered_by is the model type that
+        produced the prediction and cached tells whether it came from the prediction cache
+    """
+    if timings is None:
+        timings = {}
+    if image_hash is None:
+        image_hash = hash_image_bytes(image_bytes)
+
+    prediction, cached = await _predict_tier(
+        CASCADE_FIRST_MODEL, image_bytes, image_hash,
+        use_segmentation, seg_method, apply_brightness_contrast, timings
+    )
+    if not should_escalate(
+        prediction[2],
+        CASCADE_MIN_CONFIDENCE if min_confidence is None else min_confidence,
+        CASCADE_MIN_MARGIN if min_margin is None else min_margin
+    ):
+        return prediction, CASCADE_FIRST_MODEL, cached
+
+    if not await model_manager.ensure_loaded_async(CASCADE_SECOND_MODEL):
+        print(f"Cascade: failed to load '{CASCADE_SECOND_MODEL}', answering with '{CASCADE_FIRST_MODEL}'")
+        return prediction, CASCADE_FIRST_MODEL, cached
+
+    prediction, cached = await _predict_tier(
+        CASCADE_SECOND_MODEL, image_bytes, image_hash,
+        use_segmentation, seg_method, apply_brightness_contrast, timings,
+        stage_prefix="escalation_"
+    )
+    return prediction, CASCADE_SECOND_MODEL, cached
@@ -0,0 +1,127 @@
+"""
+Ensemble prediction with shared preprocessing
+
+One preprocess task decodes the image once and prepares the inputs of every model
+that is not answered from the prediction cache (the MLP variants share the feature
+vector). The forward passes then run concurrently through the micro-batcher and the
+class probabilities are fused by a weighted mean.
+"""
+
+import asyncio
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from api.configs.pcvk_config import CLASS_NAMES
+from api.services.classification.inference import (
+    format_prediction,
+    prepare_ensemble_inputs,
+    segmentation_degraded
+)
+from api.services.classification.batching import micro_batcher
+from api.services.classification.cache import prediction_cache, prediction_cache_key, hash_image_bytes
+from api.services.executor import stage_executor
+
+Prediction = Tuple[str, float, Dict[str, float]]
+
+
+def fuse_predictions(predictions: List[Prediction], weights: List[float]) -> Prediction:
+    """
+    Weighted mean of the class probabilities of several models
+
+    Args:
+        predictions: (predicted_class, confidence, all_confidences) per model
+        weights: Non-negative weight per model
+
+    Returns:
+        Fused (predicted_class, confidence, all_confidences)
+    """
+    probabilities = np.array(
+        [[all_confidences.get(name, 0.0) for name in CLASS_NAMES] for _, _, all_confidences in predictions],
+        dtype=np.float64
+    )
+    weights_array = np.asarray(weights, dtype=np.float64)
+    fused = weights_array @ probabilities / weights_array.sum()
+    return format_prediction(fused)
+
+
+async def predict_ensemble(
+    image_bytes: bytes,
+    model_types: List[str],
+    weights: Optional[List[float]] = None,
+    use_segmentation: bool = True,
+    seg_method: str = "u2netp",
+    apply_brightness_contrast: bool = True,
+    image_hash: Optional[str] = None,
+    timings: Optional[Dict[str, float]] = None
+) -> Tuple[Prediction, Dict[str, Prediction], Dict[str, bool]]:
+    """
+    Predict with several models and fuse their probabilities
+
+    The caller should have loaded all models; a model evicted meanwhile is
+    reloaded by the micro-batcher before its forward pass.
+
+    Args:
+        image_bytes: Encoded image
+        model_types: Models to combine
+        weights: Weight per model (same order), equal weights if None
+        use_segmentation: Whether to apply segmentation (MLP variants)
+        seg_method: Segmentation method
+        apply_brightness_contrast: Whether to apply brightness and contrast enhancement (MLP variants)
+        image_hash: Content hash of image_bytes, computed here if not given
+        timings: Optional dict receiving the shared preprocessing stages and
+            forward_<model>/batch_wait_<model> per model, in milliseconds
+
+    Returns:
+        Tuple of (fused prediction, model type -> prediction, model type -> served from cache)
+    """
+    if timings is None:
+        timings = {}
+    if image_hash is None:
+        image_hash = hash_image_bytes(image_bytes)
+
+    cache_keys = {
+        model_type: prediction_cache_key(
+            image_hash, model_type, seg_method, use_segmentation, apply_brightness_contrast
+        )
+        for model_type in model_types
+    }
+    predictions: Dict[str, Prediction] = {}
+    for model_type, cache_key in cache_keys.items():
+        cached = prediction_cache.get(cache_key)
+        if cached is not None:
+            predictions[model_type] = cached
+    cached_models = {model_type: model_type in predictions for model_type in model_types}
+
+    pending = [model_type for model_type in model_types if model_type not in predictions]
+    if pending:
+        inputs, preprocess_timings = await stage_executor.run(
+            "preprocess",
+            prepare_ensemble_inputs,
+            image_bytes,
+            pending,
+            use_segmentation=use_segmentation,
+            seg_method=seg_method,
+            apply_brightness_contrast=apply_brightness_contrast,
+            image_hash=image_hash
+        )
+        timings.update(preprocess_timings)
+        # A segmentation fallback only affects the feature-based models
+        degraded = segmentation_degraded(preprocess_timings)
+
+        model_timings = {model_type: {} for model_type in pending}
+        results = await asyncio.gather(*(
+            micro_batcher.submit(model_type, inputs[model_type], timings=model_timings[model_type])
+            for model_type in pending
+        ))
+        for model_type, prediction in zip(pending, results):
+            if not degraded or model_type == "efficientnetv2":
+                prediction_cache.set(cache_keys[model_type], prediction)
+            predictions[model_type] = prediction
+            for stage, duration_ms in model_timings[model_type].items():
+                timings[f"{stage}_{model_type}"] = duration_ms
+
+    if weights is None:
+        weights = [1.0] * len(model_types)
+    fused = fuse_predictions([predictions[model_type] for model_type in model_types], weights)
+    return fused, {model_type: predictions[model_type] for model_type in model_types}, cached_models
@@ -10,7 +10,7 @@ import numpy as np
 from PIL import Image
 
 from api.services.classification.model_loader import model_manager
-from api.services.classification.inference import predict_image
+from api.services.classification.inference import decode_image, predict_image, preprocess_image
 
 
 def unload_all_models():
@@ -54,23 +54,21 @@ def gradio_predict(
         # Start timing
         start_time = time.time()
         
-        # Load model if not already loaded
-        if not model_manager.is_loaded(model_type):
-            print(f"Model {model_type} not loaded, loading now...")
-            success = model_manager.load_model(model_type)
-            if not success:
-                return f"Error: Failed to load model '{model_type}'", {}, None
+        # Load model if not already loaded, the handle survives a concurrent eviction
+        handle = model_manager.acquire(model_type)
+        if handle is None:
+            return f"Error: Failed to load model '{model_type}'", {}, None
         
-        # Get model
-        model = model_manager.get_model(model_type)
-        is_onnx = model_manager.get_model_type(model_type) == 'onnx'
+        model, runtime = handle
+        is_onnx = runtime == 'onnx'
+        
+        # Scaled decode with EXIF orientation, the upload is never decoded at full resolution
+        if isinstance(image, np.ndarray):
+            image = Image.fromarray(image)
+        image = decode_image(image)
         
         # EfficientNetV2 uses direct image without preprocessing
         if model_type == "efficientnetv2":
-            # Convert to PIL Image if needed
-            if not isinstance(image, Image.Image):
-                image = Image.fromarray(image)
-            
             # Perform prediction (no segmentation, no preprocessing)
             predicted_class, confidence_value, all_confidences, _ = predict_image(
                 model=model,
@@ -93,12 +91,7 @@ def gradio_predict(
         
         # Feature-based models (MLP variants)
         # Convert PIL Image to numpy array (BGR for OpenCV)
-        if isinstance(image, Image.Image):
-            image_np = np.array(image)
-            image_bgr = cv2.cvtColor(image_np, cv2.COLOR_RGB2BGR)
-            image_bgr = cv2.resize(image_bgr, (224, 224))
-        else:
-            image_bgr = image
+        image_bgr = preprocess_image(image)
 
         # Apply segmentation if enabled
         if use_segmentation and seg_method != "none":
@@ -202,7 +195,8 @@ def create_gradio_interface():
 
         with gr.Row():
             with gr.Column():
-                input_image = gr.Image(type="pil", label="Upload Gambar Sayuran")
+                # filepath lets decode_image read the JPEG at reduced scale instead of full resolution
+                input_image = gr.Image(type="filepath", label="Upload Gambar Sayuran")
 
                 predict_btn = gr.Button("🔍 Klasifikasi", variant="primary", size="lg")
                 
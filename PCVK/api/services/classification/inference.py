@@ -2,14 +2,13 @@
 Inference logic for vegetable classification
 """
 
+import io
 import cv2
 import numpy as np
-import torch
-import torchvision.transforms as T
-from PIL import Image
+from PIL import Image, ImageOps
 import sys
 import os
-from typing import Tuple, Dict, Union
+from typing import TYPE_CHECKING, Callable, Tuple, Dict, List, Optional, Union
 
 # Add lib directory to path
 lib_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'lib')
@@ -17,46 +16,211 @@ if lib_path not in sys.path:
     sys.path.append(lib_path)
 
 from lib.extract_features import extract_all_features
-from lib.segment import apply_automatic_brightness_contrast, apply_clahe, auto_segment
-from api.configs.pcvk_config import CLASS_NAMES, DEVICE
+from lib.segment import apply_automatic_brightness_contrast, apply_clahe, auto_segment, SegmentationError
+from lib.timing import stage_timer
+from lib.model_v2_numpy import NumpyMLPV2
+from api.configs.pcvk_config import CLASS_NAMES, DEVICE, SCALED_JPEG_DECODE
+from api.services.classification.cache import (
+    segmentation_cache,
+    feature_cache,
+    stage_cache_key,
+    hash_image_bytes
+)
 from api.services.classification.onnx_utils import (
     ONNXInferenceSession,
+    softmax,
     predict_onnx_mlp,
     predict_onnx_efficientnet
 )
 
+if TYPE_CHECKING:
+    import torch
+
 
-def preprocess_image(image: Image.Image, target_size: Tuple[int, int] = (224, 224)) -> np.ndarray:
+def decode_image(
+    source: Union[Image.Image, bytes, str],
+    target_size: Optional[Tuple[int, int]] = (224, 224),
+    mode: str = "RGB"
+) -> Image.Image:
+    """
+    Decode an image close to the target size with EXIF orientation applied
+    
+    JPEGs are decoded at a reduced DCT scale (1/2, 1/4 or 1/8) that still covers
+    target_size, so a 12 MP photo never has to be fully decoded to end up at 224x224.
+    
+    Args:
+        source: Encoded image bytes, a file path, or a PIL Image that has not been loaded yet
+        target_size: Smallest (width, height) needed downstream, None for full resolution
+        mode: PIL mode of the returned image
+    
+    Returns:
+        Decoded PIL Image, upright and at least target_size for JPEGs
+    """
+    if isinstance(source, bytes):
+        image = Image.open(io.BytesIO(source))
+    elif isinstance(source, Image.Image):
+        image = source
+    else:
+        image = Image.open(source)
+    
+    # Only has an effect before the pixel data is loaded, no-op for non-JPEG formats
+    if SCALED_JPEG_DECODE and target_size is not None and image.format == "JPEG":
+        image.draft(mode, target_size)
+    
+    # Phone photos are usually stored sideways with an orientation tag
+    image = ImageOps.exif_transpose(image)
+    
+    if image.mode != mode:
+        image = image.convert(mode)
+    
+    image.load()
+    return image
+
+
+def preprocess_image(
+    image: Image.Image,
+    target_size: Tuple[int, int] = (224, 224),
+    timings: Optional[Dict[str, float]] = None
+) -> np.ndarray:
     """
     Preprocess image for inference
     
     Args:
         image: PIL Image
         target_size: Target size for resizing
+        timings: Optional dict receiving per-stage durations in milliseconds
     
     Returns:
         Preprocessed image as BGR numpy array
     """
-    # Convert PIL Image to numpy array (RGB)
-    image_np = np.array(image.convert('RGB'))
-    
-    # Convert RGB to BGR for OpenCV
-    image_bgr = cv2.cvtColor(image_np, cv2.COLOR_RGB2BGR)
+    # Convert PIL Image to numpy array (RGB), PIL decodes lazily on first access
+    with stage_timer(timings, "decode"):
+        image_np = np.array(image.convert('RGB'))
     
-    # Resize to target size
-    image_bgr = cv2.resize(image_bgr, target_size)
+    with stage_timer(timings, "resize"):
+        # Convert RGB to BGR for OpenCV
+        image_bgr = cv2.cvtColor(image_np, cv2.COLOR_RGB2BGR)
+        
+        # Resize to target size
+        image_bgr = cv2.resize(image_bgr, target_size)
     
     return image_bgr
 
 
-def apply_segmentation(image: np.ndarray, method: str = "hsv", apply_brightness_contrast: bool = True) -> np.ndarray:
+class ImageNetPreprocessor:
+    """
+    Resize + ImageNet normalisation to a float32 CHW tensor, without torch
+    
+    Equivalent to T.Compose([T.Resize(size), T.ToTensor(), T.Normalize(mean, std)]),
+    with ToTensor's 1/255 and Normalize folded into one multiply-add per channel.
+    The API resizes per request (resize) and normalises at forward time straight into
+    the NCHW batch (batch), so requests carry 1-byte pixels and the batch is not stacked.
+    """
+    
+    def __init__(
+        self,
+        size: Tuple[int, int] = (224, 224),
+        mean: Tuple[float, float, float] = (0.485, 0.456, 0.406),
+        std: Tuple[float, float, float] = (0.229, 0.224, 0.225)
+    ):
+        """
+        Initialize preprocessor
+        
+        Args:
+            size: Output (width, height)
+            mean: Per-channel mean (RGB, 0-1 range)
+            std: Per-channel standard deviation (RGB, 0-1 range)
+        """
+        self.size = size
+        mean = np.asarray(mean, dtype=np.float64)
+        std = np.asarray(std, dtype=np.float64)
+        
+        # (x / 255 - mean) / std == x * scale + bias
+        self.scale = (1.0 / (255.0 * std)).astype(np.float32)
+        self.bias = (-mean / std).astype(np.float32)
+    
+    def __call__(self, image_rgb: np.ndarray, out: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Preprocess one image
+        
+        Args:
+            image_rgb: HWC uint8 RGB image
+            out: Optional preallocated (3, height, width) float32 buffer to write into,
+                e.g. batch[i] of a stacked NCHW batch
+        
+        Returns:
+            Normalised CHW float32 tensor (out if given)
+        """
+        width, height = self.size
+        image_rgb = self.resize(image_rgb)
+        
+        if out is None:
+            out = np.empty((3, height, width), dtype=np.float32)
+        
+        # HWC -> CHW happens through the strided channel views, no transpose copy
+        for channel in range(3):
+            np.multiply(image_rgb[:, :, channel], self.scale[channel], out=out[channel], casting='unsafe')
+            out[channel] += self.bias[channel]
+        
+        return out
+    
+    def resize(self, image_rgb: np.ndarray) -> np.ndarray:
+        """
+        Resize one image to the model input size
+        
+        Args:
+            image_rgb: HWC uint8 RGB image
+        
+        Returns:
+            HWC uint8 RGB image of the output size (image_rgb itself if it already fits)
+        """
+        width, height = self.size
+        if image_rgb.shape[1] != width or image_rgb.shape[0] != height:
+            # INTER_AREA anti-aliases on downscaling like PIL's resize in torchvision
+            image_rgb = cv2.resize(image_rgb, self.size, interpolation=cv2.INTER_AREA)
+        return image_rgb
+    
+    def batch(self, images_rgb: List[np.ndarray]) -> np.ndarray:
+        """
+        Preprocess several images into one preallocated NCHW batch
+        
+        Args:
+            images_rgb: HWC uint8 RGB images (resized here if needed)
+        
+        Returns:
+            Normalised (N, 3, height, width) float32 batch
+        """
+        width, height = self.size
+        batch = np.empty((len(images_rgb), 3, height, width), dtype=np.float32)
+        for i, image_rgb in enumerate(images_rgb):
+            self(image_rgb, out=batch[i])
+        return batch
+
+
+# Stage recorded when the requested segmentation failed and HSV was used instead
+SEGMENT_FALLBACK_STAGE = "segment_fallback_hsv"
+
+# Built once, shared by all EfficientNetV2 requests
+efficientnet_preprocessor = ImageNetPreprocessor()
+
+
+def apply_segmentation(
+    image: np.ndarray,
+    method: str = "hsv",
+    apply_brightness_contrast: bool = True,
+    timings: Optional[Dict[str, float]] = None
+) -> np.ndarray:
     """
     Apply segmentation to image
     
+    If the segmentation model fails, HSV segmentation is used instead and recorded as
+    the SEGMENT_FALLBACK_STAGE stage, see segmentation_degraded.
+    
     Args:
         image: Input image (BGR)
         method: Segmentation method
         apply_brightness_contrast: Whether to apply brightness and contrast enhancement
+        timings: Optional dict receiving per-stage durations in milliseconds
     
     Returns:
         Segmented image
@@ -64,15 +228,40 @@ def apply_segmentation(image: np.ndarray, method: str = "hsv", apply_brightness_
     if method == "none":
         return image.copy()
     
-    return auto_segment(image.copy(), method=method, applyBrightContClahe=apply_brightness_contrast)
+    try:
+        return auto_segment(
+            image.copy(), method=method, applyBrightContClahe=apply_brightness_contrast,
+            timings=timings, fallback=False
+        )
+    except SegmentationError:
+        print(f"Falling back to HSV segmentation (requested: {method})")
+        with stage_timer(timings, SEGMENT_FALLBACK_STAGE):
+            return auto_segment(image.copy(), method="hsv", applyBrightContClahe=apply_brightness_contrast)
 
 
-def extract_features_from_image(image: np.ndarray) -> np.ndarray:
+def segmentation_degraded(timings: Optional[Dict[str, float]]) -> bool:
+    """
+    Whether a pipeline run fell back to HSV segmentation
+    
+    Results of such a run do not match the requested segmentation method and must
+    not be cached under it.
+    
+    Args:
+        timings: Stage timings of the run
+    
+    Returns:
+        True if the fallback stage was recorded
+    """
+    return bool(timings) and SEGMENT_FALLBACK_STAGE in timings
+
+
+def extract_features_from_image(image: np.ndarray, timings: Optional[Dict[str, float]] = None) -> np.ndarray:
     """
     Extract features from image
     
     Args:
         image: Input image (BGR)
+        timings: Optional dict receiving per-stage durations in milliseconds
     
     Returns:
         Feature vector as numpy array
@@ -80,13 +269,14 @@ def extract_features_from_image(image: np.ndarray) -> np.ndarray:
     features = extract_all_features(
         image,
         use_segmentation=False,  # Already segmented if needed
-        seg_method="none"
+        seg_method="none",
+        timings=timings
     )
     return features
 
 
 def predict_from_features(
-    model: Union[torch.nn.Module, ONNXInferenceSession],
+    model: Union['torch.nn.Module', NumpyMLPV2, ONNXInferenceSession],
     features: np.ndarray,
     is_onnx: bool = False
 ) -> Tuple[str, float, Dict[str, float]]:
@@ -94,7 +284,7 @@ def predict_from_features(
     Perform prediction from features
     
     Args:
-        model: PyTorch model or ONNX session
+        model: PyTorch model, NumPy MLP or ONNX session
         features: Feature vector
         is_onnx: Whether the model is ONNX
     
@@ -104,13 +294,18 @@ def predict_from_features(
     if is_onnx:
         return predict_onnx_mlp(model, features, CLASS_NAMES)
     
-    # PyTorch inference
+    if isinstance(model, NumpyMLPV2):
+        return format_prediction(softmax(model(features))[0])
+    
+    # PyTorch inference (torch is only imported once a PyTorch model is in use)
+    import torch
+    
     # Convert to tensor
     features_tensor = torch.tensor(features, dtype=torch.float32).unsqueeze(0)
     features_tensor = features_tensor.to(DEVICE)
     
     # Predict
-    with torch.no_grad():
+    with torch.inference_mode():
         outputs = model(features_tensor)
         probabilities = torch.softmax(outputs, dim=1)
         confidence, predicted = torch.max(probabilities, 1)
@@ -129,8 +324,8 @@ def predict_from_features(
 
 
 def predict_from_tensor(
-    model: Union[torch.nn.Module, ONNXInferenceSession],
-    image_tensor: Union[torch.Tensor, np.ndarray],
+    model: Union['torch.nn.Module', ONNXInferenceSession],
+    image_tensor: Union['torch.Tensor', np.ndarray],
     is_onnx: bool = False
 ) -> Tuple[str, float, Dict[str, float]]:
     """
@@ -138,19 +333,28 @@ def predict_from_tensor(
     
     Args:
         model: PyTorch model (EfficientNetV2) or ONNX session
-        image_tensor: Preprocessed image tensor
+        image_tensor: Preprocessed image tensor, or a resized HWC uint8 RGB image
+            from prepare_model_input
         is_onnx: Whether the model is ONNX
     
     Returns:
         Tuple of (predicted_class, confidence, all_confidences)
     """
+    if isinstance(image_tensor, np.ndarray) and image_tensor.dtype == np.uint8:
+        image_tensor = efficientnet_preprocessor.batch([image_tensor])
+    
     if is_onnx:
         # Convert torch tensor to numpy if needed
-        if isinstance(image_tensor, torch.Tensor):
+        if not isinstance(image_tensor, np.ndarray):
             image_tensor = image_tensor.cpu().numpy()
         return predict_onnx_efficientnet(model, image_tensor, CLASS_NAMES)
     
     # PyTorch inference
+    import torch
+    
+    if isinstance(image_tensor, np.ndarray):
+        image_tensor = torch.from_numpy(image_tensor)
+    
     # Add batch dimension if needed
     if image_tensor.dim() == 3:
         image_tensor = image_tensor.unsqueeze(0)
@@ -158,7 +362,7 @@ def predict_from_tensor(
     image_tensor = image_tensor.to(DEVICE)
     
     # Predict
-    with torch.no_grad():
+    with torch.inference_mode():
         outputs = model(image_tensor)
         probabilities = torch.softmax(outputs, dim=1)
         confidence, predicted = torch.max(probabilities, 1)
@@ -176,80 +380,315 @@ def predict_from_tensor(
     return predicted_class, confidence_value, all_confidences
 
 
+def format_prediction(probs: np.ndarray) -> Tuple[str, float, Dict[str, float]]:
+    """
+    Convert a probability vector into the (predicted_class, confidence, all_confidences) tuple
+    
+    Args:
+        probs: Class probabilities for a single sample
+    
+    Returns:
+        Tuple of (predicted_class, confidence, all_confidences)
+    """
+    predicted_idx = int(np.argmax(probs))
+    all_confidences = {CLASS_NAMES[i]: float(probs[i]) for i in range(len(CLASS_NAMES))}
+    
+    return CLASS_NAMES[predicted_idx], float(probs[predicted_idx]), all_confidences
+
+
+def predict_batch(
+    model: Union['torch.nn.Module', NumpyMLPV2, ONNXInferenceSession],
+    inputs: List[np.ndarray],
+    is_onnx: bool = False
+) -> List[Tuple[str, float, Dict[str, float]]]:
+    """
+    Run a single forward pass over several prepared model inputs
+    
+    Args:
+        model: PyTorch model, NumPy MLP or ONNX session
+        inputs: Model inputs from prepare_model_input (feature vectors or resized uint8 RGB images)
+        is_onnx: Whether the model is ONNX
+    
+    Returns:
+        One (predicted_class, confidence, all_confidences) tuple per input, in order
+    """
+    if inputs[0].dtype == np.uint8:
+        # EfficientNetV2: resized RGB images, normalised into one preallocated NCHW batch
+        batch = efficientnet_preprocessor.batch(inputs)
+    else:
+        batch = np.stack(inputs).astype(np.float32, copy=False)
+    
+    if is_onnx:
+        probabilities = softmax(model.run_batch(batch))
+    elif isinstance(model, NumpyMLPV2):
+        probabilities = softmax(model(batch))
+    else:
+        import torch
+        
+        batch_tensor = torch.from_numpy(batch).to(DEVICE)
+        with torch.inference_mode():
+            probabilities = torch.softmax(model(batch_tensor), dim=1).cpu().numpy()
+    
+    return [format_prediction(probs) for probs in probabilities]
+
+
+def prepare_model_input(
+    image: Union[Image.Image, bytes, str, Callable[[], Image.Image]],
+    use_segmentation: bool = True,
+    seg_method: str = "hsv",
+    apply_brightness_contrast: bool = True,
+    model_type: str = "mlpv2",
+    image_hash: Optional[str] = None,
+    return_processed_image: bool = True,
+    timings: Optional[Dict[str, float]] = None
+) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    """
+    Run the pipeline up to (but not including) the forward pass
+    
+    For the MLP variants the segmented image and the feature vector are cached
+    per image_hash, so re-queries and model switches skip the front half. Runs that fell
+    back to HSV segmentation (segmentation_degraded) are not cached.
+    
+    Args:
+        image: Encoded bytes, file path or PIL Image (decoded with decode_image only on a cache miss),
+            or a function returning a PIL Image
+        use_segmentation: Whether to apply segmentation
+        seg_method: Segmentation method
+        apply_brightness_contrast: Whether to apply brightness and contrast enhancement
+        model_type: Type of model (mlpv2, mlpv2_auto-clahe, efficientnetv2)
+        image_hash: Content hash of the source image, enables the stage caches
+        return_processed_image: Whether the processed image is needed by the caller
+        timings: Optional dict receiving per-stage durations in milliseconds
+    
+    Returns:
+        Tuple of (model_input, processed_image)
+        model_input is the resized HWC uint8 RGB image for efficientnetv2, otherwise the feature vector
+        processed_image is the segmented/enhanced BGR image, None for efficientnetv2 or if not requested
+    """
+    load_image = image if callable(image) else (lambda: decode_image(image))
+    # Always collected, a segmentation fallback must be visible to the cache below
+    if timings is None:
+        timings = {}
+    
+    # EfficientNetV2 uses direct image tensor without feature extraction
+    if model_type == "efficientnetv2":
+        # Standard ImageNet preprocessing without any segmentation or enhancement
+        with stage_timer(timings, "decode"):
+            pil_image = load_image()
+            
+            # Convert to RGB if needed
+            if pil_image.mode != 'RGB':
+                pil_image = pil_image.convert('RGB')
+            image_rgb = np.asarray(pil_image)
+        
+        # Normalised at forward time, directly into the batch (see predict_batch)
+        with stage_timer(timings, "resize"):
+            return efficientnet_preprocessor.resize(image_rgb), None
+    
+    # Feature-based models (MLP variants)
+    cache_key = None
+    if image_hash is not None:
+        cache_key = stage_cache_key(image_hash, use_segmentation, seg_method, apply_brightness_contrast)
+        features = feature_cache.get(cache_key)
+        if features is not None and not return_processed_image:
+            return features, None
+        
+        segmented_img = segmentation_cache.get(cache_key)
+        if segmented_img is not None:
+            if features is None:
+                features = _freeze(extract_features_from_image(segmented_img, timings=timings))
+                feature_cache.set(cache_key, features)
+            return features, segmented_img
+    
+    with stage_timer(timings, "decode"):
+        pil_image = load_image()
+    image_bgr = preprocess_image(pil_image, timings=timings)
+    
+    if use_segmentation and seg_method != "none":
+        segmented_img = apply_segmentation(image_bgr, method=seg_method, apply_brightness_contrast=False, timings=timings)
+    else:
+        segmented_img = image_bgr
+    
+    if apply_brightness_contrast:
+        with stage_timer(timings, "brightness_contrast"):
+            segmented_img = apply_automatic_brightness_contrast(segmented_img)
+        with stage_timer(timings, "clahe"):
+            segmented_img = apply_clahe(segmented_img)
+    
+    features = extract_features_from_image(segmented_img, timings=timings)
+    
+    if cache_key is not None and not segmentation_degraded(timings):
+        segmented_img = _freeze(segmented_img)
+        features = _freeze(features)
+        segmentation_cache.set(cache_key, segmented_img)
+        feature_cache.set(cache_key, features)
+    
+    return features, segmented_img if return_processed_image else None
+
+
+def prepare_model_input_from_bytes(
+    image_bytes: bytes,
+    use_segmentation: bool = True,
+    seg_method: str = "hsv",
+    apply_brightness_contrast: bool = True,
+    model_type: str = "mlpv2",
+    image_hash: Optional[str] = None,
+    return_processed_image: bool = False
+) -> Tuple[np.ndarray, Optional[np.ndarray], Dict[str, float]]:
+    """
+    Decode raw image bytes and run prepare_model_input
+    
+    Takes bytes rather than a PIL Image so it can be shipped to a process pool cheaply.
+    Decoding (scaled, see decode_image) is skipped entirely when the stage caches already
+    hold the result.
+    Stage timings are returned rather than filled into a caller's dict, which
+    would not survive the trip back from a process pool.
+    
+    Args:
+        image_bytes: Encoded image (JPG, PNG, etc.)
+        use_segmentation: Whether to apply segmentation
+        seg_method: Segmentation method
+        apply_brightness_contrast: Whether to apply brightness and contrast enhancement
+        model_type: Type of model (mlpv2, mlpv2_auto-clahe, efficientnetv2)
+        image_hash: Content hash of image_bytes, computed here if not given
+        return_processed_image: Whether the processed image is needed by the caller
+    
+    Returns:
+        Tuple of (model_input, processed_image, timings)
+        timings maps stage names to durations in milliseconds (stages served from cache are absent)
+    """
+    if image_hash is None:
+        image_hash = hash_image_bytes(image_bytes)
+    
+    timings: Dict[str, float] = {}
+    model_input, processed_image = prepare_model_input(
+        image_bytes,
+        use_segmentation=use_segmentation,
+        seg_method=seg_method,
+        apply_brightness_contrast=apply_brightness_contrast,
+        model_type=model_type,
+        image_hash=image_hash,
+        return_processed_image=return_processed_image,
+        timings=timings
+    )
+    
+    return model_input, processed_image, timings
+
+
+def prepare_ensemble_inputs(
+    image_bytes: bytes,
+    model_types: List[str],
+    use_segmentation: bool = True,
+    seg_method: str = "hsv",
+    apply_brightness_contrast: bool = True,
+    image_hash: Optional[str] = None
+) -> Tuple[Dict[str, np.ndarray], Dict[str, float]]:
+    """
+    Model inputs for several models from a single decode
+    
+    The image is decoded at most once for all models, and the MLP variants share one
+    segmented/enhanced image and feature vector (their preprocessing is identical).
+    
+    Args:
+        image_bytes: Encoded image (JPG, PNG, etc.)
+        model_types: Models to prepare inputs for
+        use_segmentation: Whether to apply segmentation (MLP variants)
+        seg_method: Segmentation method
+        apply_brightness_contrast: Whether to apply brightness and contrast enhancement (MLP variants)
+        image_hash: Content hash of image_bytes, computed here if not given
+    
+    Returns:
+        Tuple of (model type -> model input, timings)
+    """
+    if image_hash is None:
+        image_hash = hash_image_bytes(image_bytes)
+    
+    timings: Dict[str, float] = {}
+    decoded: List[Image.Image] = []
+    
+    def load_once() -> Image.Image:
+        if not decoded:
+            decoded.append(decode_image(image_bytes))
+        return decoded[0]
+    
+    inputs: Dict[str, np.ndarray] = {}
+    features = None
+    for model_type in model_types:
+        if model_type == "efficientnetv2":
+            inputs[model_type], _ = prepare_model_input(load_once, model_type=model_type, timings=timings)
+            continue
+        
+        if features is None:
+            features, _ = prepare_model_input(
+                load_once,
+                use_segmentation=use_segmentation,
+                seg_method=seg_method,
+                apply_brightness_contrast=apply_brightness_contrast,
+                model_type=model_type,
+                image_hash=image_hash,
+                return_processed_image=False,
+                timings=timings
+            )
+        inputs[model_type] = features
+    
+    return inputs, timings
+
+
+def _freeze(array: np.ndarray) -> np.ndarray:
+    """Mark an array read-only before sharing it through a cache"""
+    array.flags.writeable = False
+    return array
+
+
 def predict_image(
-    model: Union[torch.nn.Module, ONNXInferenceSession],
-    image: Image.Image,
+    model: Union['torch.nn.Module', NumpyMLPV2, ONNXInferenceSession],
+    image: Union[Image.Image, bytes, str],
     use_segmentation: bool = True,
     seg_method: str = "hsv",
     apply_brightness_contrast: bool = True,
     model_type: str = "mlpv2",
     return_segmented_image: bool = False,
-    is_onnx: bool = False
+    is_onnx: bool = False,
+    timings: Optional[Dict[str, float]] = None
 ) -> Tuple[str, float, Dict[str, float], np.ndarray]:
     """
     Complete prediction pipeline
     
     Args:
-        model: PyTorch model or ONNX session
-        image: PIL Image
+        model: PyTorch model, NumPy MLP or ONNX session
+        image: PIL Image, encoded bytes or file path (decoded with decode_image)
         use_segmentation: Whether to apply segmentation
         seg_method: Segmentation method
         apply_brightness_contrast: Whether to apply brightness and contrast enhancement
         model_type: Type of model (mlpv2, mlpv2_auto-clahe, efficientnetv2)
         return_segmented_image: Whether to return the segmented image (only for non-efficientnet models)
         is_onnx: Whether the model is ONNX
+        timings: Optional dict receiving per-stage durations in milliseconds
     
     Returns:
         Tuple of (predicted_class, confidence, all_confidences, segmented_image)
         segmented_image is None if not requested or if using efficientnetv2
     """
+    model_input, processed_img = prepare_model_input(
+        image,
+        use_segmentation=use_segmentation,
+        seg_method=seg_method,
+        apply_brightness_contrast=apply_brightness_contrast,
+        model_type=model_type,
+        timings=timings
+    )
+    
     # EfficientNetV2 uses direct image tensor without feature extraction
     if model_type == "efficientnetv2":
-        # Standard ImageNet preprocessing without any segmentation or enhancement
-        transform = T.Compose([
-            T.Resize((224, 224)),
-            T.ToTensor(),
-            T.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225])
-        ])
-        
-        # Convert to RGB if needed
-        if image.mode != 'RGB':
-            image = image.convert('RGB')
-        
-        # Transform
-        image_tensor = transform(image)
-        
-        if is_onnx:
-            # Convert to numpy for ONNX
-            image_np = image_tensor.cpu().numpy()
-            predicted_class, confidence, all_confidences = predict_from_tensor(model, image_np, is_onnx=True)
-        else:
-            # Use torch tensor for PyTorch
-            predicted_class, confidence, all_confidences = predict_from_tensor(model, image_tensor, is_onnx=False)
-        
+        with stage_timer(timings, "forward"):
+            predicted_class, confidence, all_confidences = predict_from_tensor(model, model_input, is_onnx=is_onnx)
         return predicted_class, confidence, all_confidences, None
     
     # Feature-based models (MLP variants)
-    # Preprocess image
-    image_bgr = preprocess_image(image)
-    
-    # Apply segmentation if enabled
-    if use_segmentation and seg_method != "none":
-        segmented_img = apply_segmentation(image_bgr, method=seg_method, apply_brightness_contrast=False)
-    else:
-        segmented_img = image_bgr        
-
-    if apply_brightness_contrast: #LV2
-        segmented_img = apply_clahe(apply_automatic_brightness_contrast(segmented_img))
-    
-    # Extract features
-    # segmented_img = apply_clahe(apply_automatic_brightness_contrast(segmented_img))
-    features = extract_features_from_image(segmented_img)
-    
-    # Predict
-    predicted_class, confidence, all_confidences = predict_from_features(model, features, is_onnx=is_onnx)
+    with stage_timer(timings, "forward"):
+        predicted_class, confidence, all_confidences = predict_from_features(model, model_input, is_onnx=is_onnx)
     
     # Return segmented image if requested
-    segmented_result = segmented_img if return_segmented_image else None
+    segmented_result = processed_img if return_segmented_image else None
     
     return predicted_class, confidence, all_confidences, segmented_result
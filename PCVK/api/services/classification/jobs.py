@@ -0,0 +1,570 @@
+"""
+Asynchronous classification jobs
+
+Jobs and their per-image results are kept in SQLite and the uploaded images as files
+next to it, so queued and half-finished jobs survive a restart. A small pool of
+asyncio workers claims queued jobs and preprocesses their images on the "jobs"
+executor stage, leaving the preprocess pool to interactive requests. Only
+preprocessing has its own lane: the forward passes go through the shared
+micro-batcher and "inference" stage, so a running job competes with interactive
+requests for inference (bounded by JOB_WORKERS, one image at a time per job).
+
+A job that errors is marked failed. A job whose process dies is requeued once its
+heartbeat is stale, at most JOB_MAX_ATTEMPTS times before it is failed as well.
+"""
+
+import asyncio
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, BinaryIO, Dict, List, Optional, Tuple
+
+from api.configs.pcvk_config import (
+    DEVICE,
+    JOBS_DIR,
+    JOB_WORKERS,
+    JOB_STALE_SECONDS,
+    JOB_MAX_ATTEMPTS,
+    JOB_RETENTION_HOURS
+)
+from api.services.classification.model_loader import model_manager
+from api.services.classification.inference import prepare_model_input_from_bytes, segmentation_degraded
+from api.services.classification.batching import micro_batcher
+from api.services.classification.cache import prediction_cache, prediction_cache_key, hash_image_bytes
+from api.services.classification.timing import timing_aggregator
+from api.services.metrics import record_prediction
+from api.services.executor import stage_executor
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_COMPLETED = "completed"
+JOB_FAILED = "failed"
+FINISHED_STATUSES = (JOB_COMPLETED, JOB_FAILED)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    params TEXT NOT NULL,
+    total INTEGER NOT NULL,
+    completed INTEGER NOT NULL DEFAULT 0,
+    failed INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    heartbeat_at REAL,
+    attempts INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS jobs_status_created ON jobs (status, created_at);
+CREATE TABLE IF NOT EXISTS job_items (
+    job_id TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    filename TEXT,
+    result TEXT,
+    PRIMARY KEY (job_id, idx)
+);
+"""
+
+
+class JobStore:
+    """SQLite job table plus one image directory per job"""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.images_dir = os.path.join(directory, "images")
+        self.db_path = os.path.join(directory, "jobs.sqlite3")
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(self.images_dir, exist_ok=True)
+            # isolation_level=None: transactions are explicit (BEGIN IMMEDIATE for claims)
+            conn = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(_SCHEMA)
+            # Databases created before the attempts counter
+            columns = {row["name"] for row in conn.execute("PRAGMA table_info(jobs)")}
+            if "attempts" not in columns:
+                conn.execute("ALTER TABLE jobs ADD COLUMN attempts INTEGER NOT NULL DEFAULT 0")
+            self._conn = conn
+        return self._conn
+
+    def image_path(self, job_id: str, index: int) -> str:
+        """Path of the stored image of a job item"""
+        return os.path.join(self.images_dir, job_id, str(index))
+
+    def create_job(self, params: Dict[str, Any], uploads: List[Tuple[str, BinaryIO]]) -> Dict[str, Any]:
+        """
+        Store the images of a new job and queue it
+
+        Args:
+            params: Prediction parameters (model_type, seg_method, use_segmentation, apply_brightness_contrast)
+            uploads: (filename, file object) per image, copied to disk in chunks
+
+        Returns:
+            Job row as a dictionary
+        """
+        job_id = uuid.uuid4().hex
+        job_dir = os.path.join(self.images_dir, job_id)
+        os.makedirs(job_dir, exist_ok=True)
+        try:
+            for index, (_, upload) in enumerate(uploads):
+                with open(self.image_path(job_id, index), "wb") as f:
+                    shutil.copyfileobj(upload, f, 1024 * 1024)
+        except Exception:
+            shutil.rmtree(job_dir, ignore_errors=True)
+            raise
+
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.execute(
+                    "INSERT INTO jobs (id, status, params, total, created_at) VALUES (?, ?, ?, ?, ?)",
+                    (job_id, JOB_QUEUED, json.dumps(params), len(uploads), now)
+                )
+                conn.executemany(
+                    "INSERT INTO job_items (job_id, idx, filename) VALUES (?, ?, ?)",
+                    [(job_id, index, filename) for index, (filename, _) in enumerate(uploads)]
+                )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                shutil.rmtree(job_dir, ignore_errors=True)
+                raise
+        return self.get_job(job_id)
+
+    def claim_next(self) -> Optional[Dict[str, Any]]:
+        """
+        Atomically move the oldest queued job to running
+
+        BEGIN IMMEDIATE takes the write lock up front, so two API processes sharing
+        the database never claim the same job. Each claim counts as an attempt.
+
+        Returns:
+            Claimed job, or None if nothing is queued
+        """
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute(
+                    "SELECT id FROM jobs WHERE status = ? ORDER BY created_at LIMIT 1", (JOB_QUEUED,)
+                ).fetchone()
+                if row is not None:
+                    conn.execute(
+                        "UPDATE jobs SET status = ?, started_at = COALESCE(started_at, ?), heartbeat_at = ?, "
+                        "attempts = attempts + 1 WHERE id = ?",
+                        (JOB_RUNNING, now, now, row["id"])
+                    )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return self.get_job(row["id"]) if row is not None else None
+
+    def pending_items(self, job_id: str) -> List[Tuple[int, str]]:
+        """(index, filename) of the items of a job that have no result yet"""
+        with self._lock:
+            rows = self._connection().execute(
+                "SELECT idx, filename FROM job_items WHERE job_id = ? AND result IS NULL ORDER BY idx", (job_id,)
+            ).fetchall()
+        return [(row["idx"], row["filename"]) for row in rows]
+
+    def save_result(self, job_id: str, index: int, result: Dict[str, Any]) -> None:
+        """
+        Store the result of one item and advance the job's progress
+
+        Args:
+            job_id: Job id
+            index: Item index
+            result: Prediction result, failed if it has an 'error'
+        """
+        counter = "failed" if result.get("error") else "completed"
+        with self._lock:
+            conn = self._connection()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                updated = conn.execute(
+                    "UPDATE job_items SET result = ? WHERE job_id = ? AND idx = ? AND result IS NULL",
+                    (json.dumps(result), job_id, index)
+                ).rowcount
+                if updated:
+                    conn.execute(
+                        f"UPDATE jobs SET {counter} = {counter} + 1, heartbeat_at = ? WHERE id = ?",
+                        (time.time(), job_id)
+                    )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+    def heartbeat(self, job_id: str) -> None:
+        """Mark a running job as alive, so requeue_stale in other processes leaves it alone"""
+        with self._lock:
+            self._connection().execute(
+                "UPDATE jobs SET heartbeat_at = ? WHERE id = ? AND status = ?",
+                (time.time(), job_id, JOB_RUNNING)
+            )
+
+    def finish_job(self, job_id: str, status: str, error: Optional[str] = None) -> None:
+        """Mark a job completed or failed and delete its images"""
+        with self._lock:
+            self._connection().execute(
+                "UPDATE jobs SET status = ?, error = ?, finished_at = ? WHERE id = ?",
+                (status, error, time.time(), job_id)
+            )
+        shutil.rmtree(os.path.join(self.images_dir, job_id), ignore_errors=True)
+
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Job row as a dictionary (params decoded), None if unknown"""
+        with self._lock:
+            row = self._connection().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job["params"] = json.loads(job["params"])
+        return job
+
+    def get_results(self, job_id: str) -> List[Dict[str, Any]]:
+        """Results of the finished items of a job, in upload order"""
+        with self._lock:
+            rows = self._connection().execute(
+                "SELECT result FROM job_items WHERE job_id = ? AND result IS NOT NULL ORDER BY idx", (job_id,)
+            ).fetchall()
+        return [json.loads(row["result"]) for row in rows]
+
+    def requeue_stale(self, stale_seconds: float, max_attempts: int) -> Tuple[int, int]:
+        """
+        Put running jobs without progress back in the queue
+
+        Covers a crash or restart mid-job; finished items keep their results,
+        so only the remaining images are processed again. Jobs that already used
+        max_attempts claims are failed instead, so a job that keeps killing its
+        worker is not retried forever.
+
+        Args:
+            stale_seconds: Seconds since the last heartbeat after which a running job is stale
+            max_attempts: Claims after which a stale job is failed
+
+        Returns:
+            Tuple of (requeued jobs, failed jobs)
+        """
+        now = time.time()
+        cutoff = now - stale_seconds
+        with self._lock:
+            conn = self._connection()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                failed_ids = [
+                    row["id"] for row in conn.execute(
+                        "SELECT id FROM jobs WHERE status = ? AND heartbeat_at < ? AND attempts >= ?",
+                        (JOB_RUNNING, cutoff, max_attempts)
+                    ).fetchall()
+                ]
+                for job_id in failed_ids:
+                    conn.execute(
+                        "UPDATE jobs SET status = ?, error = ?, finished_at = ? WHERE id = ?",
+                        (JOB_FAILED, f"Interrupted {max_attempts} time(s), giving up", now, job_id)
+                    )
+                requeued = conn.execute(
+                    "UPDATE jobs SET status = ? WHERE status = ? AND heartbeat_at < ?",
+                    (JOB_QUEUED, JOB_RUNNING, cutoff)
+                ).rowcount
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        for job_id in failed_ids:
+            shutil.rmtree(os.path.join(self.images_dir, job_id), ignore_errors=True)
+        return requeued, len(failed_ids)
+
+    def purge_finished(self, retention_seconds: float) -> int:
+        """
+        Delete finished jobs older than the retention period
+
+        Returns:
+            Number of deleted jobs
+        """
+        cutoff = time.time() - retention_seconds
+        with self._lock:
+            conn = self._connection()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                job_ids = [
+                    row["id"] for row in conn.execute(
+                        f"SELECT id FROM jobs WHERE status IN ({','.join('?' * len(FINISHED_STATUSES))}) "
+                        "AND finished_at < ?",
+                        (*FINISHED_STATUSES, cutoff)
+                    ).fetchall()
+                ]
+                for job_id in job_ids:
+                    conn.execute("DELETE FROM job_items WHERE job_id = ?", (job_id,))
+                    conn.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return len(job_ids)
+
+    def close(self) -> None:
+        """Close the database connection"""
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+class JobRunner:
+    """Bounded pool of asyncio workers processing queued jobs one image at a time"""
+
+    def __init__(
+        self,
+        store: JobStore,
+        workers: int = 1,
+        stale_seconds: float = 300.0,
+        max_attempts: int = 3,
+        retention_seconds: float = 86400.0,
+        poll_interval: float = 2.0
+    ):
+        self.store = store
+        self.workers = max(0, workers)
+        self.stale_seconds = stale_seconds
+        self.max_attempts = max(1, max_attempts)
+        self.retention_seconds = retention_seconds
+        self.poll_interval = poll_interval
+        self._tasks: List[asyncio.Task] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._changed: Optional[asyncio.Event] = None
+        self._last_maintenance = 0.0
+
+    async def start(self) -> None:
+        """Requeue jobs interrupted by a restart and start the workers"""
+        if self.workers == 0 or self._tasks:
+            return
+        self._wakeup = asyncio.Event()
+        self._changed = asyncio.Event()
+        await self._maintenance()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        print(f"Job runner started ({self.workers} workers, store: {self.store.directory})")
+
+    async def shutdown(self) -> None:
+        """Stop the workers, running jobs are picked up again after the restart"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks.clear()
+        self.store.close()
+
+    async def submit(self, params: Dict[str, Any], uploads: List[Tuple[str, BinaryIO]]) -> Dict[str, Any]:
+        """
+        Store and queue a job
+
+        Args:
+            params: Prediction parameters
+            uploads: (filename, file object) per image
+
+        Returns:
+            Job row as a dictionary
+        """
+        job = await asyncio.to_thread(self.store.create_job, params, uploads)
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return job
+
+    async def get(self, job_id: str, wait: float = 0.0) -> Optional[Dict[str, Any]]:
+        """
+        Get a job, optionally long-polling until it has finished
+
+        Jobs processed by another API process are noticed by polling the store.
+
+        Args:
+            job_id: Job id
+            wait: Maximum seconds to wait for the job to finish
+
+        Returns:
+            Job row as a dictionary, None if unknown
+        """
+        deadline = time.monotonic() + max(0.0, wait)
+        while True:
+            changed = self._changed
+            job = await asyncio.to_thread(self.store.get_job, job_id)
+            remaining = deadline - time.monotonic()
+            if job is None or job["status"] in FINISHED_STATUSES or remaining <= 0:
+                return job
+
+            timeout = min(remaining, self.poll_interval)
+            if changed is None:
+                await asyncio.sleep(timeout)
+                continue
+            try:
+                await asyncio.wait_for(changed.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def results(self, job_id: str) -> List[Dict[str, Any]]:
+        """Results of the finished items of a job"""
+        return await asyncio.to_thread(self.store.get_results, job_id)
+
+    def _notify(self) -> None:
+        # Wake long-polls, then arm a fresh event for the next change
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def _maintenance(self) -> None:
+        self._last_maintenance = time.monotonic()
+        requeued, failed = await asyncio.to_thread(self.store.requeue_stale, self.stale_seconds, self.max_attempts)
+        purged = await asyncio.to_thread(self.store.purge_finished, self.retention_seconds)
+        if requeued or failed or purged:
+            print(f"Jobs: requeued {requeued} stale, failed {failed} after {self.max_attempts} attempts, purged {purged} expired")
+
+    async def _worker(self) -> None:
+        while True:
+            try:
+                if time.monotonic() - self._last_maintenance > 60:
+                    await self._maintenance()
+
+                job = await asyncio.to_thread(self.store.claim_next)
+                if job is None:
+                    self._wakeup.clear()
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+
+                await self._run_job(job)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Job worker error: {e}")
+                import traceback
+                traceback.print_exc()
+                await asyncio.sleep(self.poll_interval)
+
+    async def _run_job(self, job: Dict[str, Any]) -> None:
+        job_id = job["id"]
+        model_type = job["params"]["model_type"]
+        print(f"Job {job_id}: processing {job['total']} image(s) with {model_type} (attempt {job['attempts']})")
+
+        if not await model_manager.ensure_loaded_async(model_type):
+            await asyncio.to_thread(self.store.finish_job, job_id, JOB_FAILED, f"Failed to load model '{model_type}'")
+            self._notify()
+            return
+
+        # A single slow image must not look stale to the runners of other processes
+        heartbeat = asyncio.create_task(self._heartbeat(job_id))
+        try:
+            for index, filename in await asyncio.to_thread(self.store.pending_items, job_id):
+                result = await self._run_item(job_id, index, filename, job["params"])
+                await asyncio.to_thread(self.store.save_result, job_id, index, result)
+                self._notify()
+            await asyncio.to_thread(self.store.finish_job, job_id, JOB_COMPLETED)
+        except Exception as e:
+            # Left running, the job would be requeued and fail the same way again.
+            # Cancellation (shutdown) is not caught: the job resumes after the restart
+            print(f"Job {job_id}: failed: {e}")
+            await asyncio.to_thread(self.store.finish_job, job_id, JOB_FAILED, str(e))
+            self._notify()
+            return
+        finally:
+            heartbeat.cancel()
+            await asyncio.gather(heartbeat, return_exceptions=True)
+
+        self._notify()
+        print(f"Job {job_id}: done")
+
+    async def _heartbeat(self, job_id: str) -> None:
+        # Several beats per stale period, so one delayed write does not cause a requeue
+        interval = max(1.0, self.stale_seconds / 4)
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await asyncio.to_thread(self.store.heartbeat, job_id)
+            except Exception as e:
+                print(f"Job {job_id}: heartbeat failed: {e}")
+
+    async def _run_item(self, job_id: str, index: int, filename: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        model_type = params["model_type"]
+        seg_method = params["seg_method"]
+        use_segmentation = params["use_segmentation"]
+        apply_brightness_contrast = params["apply_brightness_contrast"]
+        result = {
+            "filename": filename,
+            "predicted_class": "",
+            "confidence": 0.0,
+            "all_confidences": {},
+            "device": str(DEVICE),
+            "model_type": model_type,
+            "segmentation_used": use_segmentation,
+            "segmentation_method": seg_method if use_segmentation else None,
+            "apply_brightness_contrast": apply_brightness_contrast,
+            "prediction_time_ms": 0.0,
+            "error": None,
+        }
+
+        start_time = time.time()
+        try:
+            with open(self.store.image_path(job_id, index), "rb") as f:
+                image_bytes = await asyncio.to_thread(f.read)
+
+            image_hash = hash_image_bytes(image_bytes)
+            cache_key = prediction_cache_key(
+                image_hash, model_type, seg_method, use_segmentation, apply_brightness_contrast
+            )
+            prediction = prediction_cache.get(cache_key)
+            cached = prediction is not None
+            timings = {}
+
+            if not cached:
+                model_input, _, timings = await stage_executor.run(
+                    "jobs",
+                    prepare_model_input_from_bytes,
+                    image_bytes,
+                    use_segmentation=use_segmentation,
+                    seg_method=seg_method,
+                    apply_brightness_contrast=apply_brightness_contrast,
+                    model_type=model_type,
+                    image_hash=image_hash
+                )
+                prediction = await micro_batcher.submit(model_type, model_input, timings=timings)
+                if not segmentation_degraded(timings):
+                    prediction_cache.set(cache_key, prediction)
+        except Exception as e:
+            result["error"] = str(e)
+            return result
+
+        predicted_class, confidence_value, all_confidences = prediction
+        prediction_time_ms = (time.time() - start_time) * 1000
+        timings["total"] = prediction_time_ms
+        if not cached:
+            timing_aggregator.record(timings)
+        record_prediction(model_type, seg_method if use_segmentation else None, timings, cached=cached)
+
+        result.update(
+            predicted_class=predicted_class,
+            confidence=confidence_value,
+            all_confidences=all_confidences,
+            prediction_time_ms=prediction_time_ms
+        )
+        return result
+
+
+# Global job runner instance
+job_runner = JobRunner(
+    JobStore(JOBS_DIR),
+    workers=JOB_WORKERS,
+    stale_seconds=JOB_STALE_SECONDS,
+    max_attempts=JOB_MAX_ATTEMPTS,
+    retention_seconds=JOB_RETENTION_HOURS * 3600
+)
@@ -4,31 +4,190 @@ Model loading and management
 
 import os
 import sys
-import torch
-from typing import Dict, Optional, Union
+import threading
+import time
+from typing import TYPE_CHECKING, Callable, Dict, Optional, Tuple, Union
 
 # Add lib directory to path
 lib_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'lib')
 if lib_path not in sys.path:
     sys.path.append(lib_path)
 
-from lib.model_v2 import ModelMLPV2
-from lib.model_effnet import EfficientNetV2Model
-from api.configs.pcvk_config import MODEL_PATHS, ONNX_MODEL_PATHS, CLASS_NAMES, DEVICE, NUM_FEATURES, PREFER_ONNX
+import lib.segment as segment_module
+from api.configs.pcvk_config import (
+    MODEL_PATHS,
+    ONNX_MODEL_PATHS,
+    CLASS_NAMES,
+    DEVICE,
+    NUM_FEATURES,
+    PREFER_ONNX,
+    SLIM_RUNTIME,
+    MODEL_MEMORY_BUDGET_MB,
+    ONNX_SESSION_POOL_SIZE,
+    NUMPY_MODEL_PATHS,
+    MLP_ENGINE,
+    TORCH_CPU_OPTIMIZE,
+    get_onnx_model_path
+)
 from api.services.classification.onnx_utils import ONNXInferenceSession
+from api.services.classification.cache import invalidate_model_predictions
+from api.services.executor import stage_executor
+from api.services.metrics import record_model_load
+
+if TYPE_CHECKING:
+    import torch
+
+# Loads tried by acquire when a tight memory budget evicts the model again right away
+ACQUIRE_ATTEMPTS = 3
 
 
 class ModelManager:
     """Manages loading and accessing ML models"""
     
     def __init__(self):
-        self.models: Dict[str, Union[torch.nn.Module, ONNXInferenceSession]] = {}
-        self.model_types: Dict[str, str] = {}  # Track whether model is 'pytorch' or 'onnx'
+        self.models: Dict[str, Union['torch.nn.Module', ONNXInferenceSession]] = {}
+        self.model_types: Dict[str, str] = {}  # Track whether model is 'pytorch', 'onnx' or 'numpy'
+        self.model_artifacts: Dict[str, Tuple[str, str, float]] = {}  # Last loaded (kind, path, mtime), kept after unload
+        self.load_durations_ms: Dict[str, float] = {}  # Duration of the last successful load per model
+        self._load_locks: Dict[str, threading.RLock] = {}
+        self._load_locks_guard = threading.Lock()
+        
+        # Memory residency: approximate bytes and last use per resident model,
+        # including models held outside self.models (U2Net-P session, OCR)
+        self.memory_budget_bytes = int(MODEL_MEMORY_BUDGET_MB * 1024 * 1024)
+        self.resident_bytes: Dict[str, int] = {}
+        self._last_used: Dict[str, float] = {}
+        self._external_unloaders: Dict[str, Callable[[], object]] = {}
+        self._residency_lock = threading.RLock()
+        
+        segment_module.set_u2netp_residency_hooks(
+            on_load=lambda nbytes: self.register_resident("u2netp", nbytes, self._clear_u2netp_session),
+            on_use=lambda: self.touch("u2netp")
+        )
+    
+    def _get_load_lock(self, model_type: str) -> threading.RLock:
+        """Get the lock that serializes loads of one model type"""
+        with self._load_locks_guard:
+            lock = self._load_locks.get(model_type)
+            if lock is None:
+                lock = threading.RLock()
+                self._load_locks[model_type] = lock
+            return lock
+    
+    def ensure_loaded(self, model_type: str) -> bool:
+        """
+        Load a model unless it is already loaded (single-flight)
+        
+        Concurrent callers for the same model wait for the one load in progress
+        instead of each building their own copy.
+        
+        Args:
+            model_type: Type of model to load
+        
+        Returns:
+            True if the model is loaded, False otherwise
+        """
+        if self.is_loaded(model_type):
+            return True
+        
+        with self._get_load_lock(model_type):
+            if self.is_loaded(model_type):
+                return True
+            print(f"Model {model_type} not loaded, loading now...")
+            return self.load_model(model_type)
+    
+    async def ensure_loaded_async(self, model_type: str) -> bool:
+        """
+        Async variant of ensure_loaded that loads on the loader executor
+        
+        Args:
+            model_type: Type of model to load
+        
+        Returns:
+            True if the model is loaded, False otherwise
+        """
+        if self.is_loaded(model_type):
+            return True
+        
+        return await stage_executor.run("loader", self.ensure_loaded, model_type)
+    
+    def acquire(self, model_type: str) -> Optional[Tuple[Union['torch.nn.Module', ONNXInferenceSession], str]]:
+        """
+        Load a model if needed and return a handle to it
+        
+        Unlike ensure_loaded followed by get_model, the check and the lookup cannot be
+        separated by an eviction: the handle is read in one step and the model is
+        reloaded if it was evicted meanwhile. The handle keeps the model usable for the
+        caller even if it is evicted afterwards.
+        
+        Args:
+            model_type: Type of model
+        
+        Returns:
+            Tuple of (model, runtime: 'pytorch', 'onnx' or 'numpy'), None if it cannot be loaded
+        """
+        for _ in range(ACQUIRE_ATTEMPTS):
+            handle = self._handle(model_type)
+            if handle is not None:
+                return handle
+            if not self.ensure_loaded(model_type):
+                return None
+        print(f"Model {model_type} was evicted again right after loading, memory budget too small?")
+        return None
+    
+    async def acquire_async(self, model_type: str) -> Optional[Tuple[Union['torch.nn.Module', ONNXInferenceSession], str]]:
+        """
+        Async variant of acquire that loads on the loader executor
+        
+        Args:
+            model_type: Type of model
+        
+        Returns:
+            Tuple of (model, runtime), None if it cannot be loaded
+        """
+        handle = self._handle(model_type)
+        if handle is not None:
+            return handle
+        
+        return await stage_executor.run("loader", self.acquire, model_type)
+    
+    def _handle(self, model_type: str) -> Optional[Tuple[Union['torch.nn.Module', ONNXInferenceSession], str]]:
+        # Evictions happen under the residency lock, so model and runtime stay consistent
+        with self._residency_lock:
+            model = self.models.get(model_type)
+            runtime = self.model_types.get(model_type)
+        if model is None:
+            return None
+        self.touch(model_type)
+        return model, runtime
     
     def load_model(self, model_type: str, force_pytorch: bool = False) -> bool:
         """
         Load a specific model
         
+        Args:
+            model_type: Type of model to load
+            force_pytorch: Force loading PyTorch model even if ONNX is preferred
+        
+        Returns:
+            True if successful, False otherwise
+        """
+        with self._get_load_lock(model_type):
+            start_time = time.perf_counter()
+            success = self._load_model_unlocked(model_type, force_pytorch)
+            
+            if success:
+                duration_ms = (time.perf_counter() - start_time) * 1000
+                self.load_durations_ms[model_type] = duration_ms
+                record_model_load(model_type, duration_ms / 1000)
+                print(f"Model {model_type} loaded in {duration_ms:.1f} ms")
+            
+            return success
+    
+    def _load_model_unlocked(self, model_type: str, force_pytorch: bool = False) -> bool:
+        """
+        Load a specific model, caller must hold the model's load lock
+        
         Args:
             model_type: Type of model to load
             force_pytorch: Force loading PyTorch model even if ONNX is preferred
@@ -41,12 +200,17 @@ class ModelManager:
             use_onnx = PREFER_ONNX and not force_pytorch and model_type in ONNX_MODEL_PATHS
             
             if use_onnx:
-                onnx_path = ONNX_MODEL_PATHS[model_type]
+                onnx_path = get_onnx_model_path(model_type)
                 if os.path.exists(onnx_path):
                     print(f"Loading {model_type} model (ONNX)...")
+                    # Every pooled session holds its own copy of the weights
+                    onnx_bytes = _file_bytes(onnx_path) * max(1, ONNX_SESSION_POOL_SIZE)
+                    self._make_room(model_type, onnx_bytes)
                     session = ONNXInferenceSession(onnx_path)
                     self.models[model_type] = session
                     self.model_types[model_type] = 'onnx'
+                    self._set_resident(model_type, onnx_bytes)
+                    self._record_artifact(model_type, 'onnx', onnx_path)
                     print(f"ONNX model {model_type} loaded successfully")
                     return True
                 else:
@@ -54,6 +218,9 @@ class ModelManager:
                     use_onnx = False
             
             if not use_onnx:
+                # The slim runtime has no torch, folded weights are its only non-ONNX option
+                if (MLP_ENGINE == "numpy" or SLIM_RUNTIME) and model_type in NUMPY_MODEL_PATHS:
+                    return self._load_numpy_model(model_type)
                 return self._load_pytorch_model(model_type)
                 
         except Exception as e:
@@ -72,7 +239,16 @@ class ModelManager:
         Returns:
             True if successful, False otherwise
         """
+        if SLIM_RUNTIME:
+            print(f"Cannot load {model_type}: no ONNX model available and PyTorch is disabled (SLIM_RUNTIME=true)")
+            return False
+        
         try:
+            # Imported on first use so ONNX-only deployments never pay for torch
+            import torch
+            from lib.model_v2 import ModelMLPV2
+            from lib.model_effnet import EfficientNetV2Model, optimize_for_cpu_inference
+            
             print(f"Loading {model_type} model (PyTorch)...")
             
             if model_type not in MODEL_PATHS:
@@ -112,6 +288,7 @@ class ModelManager:
                 raise ValueError(f"Unknown model type: {model_type}")
             
             # Load checkpoint
+            self._make_room(model_type, _file_bytes(model_path))
             checkpoint = torch.load(model_path, map_location=DEVICE)
             
             # Handle different checkpoint formats
@@ -122,8 +299,21 @@ class ModelManager:
             
             model = model.to(DEVICE)
             model.eval()
+            # Frozen modules hold their weights as constants, count them beforehand
+            resident_bytes = _module_bytes(model)
+            
+            if model_type == "efficientnetv2" and str(DEVICE) == "cpu" and TORCH_CPU_OPTIMIZE != "none":
+                try:
+                    start_time = time.perf_counter()
+                    model = optimize_for_cpu_inference(model, mode=TORCH_CPU_OPTIMIZE)
+                    print(f"Optimized {model_type} for CPU ({TORCH_CPU_OPTIMIZE}) in {(time.perf_counter() - start_time) * 1000:.1f} ms")
+                except Exception as e:
+                    print(f"Warning: CPU optimization ({TORCH_CPU_OPTIMIZE}) of {model_type} failed, using eager mode: {e}")
+            
             self.models[model_type] = model
             self.model_types[model_type] = 'pytorch'
+            self._set_resident(model_type, resident_bytes)
+            self._record_artifact(model_type, 'pytorch', model_path)
             print(f"PyTorch model {model_type} loaded successfully on {DEVICE}")
             return True
             
@@ -133,6 +323,137 @@ class ModelManager:
             traceback.print_exc()
             return False
     
+    def _load_numpy_model(self, model_type: str) -> bool:
+        """
+        Load an MLP as a NumPy model with BatchNorm folded into the Linear layers
+        
+        Uses the .npz weights if present (no torch needed), otherwise folds the .pth checkpoint.
+        
+        Args:
+            model_type: Type of model to load (mlpv2, mlpv2_auto-clahe)
+        
+        Returns:
+            True if successful, False otherwise
+        """
+        from lib.model_v2_numpy import NumpyMLPV2
+        
+        try:
+            npz_path = NUMPY_MODEL_PATHS[model_type]
+            if os.path.exists(npz_path):
+                print(f"Loading {model_type} model (NumPy)...")
+                model = NumpyMLPV2.load(npz_path)
+                model_path = npz_path
+            else:
+                model_path = MODEL_PATHS[model_type]
+                if SLIM_RUNTIME or not os.path.exists(model_path):
+                    print(f"Warning: no NumPy weights at {npz_path} and cannot fold {model_path}")
+                    return False
+                
+                import torch
+                
+                print(f"Loading {model_type} model (NumPy, folded from PyTorch checkpoint)...")
+                checkpoint = torch.load(model_path, map_location="cpu")
+                if isinstance(checkpoint, dict) and 'model_state_dict' in checkpoint:
+                    checkpoint = checkpoint['model_state_dict']
+                model = NumpyMLPV2.from_state_dict(checkpoint)
+            
+            self._make_room(model_type, model.nbytes)
+            self.models[model_type] = model
+            self.model_types[model_type] = 'numpy'
+            self._set_resident(model_type, model.nbytes)
+            self._record_artifact(model_type, 'numpy', model_path)
+            print(f"NumPy model {model_type} loaded successfully")
+            return True
+        
+        except Exception as e:
+            print(f"Error loading NumPy model {model_type}: {e}")
+            import traceback
+            traceback.print_exc()
+            return False
+    
+    def _record_artifact(self, model_type: str, kind: str, path: str) -> None:
+        """
+        Remember which artifact backs a model and drop cached predictions if it changed
+        
+        Args:
+            model_type: Type of model that was loaded
+            kind: 'pytorch', 'onnx' or 'numpy'
+            path: Path of the loaded model file
+        """
+        artifact = (kind, path, os.path.getmtime(path))
+        previous = self.model_artifacts.get(model_type)
+        if previous is not None and previous != artifact:
+            removed = invalidate_model_predictions(model_type)
+            print(f"Model artifact for {model_type} changed, invalidated {removed} cached prediction(s)")
+        self.model_artifacts[model_type] = artifact
+    
+    def register_resident(self, name: str, nbytes: int, unload_fn: Optional[Callable[[], object]] = None) -> None:
+        """
+        Account for a model held outside self.models, evicting others if over budget
+        
+        Args:
+            name: Residency name (e.g. 'u2netp', 'ocr')
+            nbytes: Approximate resident size in bytes
+            unload_fn: Function that frees the model when it gets evicted
+        """
+        with self._residency_lock:
+            self._make_room(name, nbytes)
+            if unload_fn is not None:
+                self._external_unloaders[name] = unload_fn
+            self._set_resident(name, nbytes)
+    
+    def release_resident(self, name: str) -> None:
+        """Forget residency accounting for a model that has been freed"""
+        with self._residency_lock:
+            self.resident_bytes.pop(name, None)
+            self._last_used.pop(name, None)
+    
+    def touch(self, name: str) -> None:
+        """Mark a resident model as recently used"""
+        if name in self.resident_bytes:
+            self._last_used[name] = time.monotonic()
+    
+    def _set_resident(self, name: str, nbytes: int) -> None:
+        with self._residency_lock:
+            self.resident_bytes[name] = nbytes
+            self._last_used[name] = time.monotonic()
+    
+    def _make_room(self, name: str, nbytes: int) -> None:
+        """
+        Evict least recently used models until `nbytes` more fit in the memory budget
+        
+        Args:
+            name: Model about to be loaded (never evicted here)
+            nbytes: Expected size of that model in bytes
+        """
+        if self.memory_budget_bytes <= 0:
+            return
+        
+        with self._residency_lock:
+            while True:
+                others = {n: b for n, b in self.resident_bytes.items() if n != name}
+                if sum(others.values()) + nbytes <= self.memory_budget_bytes:
+                    return
+                if not others:
+                    print(f"WARNING: {name} ({nbytes / 1024 / 1024:.1f} MB) alone exceeds the memory budget")
+                    return
+                
+                victim = min(others, key=lambda n: self._last_used.get(n, 0.0))
+                self._evict(victim)
+    
+    def _evict(self, name: str) -> None:
+        """Free one resident model to stay within the memory budget"""
+        print(f"Evicting {name} ({self.resident_bytes.get(name, 0) / 1024 / 1024:.1f} MB) to stay within memory budget")
+        
+        if name in self.models:
+            del self.models[name]
+            self.model_types.pop(name, None)
+            _empty_cuda_cache()
+        elif name in self._external_unloaders:
+            self._external_unloaders[name]()
+        
+        self.release_resident(name)
+    
     def load_all_models(self) -> bool:
         """
         Load all available models
@@ -145,7 +466,7 @@ class ModelManager:
         self.load_model("efficientnetv2")
         return True
     
-    def get_model(self, model_type: str) -> Optional[Union[torch.nn.Module, ONNXInferenceSession]]:
+    def get_model(self, model_type: str) -> Optional[Union['torch.nn.Module', ONNXInferenceSession]]:
         """
         Get a loaded model
         
@@ -155,17 +476,20 @@ class ModelManager:
         Returns:
             Model instance or None if not loaded
         """
-        return self.models.get(model_type)
+        model = self.models.get(model_type)
+        if model is not None:
+            self.touch(model_type)
+        return model
     
     def get_model_type(self, model_type: str) -> Optional[str]:
         """
-        Get the type of loaded model (pytorch or onnx)
+        Get the type of loaded model (pytorch, onnx or numpy)
         
         Args:
             model_type: Type of model
         
         Returns:
-            'pytorch', 'onnx', or None if not loaded
+            'pytorch', 'onnx', 'numpy', or None if not loaded
         """
         return self.model_types.get(model_type)
     
@@ -184,10 +508,8 @@ class ModelManager:
     def _clear_u2netp_session(self) -> None:
         """Clear U2Net-P ONNX session from segment module"""
         try:
-            import lib.segment as segment_module
-            if hasattr(segment_module, '_u2netp_session') and segment_module._u2netp_session is not None:
-                del segment_module._u2netp_session
-                segment_module._u2netp_session = None
+            if segment_module.clear_u2netp_session():
+                self.release_resident("u2netp")
                 print("U2Net-P ONNX session cleared")
         except Exception as e:
             print(f"Error clearing U2Net-P session: {e}")
@@ -209,13 +531,13 @@ class ModelManager:
             
             # Delete the model and free up memory
             del self.models[model_type]
+            self.release_resident(model_type)
             
             # Clear U2Net-P ONNX session
             self._clear_u2netp_session()
             
             # Clear GPU cache if using CUDA
-            if DEVICE == 'cuda':
-                torch.cuda.empty_cache()
+            _empty_cuda_cache()
             
             print(f"Model {model_type} unloaded successfully")
             return True
@@ -235,13 +557,13 @@ class ModelManager:
             model_types = list(self.models.keys())
             for model_type in model_types:
                 del self.models[model_type]
+                self.release_resident(model_type)
             
             # Clear U2Net-P ONNX session
             self._clear_u2netp_session()
             
             # Clear GPU cache if using CUDA
-            if DEVICE == 'cuda':
-                torch.cuda.empty_cache()
+            _empty_cuda_cache()
             
             print("All models unloaded successfully")
             return True
@@ -251,5 +573,26 @@ class ModelManager:
             return False
 
 
+def _file_bytes(path: str) -> int:
+    """Size of a model file including ONNX external data, if any"""
+    size = os.path.getsize(path)
+    if os.path.exists(path + ".data"):
+        size += os.path.getsize(path + ".data")
+    return size
+
+
+def _empty_cuda_cache() -> None:
+    """Release cached GPU memory (torch is already imported whenever DEVICE is cuda)"""
+    if str(DEVICE) == 'cuda':
+        import torch
+        torch.cuda.empty_cache()
+
+
+def _module_bytes(model: 'torch.nn.Module') -> int:
+    """Bytes held by the parameters and buffers of a PyTorch module"""
+    tensors = list(model.parameters()) + list(model.buffers())
+    return sum(t.numel() * t.element_size() for t in tensors)
+
+
 # Global model manager instance
 model_manager = ModelManager()
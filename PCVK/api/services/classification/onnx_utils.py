@@ -4,19 +4,67 @@ ONNX model utilities for inference
 
 import onnxruntime as ort
 import numpy as np
-from typing import Dict, Tuple
+from typing import Dict, Optional, Tuple
 import os
+import queue
+
+from api.configs.pcvk_config import (
+    ONNX_INTRA_OP_THREADS,
+    ONNX_INTER_OP_THREADS,
+    ONNX_EXECUTION_MODE,
+    ONNX_SESSION_POOL_SIZE,
+    ONNX_USE_IOBINDING
+)
+
+# Distinct input shapes to keep bound buffers for per session (one per batch size in practice)
+_MAX_BOUND_SHAPES = 8
+
+
+class _BoundBuffers:
+    """Preallocated input/output arrays bound to a session through IOBinding"""
+    
+    def __init__(self, session: ort.InferenceSession, input_name: str, output_name: str,
+                 input_shape: Tuple[int, ...], output_shape: Tuple[int, ...]):
+        self.input = np.empty(input_shape, dtype=np.float32)
+        self.output = np.empty(output_shape, dtype=np.float32)
+        
+        # OrtValues created from numpy arrays share their memory, so writing into
+        # self.input and reading self.output needs no copies through ONNX Runtime
+        self.binding = session.io_binding()
+        self.binding.bind_ortvalue_input(input_name, ort.OrtValue.ortvalue_from_numpy(self.input))
+        self.binding.bind_ortvalue_output(output_name, ort.OrtValue.ortvalue_from_numpy(self.output))
+
+
+class _PooledSession:
+    """One session of the pool with its own IOBinding buffers (bindings are not thread-safe)"""
+    
+    def __init__(self, session: ort.InferenceSession):
+        self.session = session
+        self.bound: Dict[Tuple[int, ...], _BoundBuffers] = {}
 
 
 class ONNXInferenceSession:
     """Wrapper for ONNX Runtime inference sessions"""
     
-    def __init__(self, model_path: str):
+    def __init__(
+        self,
+        model_path: str,
+        intra_op_threads: int = ONNX_INTRA_OP_THREADS,
+        inter_op_threads: int = ONNX_INTER_OP_THREADS,
+        execution_mode: str = ONNX_EXECUTION_MODE,
+        pool_size: int = ONNX_SESSION_POOL_SIZE,
+        use_iobinding: bool = ONNX_USE_IOBINDING
+    ):
         """
         Initialize ONNX inference session
         
         Args:
             model_path: Path to the ONNX model file
+            intra_op_threads: Threads per operator, 0 for the ONNX Runtime default
+            inter_op_threads: Threads across graph nodes (parallel mode), 0 for the default
+            execution_mode: 'sequential' or 'parallel'
+            pool_size: Number of sessions serving concurrent callers
+            use_iobinding: Run fixed input shapes through preallocated, bound buffers
         """
         if not os.path.exists(model_path):
             raise FileNotFoundError(f"ONNX model not found at {model_path}")
@@ -24,18 +72,30 @@ class ONNXInferenceSession:
         # Set up session options
         sess_options = ort.SessionOptions()
         sess_options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if intra_op_threads > 0:
+            sess_options.intra_op_num_threads = intra_op_threads
+        if inter_op_threads > 0:
+            sess_options.inter_op_num_threads = inter_op_threads
+        if execution_mode == "parallel":
+            sess_options.execution_mode = ort.ExecutionMode.ORT_PARALLEL
+        else:
+            sess_options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
         
         # Check for available providers
         providers = ['CPUExecutionProvider']
         if 'CUDAExecutionProvider' in ort.get_available_providers():
             providers.insert(0, 'CUDAExecutionProvider')
         
-        # Create session
-        self.session = ort.InferenceSession(
-            model_path,
-            sess_options=sess_options,
-            providers=providers
-        )
+        # Create session pool
+        self.pool_size = max(1, pool_size)
+        sessions = [
+            ort.InferenceSession(model_path, sess_options=sess_options, providers=providers)
+            for _ in range(self.pool_size)
+        ]
+        self._pool: "queue.Queue[_PooledSession]" = queue.Queue()
+        for session in sessions:
+            self._pool.put(_PooledSession(session))
+        self.session = sessions[0]
         
         # Get input/output metadata
         self.input_name = self.session.get_inputs()[0].name
@@ -43,10 +103,19 @@ class ONNXInferenceSession:
         self.input_shape = self.session.get_inputs()[0].shape
         self.output_shape = self.session.get_outputs()[0].shape
         
+        # Fixed batch dimension (e.g. exported without --dynamic_batch), None if dynamic
+        batch_dim = self.input_shape[0] if self.input_shape else None
+        self.max_batch_size = batch_dim if isinstance(batch_dim, int) and batch_dim > 0 else None
+        
+        # Buffers live in host memory, so binding only pays off on the CPU provider
+        self.use_iobinding = use_iobinding and self.session.get_providers()[0] == 'CPUExecutionProvider'
+        
         print(f"ONNX model loaded: {model_path}")
         print(f"Input: {self.input_name}, Shape: {self.input_shape}")
         print(f"Output: {self.output_name}, Shape: {self.output_shape}")
         print(f"Providers: {self.session.get_providers()}")
+        print(f"Sessions: {self.pool_size}, intra/inter-op threads: {intra_op_threads or 'default'}/"
+              f"{inter_op_threads or 'default'}, mode: {execution_mode}, IOBinding: {self.use_iobinding}")
     
     def run(self, input_data: np.ndarray) -> np.ndarray:
         """
@@ -64,16 +133,80 @@ class ONNXInferenceSession:
         elif input_data.ndim == 3:
             input_data = input_data.reshape(1, *input_data.shape)
         
-        # Ensure float32 dtype
-        input_data = input_data.astype(np.float32)
+        pooled = self._pool.get()
+        try:
+            bound = self._get_bound_buffers(pooled, input_data.shape) if self.use_iobinding else None
+            if bound is not None:
+                # Copies (and casts if needed) straight into the bound input buffer
+                np.copyto(bound.input, input_data, casting='same_kind')
+                pooled.session.run_with_iobinding(bound.binding)
+                # The output buffer is reused by the next call on this session
+                return bound.output.copy()
+            
+            # Ensure float32 dtype without copying inputs that already are
+            input_data = np.ascontiguousarray(input_data, dtype=np.float32)
+            
+            # Run inference
+            outputs = pooled.session.run(
+                [self.output_name],
+                {self.input_name: input_data}
+            )
+            
+            return outputs[0]
+        finally:
+            self._pool.put(pooled)
+    
+    def _get_bound_buffers(self, pooled: _PooledSession, input_shape: Tuple[int, ...]) -> Optional[_BoundBuffers]:
+        """
+        Get (or create) the bound buffers of a session for an input shape
         
-        # Run inference
-        outputs = self.session.run(
-            [self.output_name],
-            {self.input_name: input_data}
-        )
+        Returns:
+            Bound buffers, or None if the output shape cannot be determined up front
+        """
+        input_shape = tuple(input_shape)
+        bound = pooled.bound.get(input_shape)
+        if bound is not None:
+            return bound
+        
+        if len(pooled.bound) >= _MAX_BOUND_SHAPES:
+            return None
+        
+        # Fixed model dims must match the request, symbolic ones take the request's size
+        if len(input_shape) != len(self.input_shape):
+            return None
+        for dim, model_dim in zip(input_shape, self.input_shape):
+            if isinstance(model_dim, int) and model_dim != dim:
+                return None
+        
+        output_shape = []
+        for i, dim in enumerate(self.output_shape):
+            if isinstance(dim, int) and dim > 0:
+                output_shape.append(dim)
+            elif i == 0:
+                output_shape.append(input_shape[0])
+            else:
+                return None
+        
+        bound = _BoundBuffers(pooled.session, self.input_name, self.output_name, input_shape, tuple(output_shape))
+        pooled.bound[input_shape] = bound
+        return bound
+    
+    def run_batch(self, batch: np.ndarray) -> np.ndarray:
+        """
+        Run inference on a stacked batch
+        
+        Falls back to one call per sample when the exported model has a fixed batch size.
+        
+        Args:
+            batch: Input numpy array with a leading batch dimension
+        
+        Returns:
+            Output numpy array with one row per sample
+        """
+        if self.max_batch_size is None or len(batch) == self.max_batch_size:
+            return self.run(batch)
         
-        return outputs[0]
+        return np.concatenate([self.run(batch[i:i + 1]) for i in range(len(batch))], axis=0)
     
     def get_input_shape(self) -> list:
         """Get expected input shape"""
@@ -117,7 +250,7 @@ def predict_onnx_mlp(
     # Ensure features are in correct shape and dtype
     if features.ndim == 1:
         features = features.reshape(1, -1)
-    features = features.astype(np.float32)
+    features = np.asarray(features, dtype=np.float32)
     
     # Run inference
     outputs = session.run(features)
@@ -158,7 +291,7 @@ def predict_onnx_efficientnet(
         image_tensor = image_tensor.reshape(1, *image_tensor.shape)
     
     # Ensure float32 dtype
-    image_tensor = image_tensor.astype(np.float32)
+    image_tensor = np.asarray(image_tensor, dtype=np.float32)
     
     # Run inference
     outputs = session.run(image_tensor)
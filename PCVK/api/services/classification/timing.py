@@ -0,0 +1,83 @@
+"""
+Server-side aggregation of per-stage pipeline timings
+"""
+
+import threading
+from collections import deque
+from typing import Any, Deque, Dict
+
+import numpy as np
+
+from api.configs.pcvk_config import TIMING_WINDOW_SIZE
+
+
+class TimingAggregator:
+    """Thread-safe per-stage latency statistics over a sliding window of requests"""
+
+    def __init__(self, window_size: int = 1000):
+        """
+        Initialize aggregator
+
+        Args:
+            window_size: Number of recent samples per stage used for percentiles
+        """
+        self.window_size = max(1, window_size)
+        self._samples: Dict[str, Deque[float]] = {}
+        self._counts: Dict[str, int] = {}
+        self._totals: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def record(self, timings: Dict[str, float]) -> None:
+        """
+        Add the stage durations of one request
+
+        Args:
+            timings: Stage name -> duration in milliseconds
+        """
+        with self._lock:
+            for stage, duration_ms in timings.items():
+                samples = self._samples.get(stage)
+                if samples is None:
+                    samples = deque(maxlen=self.window_size)
+                    self._samples[stage] = samples
+                samples.append(duration_ms)
+                self._counts[stage] = self._counts.get(stage, 0) + 1
+                self._totals[stage] = self._totals.get(stage, 0.0) + duration_ms
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Get statistics per stage
+
+        Returns:
+            Stage name -> count, total_ms and mean/p50/p95/p99/max over the window
+        """
+        with self._lock:
+            snapshot = {
+                stage: (np.array(samples), self._counts[stage], self._totals[stage])
+                for stage, samples in self._samples.items()
+            }
+
+        stats = {}
+        for stage, (samples, count, total_ms) in snapshot.items():
+            p50, p95, p99 = np.percentile(samples, [50, 95, 99])
+            stats[stage] = {
+                "count": count,
+                "total_ms": total_ms,
+                "mean_ms": float(samples.mean()),
+                "p50_ms": float(p50),
+                "p95_ms": float(p95),
+                "p99_ms": float(p99),
+                "max_ms": float(samples.max()),
+            }
+        return stats
+
+    def reset(self) -> None:
+        """Drop all recorded samples"""
+        with self._lock:
+            self._samples.clear()
+            self._counts.clear()
+            self._totals.clear()
+
+
+# Global timing aggregator instance
+timing_aggregator = TimingAggregator(window_size=TIMING_WINDOW_SIZE)
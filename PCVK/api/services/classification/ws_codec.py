@@ -0,0 +1,309 @@
+"""
+Binary frame codec for the WebSocket prediction protocol v2 (/api/pcvk/ws/v2/predict)
+
+Every message is one binary WebSocket frame; all integers are big-endian.
+
+Request (client -> server), 14-byte header followed by the encoded image:
+    magic       2s   b"PV"
+    version     B    2
+    flags       B    bit0 use_segmentation, bit1 apply_brightness_contrast,
+                     bit2 return_processed_image
+    request_id  I    echoed in the response
+    model       B    index into MODEL_CODES
+    seg_method  B    index into SEG_METHOD_CODES
+    length      I    image byte length
+    image       length bytes (JPEG, PNG, ...)
+
+Response (server -> client), 8-byte header:
+    magic       2s   b"PV"
+    version     B    2
+    frame_type  B    FRAME_RESULT, FRAME_LIVE_RESULT or FRAME_ERROR
+    request_id  I
+
+Live result body (?live=true connections), the result body prefixed with:
+    dropped     I    frames dropped on this connection so far (superseded before processing)
+
+Result body:
+    class_index B    index into CLASS_NAMES
+    flags       B    bit0 served from cache, bit1 processed image attached,
+                     bit2 cascade escalated to its second model
+    time_ms     f    float32 prediction time
+    n_classes   B    followed by n_classes float32 confidences in CLASS_NAMES order
+    image_len   I    followed by image_len bytes of JPEG (0 if not attached)
+
+Error body:
+    code        B    ERROR_* code
+    length      H    followed by a UTF-8 message
+"""
+
+import struct
+from typing import Dict, List, NamedTuple, Optional, Sequence
+
+PROTOCOL_VERSION = 2
+MAGIC = b"PV"
+
+# Stable wire indices, append only
+MODEL_CODES = ("mlpv2", "mlpv2_auto-clahe", "efficientnetv2", "cascade")
+SEG_METHOD_CODES = ("hsv", "grabcut", "adaptive", "u2netp", "none")
+
+FRAME_RESULT = 1
+FRAME_ERROR = 2
+FRAME_LIVE_RESULT = 3
+
+ERROR_BAD_FRAME = 1
+ERROR_UNSUPPORTED_VERSION = 2
+ERROR_INVALID_CONFIG = 3
+ERROR_INVALID_IMAGE = 4
+ERROR_MODEL_UNAVAILABLE = 5
+ERROR_INTERNAL = 6
+ERROR_OVERLOADED = 7  # admission control refused the frame, the message says when to retry
+
+_REQUEST_HEADER = struct.Struct("!2sBBIBBI")
+_RESPONSE_HEADER = struct.Struct("!2sBBI")
+_RESULT_PREFIX = struct.Struct("!BBfB")
+_ERROR_PREFIX = struct.Struct("!BH")
+_LENGTH = struct.Struct("!I")
+
+_FLAG_USE_SEGMENTATION = 0x01
+_FLAG_APPLY_BRIGHTNESS_CONTRAST = 0x02
+_FLAG_RETURN_PROCESSED_IMAGE = 0x04
+
+_RESULT_FLAG_CACHED = 0x01
+_RESULT_FLAG_IMAGE = 0x02
+_RESULT_FLAG_ESCALATED = 0x04
+
+
+class ProtocolError(ValueError):
+    """Malformed or unsupported frame, carries the ERROR_* code to report"""
+
+    def __init__(self, code: int, message: str, request_id: int = 0):
+        super().__init__(message)
+        self.code = code
+        self.request_id = request_id
+
+
+class PredictRequestFrame(NamedTuple):
+    """Decoded prediction request"""
+
+    request_id: int
+    model_type: str
+    seg_method: str
+    use_segmentation: bool
+    apply_brightness_contrast: bool
+    return_processed_image: bool
+    image_bytes: bytes
+
+
+def encode_request(
+    request_id: int,
+    image_bytes: bytes,
+    model_type: str = "mlpv2_auto-clahe",
+    seg_method: str = "u2netp",
+    use_segmentation: bool = True,
+    apply_brightness_contrast: bool = True,
+    return_processed_image: bool = False
+) -> bytes:
+    """
+    Build a request frame (client side, e.g. for tests and load generators)
+
+    Args:
+        request_id: Client-chosen id echoed in the response
+        image_bytes: Encoded image
+        model_type: One of MODEL_CODES
+        seg_method: One of SEG_METHOD_CODES
+        use_segmentation: Whether to apply segmentation
+        apply_brightness_contrast: Whether to apply brightness and contrast enhancement
+        return_processed_image: Whether to attach the processed image to the result
+
+    Returns:
+        Binary frame
+    """
+    flags = 0
+    if use_segmentation:
+        flags |= _FLAG_USE_SEGMENTATION
+    if apply_brightness_contrast:
+        flags |= _FLAG_APPLY_BRIGHTNESS_CONTRAST
+    if return_processed_image:
+        flags |= _FLAG_RETURN_PROCESSED_IMAGE
+
+    header = _REQUEST_HEADER.pack(
+        MAGIC,
+        PROTOCOL_VERSION,
+        flags,
+        request_id,
+        MODEL_CODES.index(model_type),
+        SEG_METHOD_CODES.index(seg_method),
+        len(image_bytes)
+    )
+    return header + image_bytes
+
+
+def decode_request(frame: bytes) -> PredictRequestFrame:
+    """
+    Parse a request frame
+
+    Args:
+        frame: Binary WebSocket message
+
+    Returns:
+        Decoded request
+
+    Raises:
+        ProtocolError: If the frame is malformed, of another version or has an unknown config
+    """
+    if len(frame) < _REQUEST_HEADER.size:
+        raise ProtocolError(ERROR_BAD_FRAME, f"Frame shorter than the {_REQUEST_HEADER.size}-byte header")
+
+    magic, version, flags, request_id, model_code, seg_code, length = _REQUEST_HEADER.unpack_from(frame)
+    if magic != MAGIC:
+        raise ProtocolError(ERROR_BAD_FRAME, "Bad magic")
+    if version != PROTOCOL_VERSION:
+        raise ProtocolError(ERROR_UNSUPPORTED_VERSION, f"Unsupported protocol version {version}", request_id)
+    if model_code >= len(MODEL_CODES):
+        raise ProtocolError(ERROR_INVALID_CONFIG, f"Unknown model code {model_code}", request_id)
+    if seg_code >= len(SEG_METHOD_CODES):
+        raise ProtocolError(ERROR_INVALID_CONFIG, f"Unknown segmentation code {seg_code}", request_id)
+    if len(frame) - _REQUEST_HEADER.size != length:
+        raise ProtocolError(
+            ERROR_BAD_FRAME,
+            f"Image length {length} does not match payload of {len(frame) - _REQUEST_HEADER.size} bytes",
+            request_id
+        )
+    if length == 0:
+        raise ProtocolError(ERROR_INVALID_IMAGE, "Empty image", request_id)
+
+    return PredictRequestFrame(
+        request_id=request_id,
+        model_type=MODEL_CODES[model_code],
+        seg_method=SEG_METHOD_CODES[seg_code],
+        use_segmentation=bool(flags & _FLAG_USE_SEGMENTATION),
+        apply_brightness_contrast=bool(flags & _FLAG_APPLY_BRIGHTNESS_CONTRAST),
+        return_processed_image=bool(flags & _FLAG_RETURN_PROCESSED_IMAGE),
+        image_bytes=bytes(frame[_REQUEST_HEADER.size:])
+    )
+
+
+def encode_result(
+    request_id: int,
+    class_index: int,
+    confidences: Sequence[float],
+    prediction_time_ms: float,
+    cached: bool = False,
+    processed_image: Optional[bytes] = None,
+    dropped_frames: Optional[int] = None,
+    escalated: bool = False
+) -> bytes:
+    """
+    Build a result frame
+
+    Args:
+        request_id: Id of the request being answered
+        class_index: Index of the predicted class in CLASS_NAMES
+        confidences: Confidence per class, in CLASS_NAMES order
+        prediction_time_ms: Server-side prediction time
+        cached: Whether the result came from the prediction cache
+        processed_image: Optional JPEG of the processed image
+        dropped_frames: Dropped frame count, makes this a live result frame
+        escalated: Whether a cascade prediction was answered by its second model
+
+    Returns:
+        Binary frame
+    """
+    flags = 0
+    if cached:
+        flags |= _RESULT_FLAG_CACHED
+    if processed_image:
+        flags |= _RESULT_FLAG_IMAGE
+    if escalated:
+        flags |= _RESULT_FLAG_ESCALATED
+
+    image = processed_image or b""
+    if dropped_frames is None:
+        header = _RESPONSE_HEADER.pack(MAGIC, PROTOCOL_VERSION, FRAME_RESULT, request_id)
+    else:
+        header = _RESPONSE_HEADER.pack(MAGIC, PROTOCOL_VERSION, FRAME_LIVE_RESULT, request_id)
+        header += _LENGTH.pack(min(dropped_frames, 0xFFFFFFFF))
+    return b"".join((
+        header,
+        _RESULT_PREFIX.pack(class_index, flags, prediction_time_ms, len(confidences)),
+        struct.pack(f"!{len(confidences)}f", *confidences),
+        _LENGTH.pack(len(image)),
+        image,
+    ))
+
+
+def encode_error(request_id: int, code: int, message: str) -> bytes:
+    """
+    Build an error frame
+
+    Args:
+        request_id: Id of the failed request, 0 if it could not be parsed
+        code: ERROR_* code
+        message: Human-readable description
+
+    Returns:
+        Binary frame
+    """
+    encoded = message.encode("utf-8")[:0xFFFF]
+    return b"".join((
+        _RESPONSE_HEADER.pack(MAGIC, PROTOCOL_VERSION, FRAME_ERROR, request_id),
+        _ERROR_PREFIX.pack(code, len(encoded)),
+        encoded,
+    ))
+
+
+def decode_response(frame: bytes, class_names: Optional[List[str]] = None) -> Dict:
+    """
+    Parse a response frame (client side)
+
+    Args:
+        frame: Binary WebSocket message from the server
+        class_names: Optional class names to map the class index and confidences
+
+    Returns:
+        Dictionary with type ("result" or "error"), request_id and the frame fields,
+        live results also have dropped_frames
+    """
+    magic, version, frame_type, request_id = _RESPONSE_HEADER.unpack_from(frame)
+    if magic != MAGIC or version != PROTOCOL_VERSION:
+        raise ProtocolError(ERROR_BAD_FRAME, "Not a v2 response frame")
+
+    offset = _RESPONSE_HEADER.size
+    if frame_type == FRAME_ERROR:
+        code, length = _ERROR_PREFIX.unpack_from(frame, offset)
+        offset += _ERROR_PREFIX.size
+        return {
+            "type": "error",
+            "request_id": request_id,
+            "code": code,
+            "message": bytes(frame[offset:offset + length]).decode("utf-8"),
+        }
+
+    dropped_frames = None
+    if frame_type == FRAME_LIVE_RESULT:
+        (dropped_frames,) = _LENGTH.unpack_from(frame, offset)
+        offset += _LENGTH.size
+
+    class_index, flags, prediction_time_ms, n_classes = _RESULT_PREFIX.unpack_from(frame, offset)
+    offset += _RESULT_PREFIX.size
+    confidences = list(struct.unpack_from(f"!{n_classes}f", frame, offset))
+    offset += 4 * n_classes
+    (image_len,) = _LENGTH.unpack_from(frame, offset)
+    offset += _LENGTH.size
+
+    result = {
+        "type": "result",
+        "request_id": request_id,
+        "class_index": class_index,
+        "confidences": confidences,
+        "prediction_time_ms": prediction_time_ms,
+        "cached": bool(flags & _RESULT_FLAG_CACHED),
+        "escalated": bool(flags & _RESULT_FLAG_ESCALATED),
+        "processed_image": bytes(frame[offset:offset + image_len]) if image_len else None,
+    }
+    if dropped_frames is not None:
+        result["dropped_frames"] = dropped_frames
+    if class_names is not None:
+        result["predicted_class"] = class_names[class_index]
+        result["all_confidences"] = dict(zip(class_names, confidences))
+    return result
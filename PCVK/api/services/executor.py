@@ -0,0 +1,91 @@
+"""
+Executor layer for CPU-bound work
+
+Keeps segmentation, feature extraction, forward passes and OCR off the asyncio
+event loop so that cheap endpoints (health, uploads) stay responsive.
+"""
+
+import asyncio
+import functools
+import multiprocessing
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict
+
+from api.configs.config import EXECUTOR_STAGES
+
+
+class StageExecutor:
+    """Lazily created executor pool per pipeline stage"""
+
+    def __init__(self, stages: Dict[str, Dict[str, Any]]):
+        self.stages = stages
+        self._executors: Dict[str, Executor] = {}
+        # Tasks submitted but not finished per stage (queued + running), updated on the event loop
+        self._pending: Dict[str, int] = {}
+
+    def get_executor(self, stage: str) -> Executor:
+        """
+        Get (or create) the executor for a stage
+
+        Args:
+            stage: Stage name (preprocess, inference, ocr)
+
+        Returns:
+            Executor instance
+        """
+        executor = self._executors.get(stage)
+        if executor is not None:
+            return executor
+
+        if stage not in self.stages:
+            raise ValueError(f"Unknown executor stage: {stage}")
+
+        kind = self.stages[stage]["kind"]
+        workers = max(1, self.stages[stage]["workers"])
+
+        if kind == "process":
+            # spawn avoids forking a process that already runs threads
+            executor = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        else:
+            executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"{stage}-worker")
+
+        print(f"Executor '{stage}' started ({kind}, {workers} workers)")
+        self._executors[stage] = executor
+        return executor
+
+    async def run(self, stage: str, fn: Callable, *args, **kwargs) -> Any:
+        """
+        Run a function in the executor of a stage
+
+        Args:
+            stage: Stage name
+            fn: Function to run (must be picklable for process stages)
+            *args, **kwargs: Arguments passed to fn
+
+        Returns:
+            Return value of fn
+        """
+        loop = asyncio.get_running_loop()
+        executor = self.get_executor(stage)
+        self._pending[stage] = self._pending.get(stage, 0) + 1
+        try:
+            return await loop.run_in_executor(executor, functools.partial(fn, *args, **kwargs))
+        finally:
+            self._pending[stage] -= 1
+
+    def pending(self, stage: str) -> int:
+        """Number of queued or running tasks of a stage"""
+        return self._pending.get(stage, 0)
+
+    def shutdown(self) -> None:
+        """Shut down all executor pools"""
+        for executor in self._executors.values():
+            executor.shutdown(wait=False, cancel_futures=True)
+        self._executors.clear()
+
+
+# Global executor instance
+stage_executor = StageExecutor(EXECUTOR_STAGES)
@@ -0,0 +1,279 @@
+"""
+Prometheus metrics for the API
+
+Request metrics are collected by an ASGI middleware for every router
+(classification, OCR, storage). Queue depths are read at scrape time, so
+they cost nothing on the request path.
+"""
+
+import os
+import time
+from typing import Dict, Optional
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess
+)
+from prometheus_client.core import REGISTRY, GaugeMetricFamily
+
+from api.configs.config import EXECUTOR_STAGES
+
+# Request latency buckets (seconds), predictions range from a few ms (cache hit) to seconds
+REQUEST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Model load buckets (seconds), from a folded NumPy MLP to a cold EfficientNetV2 with JIT tracing
+LOAD_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+# Pipeline stage buckets (seconds), single stages are mostly sub-10ms
+STAGE_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+HTTP_REQUESTS = Counter(
+    "pcvk_http_requests_total",
+    "HTTP requests by route template, method and status code",
+    ["route", "method", "status"]
+)
+HTTP_ERRORS = Counter(
+    "pcvk_http_request_errors_total",
+    "HTTP requests answered with a 5xx status or an unhandled exception",
+    ["route", "method"]
+)
+HTTP_LATENCY = Histogram(
+    "pcvk_http_request_duration_seconds",
+    "HTTP request latency by route template",
+    ["route", "method"],
+    buckets=REQUEST_BUCKETS
+)
+HTTP_IN_FLIGHT = Gauge(
+    "pcvk_http_requests_in_flight",
+    "HTTP requests currently being handled",
+    multiprocess_mode="livesum"
+)
+WEBSOCKET_CONNECTIONS = Gauge(
+    "pcvk_websocket_connections",
+    "Open WebSocket connections by route template",
+    ["route"],
+    multiprocess_mode="livesum"
+)
+PREDICTIONS = Counter(
+    "pcvk_predictions_total",
+    "Classification predictions by model and segmentation method",
+    ["model_type", "seg_method", "cached"]
+)
+PREDICTION_LATENCY = Histogram(
+    "pcvk_prediction_duration_seconds",
+    "End-to-end prediction latency by model and segmentation method",
+    ["model_type", "seg_method"],
+    buckets=REQUEST_BUCKETS
+)
+CASCADE_ANSWERS = Counter(
+    "pcvk_cascade_answers_total",
+    "Cascade predictions by the model that answered",
+    ["answered_by"]
+)
+LIVE_DROPPED_FRAMES = Counter(
+    "pcvk_websocket_live_dropped_frames_total",
+    "Live-mode camera frames superseded by a newer frame before they were processed"
+)
+ADMISSION_IN_FLIGHT = Gauge(
+    "pcvk_admission_in_flight",
+    "Requests admitted and running per admission-controlled route class",
+    ["route_class"],
+    multiprocess_mode="livesum"
+)
+ADMISSION_QUEUE_DEPTH = Gauge(
+    "pcvk_admission_queue_depth",
+    "Requests waiting for admission per route class",
+    ["route_class"],
+    multiprocess_mode="livesum"
+)
+ADMISSION_REJECTED = Counter(
+    "pcvk_admission_rejected_total",
+    "Requests refused by admission control (queue_full: 429, queue_timeout: 503)",
+    ["route_class", "reason"]
+)
+MODEL_LOAD_DURATION = Histogram(
+    "pcvk_model_load_seconds",
+    "Duration of successful classification model loads",
+    ["model"],
+    buckets=LOAD_BUCKETS
+)
+STAGE_LATENCY = Histogram(
+    "pcvk_stage_duration_seconds",
+    "Pipeline stage latency (decode, resize, segment_*, hog, forward, ...)",
+    ["model_type", "stage"],
+    buckets=STAGE_BUCKETS
+)
+
+
+class QueueDepthCollector:
+    """Reports micro-batch and executor queue depths when scraped"""
+
+    @staticmethod
+    def _families():
+        batch_queue = GaugeMetricFamily(
+            "pcvk_micro_batch_queue_depth",
+            "Requests waiting for a batched forward pass",
+            labels=["model_type"]
+        )
+        executor_queue = GaugeMetricFamily(
+            "pcvk_executor_pending_tasks",
+            "Queued or running tasks per executor stage",
+            labels=["stage"]
+        )
+        return batch_queue, executor_queue
+
+    def describe(self):
+        # Without describe, REGISTRY.register calls collect at import time, and the
+        # classification stack it imports (model_loader) imports this module back
+        return list(self._families())
+
+    def collect(self):
+        # Imported here so scraping does not pull the classification stack into this module
+        from api.configs.pcvk_config import ONNX_MODEL_PATHS
+        from api.services.classification.batching import micro_batcher
+        from api.services.executor import stage_executor
+
+        batch_queue, executor_queue = self._families()
+        for model_type in ONNX_MODEL_PATHS:
+            batch_queue.add_metric([model_type], micro_batcher.queue_depth(model_type))
+        yield batch_queue
+
+        for stage in EXECUTOR_STAGES:
+            executor_queue.add_metric([stage], stage_executor.pending(stage))
+        yield executor_queue
+
+
+REGISTRY.register(QueueDepthCollector())
+
+
+def record_prediction(
+    model_type: str,
+    seg_method: Optional[str],
+    timings: Dict[str, float],
+    cached: bool = False
+) -> None:
+    """
+    Record one prediction and its stage breakdown
+
+    Args:
+        model_type: Model used for the prediction
+        seg_method: Segmentation method, None if segmentation was disabled
+        timings: Stage name -> duration in milliseconds, 'total' is the end-to-end latency
+        cached: Whether the result came from the prediction cache
+    """
+    seg_label = seg_method or "none"
+    PREDICTIONS.labels(model_type, seg_label, "true" if cached else "false").inc()
+
+    for stage, duration_ms in timings.items():
+        if stage == "total":
+            PREDICTION_LATENCY.labels(model_type, seg_label).observe(duration_ms / 1000)
+        else:
+            STAGE_LATENCY.labels(model_type, stage).observe(duration_ms / 1000)
+
+
+def record_model_load(model_type: str, duration_seconds: float) -> None:
+    """Record the duration of one successful model load"""
+    MODEL_LOAD_DURATION.labels(model_type).observe(duration_seconds)
+
+
+def record_cascade_answer(answered_by: str) -> None:
+    """Record which cascade tier answered a prediction"""
+    CASCADE_ANSWERS.labels(answered_by).inc()
+
+
+def record_dropped_frame() -> None:
+    """Record one live-mode frame dropped in favour of a newer one"""
+    LIVE_DROPPED_FRAMES.inc()
+
+
+def record_admission_state(route_class: str, in_flight: int, queued: int) -> None:
+    """Publish the running and waiting requests of an admission-controlled route class"""
+    ADMISSION_IN_FLIGHT.labels(route_class).set(in_flight)
+    ADMISSION_QUEUE_DEPTH.labels(route_class).set(queued)
+
+
+def record_admission_rejected(route_class: str, reason: str) -> None:
+    """Record one request refused by admission control"""
+    ADMISSION_REJECTED.labels(route_class, reason).inc()
+
+
+def render_metrics() -> bytes:
+    """
+    Render all metrics in the Prometheus text format
+
+    With PROMETHEUS_MULTIPROC_DIR set (serve_prefork.py) the metrics of all workers are
+    aggregated; queue depths are per process and only reported in single-process mode.
+    """
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry)
+    return generate_latest(REGISTRY)
+
+
+def _route_template(scope) -> str:
+    """Route template (e.g. /api/pcvk/predict) instead of the raw path, to bound label cardinality"""
+    route = scope.get("route")
+    path = getattr(route, "path", None)
+    return path if path else "unmatched"
+
+
+class PrometheusMiddleware:
+    """ASGI middleware counting requests, errors, in-flight requests and latency per route"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "websocket":
+            await self._handle_websocket(scope, receive, send)
+            return
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        HTTP_IN_FLIGHT.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        except Exception:
+            status_code = 500
+            raise
+        finally:
+            HTTP_IN_FLIGHT.dec()
+            route = _route_template(scope)
+            method = scope["method"]
+            HTTP_LATENCY.labels(route, method).observe(time.perf_counter() - start)
+            HTTP_REQUESTS.labels(route, method, str(status_code)).inc()
+            if status_code >= 500:
+                HTTP_ERRORS.labels(route, method).inc()
+
+    async def _handle_websocket(self, scope, receive, send):
+        # The route is only known once routing has run, i.e. when the connection is accepted
+        gauge = None
+
+        async def send_tracking_accept(message):
+            nonlocal gauge
+            if message["type"] == "websocket.accept" and gauge is None:
+                gauge = WEBSOCKET_CONNECTIONS.labels(_route_template(scope))
+                gauge.inc()
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_tracking_accept)
+        finally:
+            if gauge is not None:
+                gauge.dec()
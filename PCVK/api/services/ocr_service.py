@@ -1,8 +1,10 @@
+import importlib.util
+import os
 import numpy as np
 from PIL import Image
 from typing import List, Tuple, Optional
 
-from api.configs.ocr_config import OCR_CONFIG
+from api.configs.ocr_config import OCR_CONFIG, OCR_MODEL_PATHS
 
 
 class OCRService:
@@ -25,6 +27,10 @@ class OCRService:
 
             print("Loading PaddleOCR model...")
             from paddleocr import PaddleOCR
+            from api.services.classification.model_loader import model_manager
+
+            # Memory budget accounting, may evict classification models
+            model_manager.register_resident("ocr", _model_dirs_bytes(), self.unload_model)
 
             # Initialize PaddleOCR with custom configuration
             self._ocr_instance = PaddleOCR(
@@ -36,6 +42,7 @@ class OCRService:
             return True
 
         except Exception as e:
+            _release_resident()
             print(f"Error initializing PaddleOCR: {e}")
             import traceback
 
@@ -46,6 +53,10 @@ class OCRService:
         """Check if OCR model is loaded"""
         return self._ocr_instance is not None
 
+    def is_available(self) -> bool:
+        """Check if PaddleOCR is installed (optional in the slim image, see requirements-ocr.txt)"""
+        return importlib.util.find_spec("paddleocr") is not None
+
     def get_model(self):
         """
         Get OCR model instance, loading if necessary
@@ -86,6 +97,7 @@ class OCRService:
 
         # Get OCR instance
         ocr = self.get_model()
+        _touch_resident()
 
         # Perform OCR using predict method
         ocr_results = list(ocr.predict(image_array))
@@ -126,6 +138,7 @@ class OCRService:
             if self._ocr_instance is not None:
                 del self._ocr_instance
                 self._ocr_instance = None
+                _release_resident()
                 print("PaddleOCR model unloaded successfully")
             return True
 
@@ -134,5 +147,24 @@ class OCRService:
             return False
 
 
+def _model_dirs_bytes() -> int:
+    """Approximate resident size of the OCR models from their files on disk"""
+    total = 0
+    for model_dir in OCR_MODEL_PATHS.values():
+        for root, _, files in os.walk(model_dir):
+            total += sum(os.path.getsize(os.path.join(root, f)) for f in files)
+    return total
+
+
+def _touch_resident() -> None:
+    from api.services.classification.model_loader import model_manager
+    model_manager.touch("ocr")
+
+
+def _release_resident() -> None:
+    from api.services.classification.model_loader import model_manager
+    model_manager.release_resident("ocr")
+
+
 # Global OCR service instance
 ocr_service = OCRService()
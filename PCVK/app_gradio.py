@@ -0,0 +1,23 @@
+"""
+Gradio UI Entry Point
+
+Serves the web UI as its own process, with its own model instances, so API
+workers can run with ENABLE_GRADIO=false and the UI can be scaled (or left
+out) independently.
+Run: python app_gradio.py
+"""
+
+from dotenv import load_dotenv
+load_dotenv()
+
+from api.configs.config import GRADIO_SERVER_HOST, GRADIO_SERVER_PORT
+from api.services.classification.gradio_interface import create_gradio_interface
+
+if __name__ == "__main__":
+    print("Starting Gradio UI")
+    
+    demo = create_gradio_interface()
+    demo.queue().launch(
+        server_name=GRADIO_SERVER_HOST,
+        server_port=GRADIO_SERVER_PORT
+    )
@@ -1,7 +1,13 @@
-from .model import ModelMLP
-from .extract_features import extract_all_features
-from .segment import auto_segment
-from .preprocess import FeatureDataset
+import importlib
+
+# Exports are resolved on first access (PEP 562) so that importing a light
+# submodule such as lib.segment does not pull in torch, torchvision or skimage
+_LAZY_EXPORTS = {
+    'ModelMLP': '.model',
+    'extract_all_features': '.extract_features',
+    'auto_segment': '.segment',
+    'FeatureDataset': '.preprocess',
+}
 
 __all__ = [
     'ModelMLP',
@@ -9,3 +15,13 @@ __all__ = [
     'auto_segment',
     'FeatureDataset',
 ]
+
+
+def __getattr__(name):
+    module_name = _LAZY_EXPORTS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    value = getattr(importlib.import_module(module_name, __name__), name)
+    globals()[name] = value
+    return value
@@ -1,8 +1,7 @@
 import numpy as np
-from skimage.feature import hog, local_binary_pattern
 import cv2
-from scipy.stats import entropy
 from .segment import auto_segment
+from .timing import stage_timer
 
 
 def extract_hog_features(
@@ -21,6 +20,8 @@ def extract_hog_features(
     if use_segmentation and seg_method != "none":
         img = auto_segment(img, method=seg_method)
 
+    from skimage.feature import hog
+
     img_gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
     img_resized = cv2.resize(img_gray, resize_shape)
 
@@ -69,6 +70,9 @@ def extract_lbp_features(
     if use_segmentation and seg_method != "none":
         img = auto_segment(img, method=seg_method)
 
+    from scipy.stats import entropy
+    from skimage.feature import local_binary_pattern
+
     img_gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
     img_resized = cv2.resize(img_gray, resize_shape)
 
@@ -275,22 +279,27 @@ def extract_haralick_features(img, use_segmentation=False, seg_method="hsv"):
     )
 
 
-def extract_all_features(img, use_segmentation=False, seg_method="hsv"):
-    hog_feat = extract_hog_features(
-        img, use_segmentation=use_segmentation, seg_method=seg_method
-    )
-    lbp_feat = extract_lbp_features(
-        img, use_segmentation=use_segmentation, seg_method=seg_method
-    )
-    sift_feat = extract_sift_features(
-        img, use_segmentation=use_segmentation, seg_method=seg_method
-    )
-    color_feat = extract_color_histogram_features(
-        img, use_segmentation=use_segmentation, seg_method=seg_method
-    )
-    haralick_feat = extract_haralick_features(
-        img, use_segmentation=use_segmentation, seg_method=seg_method
-    )
+def extract_all_features(img, use_segmentation=False, seg_method="hsv", timings=None):
+    with stage_timer(timings, "hog"):
+        hog_feat = extract_hog_features(
+            img, use_segmentation=use_segmentation, seg_method=seg_method
+        )
+    with stage_timer(timings, "lbp"):
+        lbp_feat = extract_lbp_features(
+            img, use_segmentation=use_segmentation, seg_method=seg_method
+        )
+    with stage_timer(timings, "sift"):
+        sift_feat = extract_sift_features(
+            img, use_segmentation=use_segmentation, seg_method=seg_method
+        )
+    with stage_timer(timings, "color_histogram"):
+        color_feat = extract_color_histogram_features(
+            img, use_segmentation=use_segmentation, seg_method=seg_method
+        )
+    with stage_timer(timings, "glcm"):
+        haralick_feat = extract_haralick_features(
+            img, use_segmentation=use_segmentation, seg_method=seg_method
+        )
 
     # Concatenate all features: 5 + 6 + 8 + 12 + 13 = 44 features
     combined = np.concatenate(
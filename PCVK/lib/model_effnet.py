@@ -1,7 +1,10 @@
 # @markdown ### Model.py - EfficientNetV2 Model
+import torch
 import torch.nn as nn
 from torchvision import models
 
+CPU_OPTIMIZE_MODES = ("none", "jit", "compile")
+
 
 class EfficientNetV2Model(nn.Module):
     def __init__(
@@ -52,3 +55,61 @@ class EfficientNetV2Model(nn.Module):
         """Unfreeze all backbone parameters for fine-tuning"""
         for param in self.backbone.parameters():
             param.requires_grad = True
+
+
+class CPUInferenceModel(nn.Module):
+    """Optimised module for CPU inference, feeds channels_last input under inference_mode"""
+
+    def __init__(self, module, mode):
+        super().__init__()
+        self.module = module
+        self.mode = mode
+
+    def forward(self, x):
+        with torch.inference_mode():
+            return self.module(x.contiguous(memory_format=torch.channels_last))
+
+
+def optimize_for_cpu_inference(model, mode="jit", input_size=224, warmup_runs=2):
+    """
+    Prepare an eval-mode EfficientNetV2 for fast CPU inference
+
+    Weights are converted to channels_last (the layout oneDNN convolutions prefer), then
+    - jit: traced, frozen (folds BatchNorm into the convolutions) and passed through
+      torch.jit.optimize_for_inference, which fuses conv/add/activation with oneDNN
+    - compile: torch.compile with Inductor weight freezing, which also lowers to oneDNN
+
+    Args:
+        model: Model in eval mode on the CPU
+        mode: One of CPU_OPTIMIZE_MODES ("none" returns the model unchanged)
+        input_size: Input height and width used for tracing and warm-up
+        warmup_runs: Forward passes run here so the first request does not pay for
+            profiling or compilation
+
+    Returns:
+        CPUInferenceModel wrapping the optimised module, or the model itself for "none"
+    """
+    if mode not in CPU_OPTIMIZE_MODES:
+        raise ValueError(f"Unknown CPU optimize mode '{mode}', must be one of {CPU_OPTIMIZE_MODES}")
+    if mode == "none":
+        return model
+
+    model = model.eval().to(memory_format=torch.channels_last)
+    example = torch.randn(1, 3, input_size, input_size).contiguous(memory_format=torch.channels_last)
+
+    if mode == "jit":
+        # Traced under no_grad: inference tensors cannot be frozen into the graph
+        with torch.no_grad():
+            traced = torch.jit.trace(model, example)
+            module = torch.jit.optimize_for_inference(torch.jit.freeze(traced))
+    else:
+        import torch._inductor.config as inductor_config
+
+        inductor_config.freezing = True
+        module = torch.compile(model, dynamic=True)
+
+    optimized = CPUInferenceModel(module, mode)
+    for _ in range(warmup_runs):
+        optimized(example)
+    return optimized
+
@@ -0,0 +1,154 @@
+# @markdown ### Model.py - MLP V2 inference in NumPy
+import numpy as np
+
+
+def _to_numpy(value):
+    """float64 copy of a tensor or array (folding is done in double precision)"""
+    if hasattr(value, "detach"):
+        value = value.detach().cpu().numpy()
+    return np.asarray(value, dtype=np.float64)
+
+
+def _bn_scale_shift(state_dict, prefix, eps):
+    """BatchNorm1d in eval mode as y = x * scale + shift"""
+    gamma = _to_numpy(state_dict[f"{prefix}.weight"])
+    beta = _to_numpy(state_dict[f"{prefix}.bias"])
+    mean = _to_numpy(state_dict[f"{prefix}.running_mean"])
+    var = _to_numpy(state_dict[f"{prefix}.running_var"])
+    scale = gamma / np.sqrt(var + eps)
+    return scale, beta - mean * scale
+
+
+def _fold_linear_bn(state_dict, linear_prefix, bn_prefix, eps):
+    """Linear followed by BatchNorm1d as a single (weight, bias), weight is (out, in)"""
+    weight = _to_numpy(state_dict[f"{linear_prefix}.weight"])
+    bias = _to_numpy(state_dict[f"{linear_prefix}.bias"])
+    scale, shift = _bn_scale_shift(state_dict, bn_prefix, eps)
+    return weight * scale[:, None], bias * scale + shift
+
+
+class NumpyMLPV2:
+    """
+    ModelMLPV2 inference as a few float32 GEMMs
+
+    input_bn is folded into the first Linear, every BatchNorm1d into the Linear before
+    it, and Dropout is dropped (identity in eval mode). Weights are stored transposed,
+    (in, out) and C-contiguous, so a forward pass is x @ W + b per layer.
+    """
+
+    def __init__(self, layers):
+        """
+        Args:
+            layers: List of ("dense", W, b) and ("residual", W1, b1, W2, b2) with W shaped (in, out)
+        """
+        self.layers = [
+            (kind, *(np.ascontiguousarray(array, dtype=np.float32) for array in arrays))
+            for kind, *arrays in layers
+        ]
+        self.num_features = self.layers[0][1].shape[0]
+        self.num_classes = self.layers[-1][1].shape[1]
+
+    @classmethod
+    def from_state_dict(cls, state_dict, eps=1e-5):
+        """
+        Fold a ModelMLPV2 state dict (tensors or arrays)
+
+        The layer structure is read from the keys, so any hidden_dims / use_residual
+        configuration is supported.
+
+        Args:
+            state_dict: ModelMLPV2 state dict
+            eps: BatchNorm epsilon (PyTorch default 1e-5)
+
+        Returns:
+            NumpyMLPV2 instance
+        """
+        in_scale, in_shift = _bn_scale_shift(state_dict, "input_bn", eps)
+
+        layers = []
+        index = 0
+        while True:
+            prefix = f"features.{index}"
+            if f"{prefix}.0.weight" in state_dict:
+                # Linear, BatchNorm1d, ReLU, Dropout
+                weight, bias = _fold_linear_bn(state_dict, f"{prefix}.0", f"{prefix}.1", eps)
+                layers.append(["dense", weight, bias])
+            elif f"{prefix}.block.0.weight" in state_dict:
+                # Linear, BatchNorm1d, ReLU, Dropout, Linear, BatchNorm1d (+ skip, ReLU)
+                weight1, bias1 = _fold_linear_bn(state_dict, f"{prefix}.block.0", f"{prefix}.block.1", eps)
+                weight2, bias2 = _fold_linear_bn(state_dict, f"{prefix}.block.4", f"{prefix}.block.5", eps)
+                layers.append(["residual", weight1, bias1, weight2, bias2])
+            else:
+                break
+            index += 1
+
+        layers.append(["classifier", _to_numpy(state_dict["classifier.weight"]), _to_numpy(state_dict["classifier.bias"])])
+
+        # input_bn: W @ (x * s + t) + b = (W * s) @ x + (W @ t + b)
+        first = layers[0]
+        first[2] = first[1] @ in_shift + first[2]
+        first[1] = first[1] * in_scale[None, :]
+
+        # (out, in) -> (in, out) for x @ W
+        return cls([
+            (kind, *(array.T if array.ndim == 2 else array for array in arrays))
+            for kind, *arrays in layers
+        ])
+
+    @classmethod
+    def from_torch(cls, model):
+        """Fold an eval-mode ModelMLPV2"""
+        return cls.from_state_dict(model.state_dict())
+
+    @classmethod
+    def load(cls, path):
+        """Load folded weights written by save()"""
+        with np.load(path) as data:
+            kinds = [str(kind) for kind in data["kinds"]]
+            layers = []
+            for i, kind in enumerate(kinds):
+                count = 4 if kind == "residual" else 2
+                layers.append((kind, *(data[f"layer{i}_{j}"] for j in range(count))))
+        return cls(layers)
+
+    def save(self, path):
+        """Save folded weights as .npz (loads without torch)"""
+        arrays = {"kinds": np.array([kind for kind, *_ in self.layers])}
+        for i, (_, *params) in enumerate(self.layers):
+            for j, array in enumerate(params):
+                arrays[f"layer{i}_{j}"] = array
+        np.savez(path, **arrays)
+
+    @property
+    def nbytes(self):
+        """Bytes held by the folded weights"""
+        return sum(array.nbytes for _, *params in self.layers for array in params)
+
+    def __call__(self, x):
+        """
+        Forward pass
+
+        Args:
+            x: Features, shape (num_features,) or (batch, num_features)
+
+        Returns:
+            Logits, shape (batch, num_classes)
+        """
+        out = np.asarray(x, dtype=np.float32).reshape(-1, self.num_features)
+        for kind, *params in self.layers:
+            if kind == "dense":
+                out = out @ params[0]
+                out += params[1]
+                np.maximum(out, 0, out=out)
+            elif kind == "residual":
+                hidden = out @ params[0]
+                hidden += params[1]
+                np.maximum(hidden, 0, out=hidden)
+                block = hidden @ params[2]
+                block += params[3]
+                block += out
+                out = np.maximum(block, 0, out=block)
+            else:
+                out = out @ params[0]
+                out += params[1]
+        return out
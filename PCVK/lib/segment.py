@@ -2,8 +2,33 @@
 import cv2
 import numpy as np
 import os
+import threading
 
-from api.configs.pcvk_config import MODEL_PATHS
+from api.configs.pcvk_config import get_onnx_model_path, ONNX_INTRA_OP_THREADS
+from .timing import stage_timer
+
+# Residency hooks for the U2Net-P session, installed by the API's ModelManager
+_u2netp_on_load = None  # called with the model size in bytes before the session is created
+_u2netp_on_use = None  # called on every U2Net-P segmentation
+_u2netp_session = None
+_u2netp_load_lock = threading.Lock()
+
+
+class SegmentationError(RuntimeError):
+    """A segmentation model failed (raised instead of falling back when asked to)"""
+
+
+def set_u2netp_residency_hooks(on_load, on_use):
+    """
+    Register callbacks used for memory accounting of the U2Net-P session
+
+    Args:
+        on_load: Callable receiving the model file size in bytes, called before loading
+        on_use: Callable without arguments, called on every segmentation
+    """
+    global _u2netp_on_load, _u2netp_on_use
+    _u2netp_on_load = on_load
+    _u2netp_on_use = on_use
 
 
 def apply_clahe(img, clip_limit=2.0, tile_grid_size=(8, 8)):
@@ -204,13 +229,59 @@ def segment_hsv_color(img, lower_bound=(20, 40, 40), upper_bound=(180, 255, 255)
     return segmented
 
 
-def segment_u2netp(img, model_path=None):
+def clear_u2netp_session():
+    """
+    Drop the U2Net-P session, the next segment_u2netp call reloads it
+
+    Calls in flight keep their own reference and finish normally.
+
+    Returns:
+        True if a session was loaded
+    """
+    global _u2netp_session
+    with _u2netp_load_lock:
+        cleared = _u2netp_session is not None
+        _u2netp_session = None
+    return cleared
+
+
+def preprocess_u2netp_input(img):
+    """
+    Convert a BGR image into the U2Net-P input tensor
+
+    Args:
+        img: Input image (BGR format from OpenCV)
+
+    Returns:
+        Float32 array of shape (1, 3, 320, 320)
+    """
+    img_rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+
+    # Resize to model input size (320x320 for U2Net-P)
+    img_resized = cv2.resize(img_rgb, (320, 320))
+
+    # Normalize to [0, 1] and convert to float32
+    img_normalized = img_resized.astype(np.float32) / 255.0
+
+    # Normalize with ImageNet stats
+    mean = np.array([0.485, 0.456, 0.406], dtype=np.float32)
+    std = np.array([0.229, 0.224, 0.225], dtype=np.float32)
+    img_normalized = (img_normalized - mean) / std
+
+    # Convert to NCHW format (batch, channels, height, width)
+    img_input = np.transpose(img_normalized, (2, 0, 1))
+    return np.expand_dims(img_input, axis=0)
+
+
+def segment_u2netp(img, model_path=None, fallback=True):
     """
     Segment image using U2Net-P (Portrait) model from ONNX
 
     Args:
         img: Input image (BGR format from OpenCV)
-        model_path: Path to U2Net-P ONNX model (optional, defaults to models/u2netp.onnx)
+        model_path: Path to U2Net-P ONNX model (optional, defaults to models/u2netp.onnx,
+            or models/u2netp.int8.onnx when ONNX_PRECISION=int8)
+        fallback: Return HSV segmentation if U2Net-P fails, otherwise raise SegmentationError
 
     Returns:
         Segmented image with background removed
@@ -218,51 +289,51 @@ def segment_u2netp(img, model_path=None):
     try:
         import onnxruntime as ort
         
-        # Lazy load ONNX model
+        # Lazy load ONNX model. The session is read under the lock that clear_u2netp_session
+        # takes, and the local reference keeps it alive for this call if it is evicted meanwhile
         global _u2netp_session
-        if "_u2netp_session" not in globals():
-            _u2netp_session = None
+        with _u2netp_load_lock:
+            session = _u2netp_session
 
-        if _u2netp_session is None:
+        if session is None:
             # Set default model path
             if model_path is None:
-                model_path = MODEL_PATHS["u2netp"]
+                model_path = get_onnx_model_path("u2netp")
             
             if not os.path.exists(model_path):
                 raise FileNotFoundError(f"U2Net-P ONNX model not found at {model_path}")
             
-            # Load ONNX model
-            print(f"Loading U2Net-P ONNX model from {model_path}")
-            _u2netp_session = ort.InferenceSession(
-                model_path,
-                providers=['CUDAExecutionProvider', 'CPUExecutionProvider']
-            )
-            print(f"U2Net-P model loaded successfully")
+            # Outside the load lock: memory accounting may evict models, which clears sessions
+            if _u2netp_on_load is not None:
+                _u2netp_on_load(os.path.getsize(model_path))
+
+            with _u2netp_load_lock:
+                if _u2netp_session is None:
+                    # Load ONNX model, same thread budget as the classification sessions
+                    print(f"Loading U2Net-P ONNX model from {model_path}")
+                    sess_options = ort.SessionOptions()
+                    if ONNX_INTRA_OP_THREADS > 0:
+                        sess_options.intra_op_num_threads = ONNX_INTRA_OP_THREADS
+                    _u2netp_session = ort.InferenceSession(
+                        model_path,
+                        sess_options=sess_options,
+                        providers=['CUDAExecutionProvider', 'CPUExecutionProvider']
+                    )
+                    print(f"U2Net-P model loaded successfully")
+                session = _u2netp_session
 
         # Preprocess image
-        img_rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
         h_orig, w_orig = img.shape[:2]
-        
-        # Resize to model input size (320x320 for U2Net-P)
-        img_resized = cv2.resize(img_rgb, (320, 320))
-        
-        # Normalize to [0, 1] and convert to float32
-        img_normalized = img_resized.astype(np.float32) / 255.0
-        
-        # Normalize with ImageNet stats
-        mean = np.array([0.485, 0.456, 0.406], dtype=np.float32)
-        std = np.array([0.229, 0.224, 0.225], dtype=np.float32)
-        img_normalized = (img_normalized - mean) / std
-        
-        # Convert to NCHW format (batch, channels, height, width)
-        img_input = np.transpose(img_normalized, (2, 0, 1))
-        img_input = np.expand_dims(img_input, axis=0)
+        img_input = preprocess_u2netp_input(img)
 
         # Run inference
-        input_name = _u2netp_session.get_inputs()[0].name
-        output_name = _u2netp_session.get_outputs()[0].name
+        input_name = session.get_inputs()[0].name
+        output_name = session.get_outputs()[0].name
         
-        pred = _u2netp_session.run([output_name], {input_name: img_input})[0]
+        pred = session.run([output_name], {input_name: img_input})[0]
+
+        if _u2netp_on_use is not None:
+            _u2netp_on_use()
         
         # Process output
         # pred shape is (1, 1, H, W)
@@ -291,34 +362,43 @@ def segment_u2netp(img, model_path=None):
         print(f"U2Net-P segmentation failed: {e}")
         import traceback
         traceback.print_exc()
+        if not fallback:
+            raise SegmentationError(f"U2Net-P segmentation failed: {e}") from e
         print("Falling back to HSV segmentation...")
         return segment_hsv_color(img)
 
 
-def auto_segment(img, method="grabcut", applyBrightContClahe=True):
+def auto_segment(img, method="grabcut", applyBrightContClahe=True, timings=None, fallback=True):
     """
     Automatic segmentation with multiple method options
 
     Args:
         img: Input image (BGR)
         method: 'grabcut', 'adaptive', 'hsv', 'u2netp', or 'none'
+        timings: Optional dict receiving per-stage durations in milliseconds
+        fallback: Whether a failing U2Net-P falls back to HSV (otherwise SegmentationError is raised)
 
     Returns:
         Segmented image
     """
-    img = cv2.resize(img, (224, 224))
-
-    if method == "grabcut":
-        result = segment_grabcut(img)
-    elif method == "adaptive":
-        result = segment_adaptive_threshold(img)
-    elif method == "hsv":
-        result = segment_hsv_color(img)
-    elif method == "u2netp":
-        result = segment_u2netp(img)
-    else:
-        result = img
+    with stage_timer(timings, "resize"):
+        img = cv2.resize(img, (224, 224))
+
+    with stage_timer(timings, f"segment_{method}"):
+        if method == "grabcut":
+            result = segment_grabcut(img)
+        elif method == "adaptive":
+            result = segment_adaptive_threshold(img)
+        elif method == "hsv":
+            result = segment_hsv_color(img)
+        elif method == "u2netp":
+            result = segment_u2netp(img, fallback=fallback)
+        else:
+            result = img
 
     if applyBrightContClahe:
-        return apply_clahe(apply_automatic_brightness_contrast(result))
+        with stage_timer(timings, "brightness_contrast"):
+            result = apply_automatic_brightness_contrast(result)
+        with stage_timer(timings, "clahe"):
+            return apply_clahe(result)
     return result
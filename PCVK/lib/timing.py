@@ -0,0 +1,22 @@
+import time
+from contextlib import contextmanager
+
+
+@contextmanager
+def stage_timer(timings, stage):
+    """
+    Add the wall-clock duration of a block to timings[stage] (milliseconds)
+
+    Args:
+        timings: Dict collecting stage durations, or None to skip timing
+        stage: Stage name, repeated stages are summed
+    """
+    if timings is None:
+        yield
+        return
+
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[stage] = timings.get(stage, 0.0) + (time.perf_counter() - start) * 1000
@@ -0,0 +1,173 @@
+"""
+Benchmark EfficientNetV2 CPU execution modes
+
+Compares the eager model (the previous predict_from_tensor path: no_grad, contiguous
+NCHW input) with the optimised modes of lib.model_effnet.optimize_for_cpu_inference
+(jit, compile) for latency per batch size and agreement of the output probabilities.
+The optimised graphs are prepared with a batch-1 example while the server feeds
+micro-batches (up to MICRO_BATCH_MAX_SIZE) and whole /batch-predict uploads, so the
+default batch sizes cover both. A mode fails if its probabilities differ from eager
+by more than --tolerance or its top-1 class changes at any batch size; the script
+then exits with status 1. Only enable TORCH_CPU_OPTIMIZE for modes that pass.
+
+Usage:
+    python scripts/benchmark_effnet_cpu.py
+    python scripts/benchmark_effnet_cpu.py --model_path models/classification/efficientnetv2.pth --batch_sizes 1 8 --threads 4
+    python scripts/benchmark_effnet_cpu.py --modes jit compile --iterations 100
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import torch
+
+# Add parent directory to path to import custom models
+sys.path.append(str(Path(__file__).parent.parent))
+
+from lib.model_effnet import EfficientNetV2Model, optimize_for_cpu_inference
+
+
+def load_model(model_path, num_classes):
+    """EfficientNetV2 in eval mode, random weights if no checkpoint is given"""
+    model = EfficientNetV2Model(num_classes=num_classes, dropout_rate=0.3, pretrained=False)
+    if model_path:
+        checkpoint = torch.load(model_path, map_location="cpu")
+        if isinstance(checkpoint, dict) and "model_state_dict" in checkpoint:
+            checkpoint = checkpoint["model_state_dict"]
+        model.load_state_dict(checkpoint)
+        print(f"✓ Loaded {model_path}")
+    else:
+        print("No --model_path given, using random weights (latency only)")
+    return model.eval()
+
+
+def measure(run, batch, warmup, iterations):
+    """
+    Latency of run(batch)
+
+    Returns:
+        Tuple of (p50_ms, p95_ms, probabilities of the last run)
+    """
+    for _ in range(warmup):
+        run(batch)
+
+    durations = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        outputs = run(batch)
+        durations.append((time.perf_counter() - start) * 1000)
+
+    probabilities = torch.softmax(outputs.float(), dim=1).numpy()
+    return float(np.percentile(durations, 50)), float(np.percentile(durations, 95)), probabilities
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark EfficientNetV2 CPU execution modes")
+    parser.add_argument(
+        "--model_path",
+        type=str,
+        default=None,
+        help="Checkpoint to load (default: random weights)",
+    )
+    parser.add_argument(
+        "--num_classes",
+        type=int,
+        default=5,
+        help="Number of output classes",
+    )
+    parser.add_argument(
+        "--modes",
+        type=str,
+        nargs="+",
+        default=["jit", "compile"],
+        choices=["jit", "compile"],
+        help="Optimised modes compared with eager",
+    )
+    parser.add_argument(
+        "--batch_sizes",
+        type=int,
+        nargs="+",
+        default=[1, 3, 8, 32],
+        help="Batch sizes to measure (use the micro-batch and /batch-predict sizes of the deployment)",
+    )
+    parser.add_argument(
+        "--input_size",
+        type=int,
+        default=224,
+        help="Input height and width",
+    )
+    parser.add_argument(
+        "--threads",
+        type=int,
+        default=0,
+        help="torch.set_num_threads (0 = PyTorch default)",
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=1e-3,
+        help="Largest allowed absolute difference from the eager probabilities",
+    )
+    parser.add_argument("--warmup", type=int, default=5, help="Untimed runs per measurement")
+    parser.add_argument("--iterations", type=int, default=30, help="Timed runs per measurement")
+
+    args = parser.parse_args()
+
+    if args.threads > 0:
+        torch.set_num_threads(args.threads)
+    print(f"torch {torch.__version__}, {torch.get_num_threads()} threads, oneDNN: {torch.backends.mkldnn.is_available()}")
+
+    eager_model = load_model(args.model_path, args.num_classes)
+
+    def run_eager(batch):
+        with torch.no_grad():
+            return eager_model(batch)
+
+    runners = {"eager": run_eager}
+    for mode in args.modes:
+        start = time.perf_counter()
+        try:
+            # Each mode gets its own copy, optimisation converts the weights in place
+            runners[mode] = optimize_for_cpu_inference(
+                load_model(args.model_path, args.num_classes), mode=mode, input_size=args.input_size
+            )
+            print(f"✓ {mode}: prepared in {time.perf_counter() - start:.1f} s")
+        except Exception as e:
+            print(f"✗ {mode}: {e}")
+
+    generator = torch.Generator().manual_seed(0)
+    failed = set(args.modes) - set(runners)
+    print(f"\n{'mode':<8} {'batch':>5} {'p50 ms':>9} {'p95 ms':>9} {'ms/img':>8} {'speedup':>8} {'max |Δp|':>9} {'top-1':>6}")
+    for batch_size in args.batch_sizes:
+        batch = torch.randn(batch_size, 3, args.input_size, args.input_size, generator=generator)
+        eager_p50 = None
+        eager_probs = None
+
+        for mode, run in runners.items():
+            p50, p95, probs = measure(run, batch, args.warmup, args.iterations)
+            if mode == "eager":
+                eager_p50, eager_probs = p50, probs
+            max_diff = float(np.abs(probs - eager_probs).max())
+            top1_match = bool((probs.argmax(axis=1) == eager_probs.argmax(axis=1)).all())
+            if max_diff > args.tolerance or not top1_match:
+                failed.add(mode)
+            print(
+                f"{mode:<8} {batch_size:>5} {p50:>9.2f} {p95:>9.2f} {p50 / batch_size:>8.2f} "
+                f"{eager_p50 / p50:>7.2f}x {max_diff:>9.2e} {'ok' if top1_match else 'DIFF':>6}"
+            )
+
+    print()
+    for mode in args.modes:
+        if mode in failed:
+            print(f"✗ {mode}: does not match eager within {args.tolerance:g} at every batch size, keep TORCH_CPU_OPTIMIZE=none")
+        else:
+            print(f"✓ {mode}: matches eager at batch sizes {args.batch_sizes}, safe to set TORCH_CPU_OPTIMIZE={mode}")
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+"""
+Report import time and memory of the API at startup.
+
+Imports a module (default: api.app) in a fresh interpreter with -X importtime,
+then prints the slowest top-level packages, total import time and peak RSS.
+Thresholds turn it into a guard for CI / Docker builds.
+
+Usage:
+    # Full report
+    python scripts/import_time_report.py
+
+    # Slim runtime must not import torch/gradio and must start fast
+    SLIM_RUNTIME=true python scripts/import_time_report.py --forbid torch torchvision gradio paddle --max_seconds 3 --max_rss_mb 400
+"""
+
+import argparse
+import os
+import resource
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+
+def parse_importtime(stderr):
+    """
+    Parse -X importtime output.
+
+    Args:
+        stderr: Interpreter stderr
+
+    Returns:
+        Dict of module name -> cumulative import time in microseconds
+    """
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+
+        # import time: self [us] | cumulative | imported package
+        fields = line[len("import time:"):].split("|")
+        if len(fields) != 3:
+            continue
+        cumulative_us = int(fields[1].strip())
+        name = fields[2].strip()
+        modules[name] = max(modules.get(name, 0), cumulative_us)
+
+    return modules
+
+
+def top_level_totals(modules):
+    """Cumulative import time per top-level package (its root module entry)"""
+    totals = defaultdict(int)
+    for name, cumulative_us in modules.items():
+        root = name.split(".")[0]
+        if name == root:
+            totals[root] = max(totals[root], cumulative_us)
+    return totals
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import time and memory report for the API")
+    parser.add_argument(
+        "--module",
+        type=str,
+        default="api.app",
+        help="Module to import (default: api.app)",
+    )
+    parser.add_argument(
+        "--top",
+        type=int,
+        default=15,
+        help="Number of slowest top-level packages to show",
+    )
+    parser.add_argument(
+        "--forbid",
+        type=str,
+        nargs="*",
+        default=[],
+        help="Top-level packages that must not be imported (e.g. torch gradio)",
+    )
+    parser.add_argument(
+        "--max_seconds",
+        type=float,
+        default=0,
+        help="Fail if the import takes longer (0 = no limit)",
+    )
+    parser.add_argument(
+        "--max_rss_mb",
+        type=float,
+        default=0,
+        help="Fail if peak RSS after the import is higher (0 = no limit)",
+    )
+
+    args = parser.parse_args()
+
+    project_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+    print(f"Importing {args.module} (SLIM_RUNTIME={os.getenv('SLIM_RUNTIME', 'false')})...")
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {args.module}"],
+        cwd=project_dir,
+        capture_output=True,
+        text=True,
+    )
+    wall_seconds = time.perf_counter() - start
+
+    # ru_maxrss is KB on Linux
+    peak_rss_mb = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024
+
+    if result.returncode != 0:
+        print(result.stderr[-4000:])
+        print(f"✗ Import of {args.module} failed")
+        sys.exit(1)
+
+    modules = parse_importtime(result.stderr)
+    totals = top_level_totals(modules)
+
+    print(f"\nSlowest top-level packages (cumulative):")
+    for name, cumulative_us in sorted(totals.items(), key=lambda item: item[1], reverse=True)[:args.top]:
+        print(f"  {name:<30} {cumulative_us / 1000:>9.1f} ms")
+
+    print(f"\nModules imported: {len(modules)}")
+    print(f"Wall time:        {wall_seconds:.2f} s (including interpreter start)")
+    print(f"Peak RSS:         {peak_rss_mb:.1f} MB")
+
+    failures = []
+    imported_roots = {name.split(".")[0] for name in modules}
+    for package in args.forbid:
+        if package in imported_roots:
+            failures.append(f"forbidden package imported: {package}")
+    if args.max_seconds and wall_seconds > args.max_seconds:
+        failures.append(f"import took {wall_seconds:.2f} s > {args.max_seconds:.2f} s")
+    if args.max_rss_mb and peak_rss_mb > args.max_rss_mb:
+        failures.append(f"peak RSS {peak_rss_mb:.1f} MB > {args.max_rss_mb:.1f} MB")
+
+    if failures:
+        print()
+        for failure in failures:
+            print(f"✗ {failure}")
+        sys.exit(1)
+
+    print("\n✓ Import checks passed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+Parity check and export of the NumPy MLP engine
+
+Folds a ModelMLPV2 checkpoint into lib.model_v2_numpy.NumpyMLPV2, compares logits,
+probabilities and predicted classes with the PyTorch model on random feature vectors,
+times both for single inputs and batches, and optionally writes the folded .npz that
+the API loads with MLP_ENGINE=numpy (also without torch, e.g. SLIM_RUNTIME).
+
+Usage:
+    python scripts/mlp_numpy_parity.py --model_path models/classification/mlpv2_auto-clahe.pth --dropout_rate 0.3
+    python scripts/mlp_numpy_parity.py --model_path models/classification/mlpv2.pth --dropout_rate 0.5 --save
+"""
+
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import torch
+
+# Add parent directory to path to import custom models
+sys.path.append(str(Path(__file__).parent.parent))
+
+from lib.model_v2 import ModelMLPV2
+from lib.model_v2_numpy import NumpyMLPV2
+
+
+def time_per_call(fn, x, iterations):
+    """Median milliseconds of fn(x)"""
+    fn(x)
+    durations = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn(x)
+        durations.append((time.perf_counter() - start) * 1000)
+    return float(np.median(durations))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the NumPy MLP engine with the PyTorch ModelMLPV2")
+    parser.add_argument("--model_path", type=str, required=True, help="ModelMLPV2 checkpoint (.pth)")
+    parser.add_argument("--num_features", type=int, default=44, help="Number of input features")
+    parser.add_argument("--num_classes", type=int, default=5, help="Number of output classes")
+    parser.add_argument(
+        "--hidden_dims",
+        type=int,
+        nargs="+",
+        default=[256, 512, 256, 128],
+        help="Hidden layer sizes of the checkpoint",
+    )
+    parser.add_argument("--dropout_rate", type=float, default=0.3, help="Dropout rate (no effect in eval)")
+    parser.add_argument("--samples", type=int, default=1000, help="Random feature vectors to compare")
+    parser.add_argument("--feature_scale", type=float, default=10.0, help="Scale of the random features")
+    parser.add_argument("--iterations", type=int, default=200, help="Timed calls per measurement")
+    parser.add_argument("--tolerance", type=float, default=1e-4, help="Maximum allowed probability difference")
+    parser.add_argument(
+        "--save",
+        action="store_true",
+        help="Write the folded weights next to the checkpoint (.npz)",
+    )
+
+    args = parser.parse_args()
+
+    model = ModelMLPV2(
+        num_features=args.num_features,
+        num_classes=args.num_classes,
+        hidden_dims=args.hidden_dims,
+        dropout_rate=args.dropout_rate,
+        use_residual=True
+    )
+    checkpoint = torch.load(args.model_path, map_location="cpu")
+    if isinstance(checkpoint, dict) and "model_state_dict" in checkpoint:
+        checkpoint = checkpoint["model_state_dict"]
+    model.load_state_dict(checkpoint)
+    model.eval()
+
+    numpy_model = NumpyMLPV2.from_torch(model)
+    print(f"✓ Folded {args.model_path}: {len(numpy_model.layers)} layers, {numpy_model.nbytes / 1024:.1f} KB")
+
+    rng = np.random.default_rng(0)
+    features = (rng.standard_normal((args.samples, args.num_features)) * args.feature_scale).astype(np.float32)
+
+    with torch.inference_mode():
+        torch_logits = model(torch.from_numpy(features)).numpy()
+    numpy_logits = numpy_model(features)
+
+    torch_probs = torch.softmax(torch.from_numpy(torch_logits), dim=1).numpy()
+    numpy_probs = torch.softmax(torch.from_numpy(numpy_logits), dim=1).numpy()
+    logit_diff = float(np.abs(torch_logits - numpy_logits).max())
+    prob_diff = float(np.abs(torch_probs - numpy_probs).max())
+    agreement = float((torch_logits.argmax(axis=1) == numpy_logits.argmax(axis=1)).mean())
+
+    print(f"\nMax |Δ logit|:      {logit_diff:.2e}")
+    print(f"Max |Δ probability|: {prob_diff:.2e}")
+    print(f"Argmax agreement:   {agreement * 100:.2f}%")
+
+    def run_torch(x):
+        with torch.inference_mode():
+            return model(torch.from_numpy(x))
+
+    print(f"\n{'batch':>5} {'torch ms':>9} {'numpy ms':>9} {'speedup':>8}")
+    for batch_size in (1, 8, 64):
+        batch = features[:batch_size]
+        torch_ms = time_per_call(run_torch, batch, args.iterations)
+        numpy_ms = time_per_call(numpy_model, batch, args.iterations)
+        print(f"{batch_size:>5} {torch_ms:>9.3f} {numpy_ms:>9.3f} {torch_ms / numpy_ms:>7.1f}x")
+
+    if prob_diff > args.tolerance or agreement < 1.0:
+        print(f"\n✗ Parity check failed (tolerance {args.tolerance:.0e})")
+        sys.exit(1)
+    print("\n✓ Parity check passed")
+
+    if args.save:
+        output_path = os.path.splitext(args.model_path)[0] + ".npz"
+        numpy_model.save(output_path)
+        reloaded = NumpyMLPV2.load(output_path)
+        assert np.array_equal(reloaded(features), numpy_logits)
+        print(f"✓ Saved {output_path}")
+
+
+if __name__ == "__main__":
+    main()
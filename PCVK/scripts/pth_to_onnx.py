@@ -12,13 +12,22 @@ Usage:
     
     # For EfficientNetV2 models
     python pth_to_onnx.py --model_path effnet.pth --model_type efficientnet --input_size 224
+    
+    # Export and write an INT8 variant (*.int8.onnx) calibrated on real images
+    python pth_to_onnx.py --model_path mlpv2.pth --model_type mlpv2 --quantize static --calibration_dir data/val
+    
+    # Quantize an existing ONNX model (e.g. U2Net-P, which has no .pth)
+    python pth_to_onnx.py --onnx_input ../models/u2netp.onnx --model_type u2netp --quantize static --calibration_dir data/val
 """
 
 import argparse
 import sys
 import os
+import time
 from pathlib import Path
 
+import numpy as np
+
 import torch
 import torch.onnx
 
@@ -197,6 +206,222 @@ def get_dummy_input(model_type, **kwargs):
         raise ValueError(f"Unknown model type: {model_type}")
 
 
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp", ".bmp"}
+
+
+def load_calibration_images(image_dir, limit=100):
+    """
+    Collect calibration/evaluation images.
+    
+    Images inside a sub-directory named after a class (e.g. "Sayur Akar") are
+    labelled with that class index so accuracy can be reported.
+    
+    Args:
+        image_dir: Directory searched recursively for images
+        limit: Maximum number of images to use
+    
+    Returns:
+        Tuple of (image_paths, labels), labels entries are None when unknown
+    """
+    from api.configs.pcvk_config import CLASS_NAMES
+    
+    image_paths = sorted(
+        path for path in Path(image_dir).rglob("*")
+        if path.suffix.lower() in IMAGE_EXTENSIONS
+    )
+    
+    # Spread the selection over all classes instead of taking the first directory
+    if limit and len(image_paths) > limit:
+        step = len(image_paths) / limit
+        image_paths = [image_paths[int(i * step)] for i in range(limit)]
+    
+    labels = [
+        CLASS_NAMES.index(path.parent.name) if path.parent.name in CLASS_NAMES else None
+        for path in image_paths
+    ]
+    
+    return image_paths, labels
+
+
+def build_model_inputs(model_type, image_paths, seg_method="u2netp", apply_brightness_contrast=True):
+    """
+    Run the serving preprocessing pipeline to get model inputs for images.
+    
+    Args:
+        model_type: Type of model ('mlpv2', 'efficientnet', 'u2netp')
+        image_paths: Image files to convert
+        seg_method: Segmentation method used for MLP features
+        apply_brightness_contrast: Whether MLP features use brightness/contrast + CLAHE
+    
+    Returns:
+        List of float32 arrays, each with a leading batch dimension of 1
+    """
+    import cv2
+    from PIL import Image
+    from lib.segment import preprocess_u2netp_input
+    from api.services.classification.inference import prepare_model_input, efficientnet_preprocessor
+    
+    inputs = []
+    for path in image_paths:
+        if model_type == "u2netp":
+            image_bgr = cv2.resize(cv2.imread(str(path)), (224, 224))
+            inputs.append(preprocess_u2netp_input(image_bgr))
+            continue
+        
+        model_input, _ = prepare_model_input(
+            Image.open(path),
+            use_segmentation=seg_method != "none",
+            seg_method=seg_method,
+            apply_brightness_contrast=apply_brightness_contrast,
+            model_type="efficientnetv2" if model_type == "efficientnet" else model_type,
+            return_processed_image=False
+        )
+        if model_type == "efficientnet":
+            # Resized uint8 RGB image, normalised like the API's forward pass
+            inputs.append(efficientnet_preprocessor.batch([model_input]))
+            continue
+        inputs.append(np.asarray(model_input, dtype=np.float32)[np.newaxis])
+    
+    return inputs
+
+
+def quantize_onnx_model(fp32_path, int8_path, mode, calibration_inputs=None):
+    """
+    Write an INT8 variant of an ONNX model.
+    
+    Args:
+        fp32_path: Path to the fp32 ONNX model
+        int8_path: Path for the quantized model
+        mode: 'dynamic' (weights only, good for the MLPs) or 'static'
+            (weights + activations calibrated on real inputs, recommended for CNNs)
+        calibration_inputs: Model inputs used for static calibration
+    """
+    import onnxruntime as ort
+    from onnxruntime.quantization import (
+        CalibrationDataReader,
+        QuantFormat,
+        QuantType,
+        quantize_dynamic,
+        quantize_static,
+    )
+    
+    print(f"\nQuantizing ({mode}) {fp32_path} -> {int8_path}")
+    
+    # Shape inference + graph optimisation before quantization, as recommended by ONNX Runtime
+    source_path = fp32_path
+    prep_path = str(int8_path) + ".prep.onnx"
+    try:
+        from onnxruntime.quantization.shape_inference import quant_pre_process
+        quant_pre_process(str(fp32_path), prep_path)
+        source_path = prep_path
+    except Exception as e:
+        print(f"⚠ Skipping quantization pre-processing: {e}")
+    
+    try:
+        if mode == "dynamic":
+            quantize_dynamic(str(source_path), str(int8_path), weight_type=QuantType.QInt8)
+        else:
+            if not calibration_inputs:
+                raise ValueError("Static quantization needs calibration images (--calibration_dir)")
+            
+            input_name = ort.InferenceSession(str(fp32_path)).get_inputs()[0].name
+            
+            class _InputReader(CalibrationDataReader):
+                def __init__(self, inputs):
+                    self._inputs = iter(inputs)
+                
+                def get_next(self):
+                    model_input = next(self._inputs, None)
+                    return None if model_input is None else {input_name: model_input}
+            
+            quantize_static(
+                str(source_path),
+                str(int8_path),
+                calibration_data_reader=_InputReader(calibration_inputs),
+                quant_format=QuantFormat.QDQ,
+                per_channel=True,
+                activation_type=QuantType.QUInt8,
+                weight_type=QuantType.QInt8,
+            )
+    finally:
+        if os.path.exists(prep_path):
+            os.remove(prep_path)
+    
+    print(f"✓ INT8 model saved to: {int8_path}")
+
+
+def compare_with_fp32(fp32_path, int8_path, model_type, inputs, labels=None, warmup=3):
+    """
+    Report accuracy and latency of the INT8 model against the fp32 baseline.
+    
+    Args:
+        fp32_path: Path to the fp32 ONNX model
+        int8_path: Path to the INT8 ONNX model
+        model_type: Type of model ('mlpv2', 'efficientnet', 'u2netp')
+        inputs: Evaluation inputs (batch of 1 each)
+        labels: Optional class index per input
+        warmup: Untimed runs per session before measuring
+    
+    Returns:
+        Dictionary with the measured metrics
+    """
+    import onnxruntime as ort
+    
+    def run_all(path):
+        session = ort.InferenceSession(str(path), providers=["CPUExecutionProvider"])
+        input_name = session.get_inputs()[0].name
+        for model_input in inputs[:warmup]:
+            session.run(None, {input_name: model_input})
+        
+        outputs, latencies = [], []
+        for model_input in inputs:
+            start = time.perf_counter()
+            outputs.append(session.run(None, {input_name: model_input})[0])
+            latencies.append((time.perf_counter() - start) * 1000)
+        return np.concatenate(outputs, axis=0), float(np.mean(latencies))
+    
+    fp32_out, fp32_ms = run_all(fp32_path)
+    int8_out, int8_ms = run_all(int8_path)
+    
+    report = {
+        "samples": len(inputs),
+        "fp32_latency_ms": fp32_ms,
+        "int8_latency_ms": int8_ms,
+        "speedup": fp32_ms / int8_ms if int8_ms else 0.0,
+        "fp32_size_mb": os.path.getsize(fp32_path) / (1024 * 1024),
+        "int8_size_mb": os.path.getsize(int8_path) / (1024 * 1024),
+        "max_abs_diff": float(np.max(np.abs(fp32_out - int8_out))),
+    }
+    
+    if model_type == "u2netp":
+        # Mask agreement (IoU of thresholded saliency maps)
+        def to_mask(pred):
+            pred = pred.reshape(len(pred), -1)
+            pred = (pred - pred.min(axis=1, keepdims=True)) / (np.ptp(pred, axis=1, keepdims=True) + 1e-8)
+            return pred > 0.5
+        
+        fp32_mask, int8_mask = to_mask(fp32_out), to_mask(int8_out)
+        intersection = np.logical_and(fp32_mask, int8_mask).sum(axis=1)
+        union = np.logical_or(fp32_mask, int8_mask).sum(axis=1)
+        report["mask_iou"] = float(np.mean(intersection / np.maximum(union, 1)))
+    else:
+        fp32_pred = fp32_out.argmax(axis=1)
+        int8_pred = int8_out.argmax(axis=1)
+        report["top1_agreement"] = float(np.mean(fp32_pred == int8_pred))
+        
+        if labels and all(label is not None for label in labels):
+            labels = np.array(labels)
+            report["fp32_accuracy"] = float(np.mean(fp32_pred == labels))
+            report["int8_accuracy"] = float(np.mean(int8_pred == labels))
+            report["accuracy_delta"] = report["int8_accuracy"] - report["fp32_accuracy"]
+    
+    print(f"\nINT8 vs fp32 ({report['samples']} samples)")
+    for key, value in report.items():
+        print(f"  {key:<16} {value:.4f}" if isinstance(value, float) else f"  {key:<16} {value}")
+    
+    return report
+
+
 def main():
     parser = argparse.ArgumentParser(
         description="Convert PyTorch model (.pth) to ONNX format"
@@ -206,8 +431,12 @@ def main():
     parser.add_argument(
         "--model_path",
         type=str,
-        required=True,
-        help="Path to the PyTorch model (.pth file)",
+        help="Path to the PyTorch model (.pth file), required unless --onnx_input is given",
+    )
+    parser.add_argument(
+        "--onnx_input",
+        type=str,
+        help="Existing fp32 ONNX model to quantize instead of exporting from .pth",
     )
     parser.add_argument(
         "--output_path",
@@ -220,8 +449,8 @@ def main():
         "--model_type",
         type=str,
         default="mlpv2",
-        choices=["mlpv2", "efficientnet"],
-        help="Type of model to convert",
+        choices=["mlpv2", "efficientnet", "u2netp"],
+        help="Type of model to convert (u2netp only with --onnx_input)",
     )
     
     # MLP-specific arguments
@@ -289,8 +518,48 @@ def main():
         help="Skip ONNX model verification",
     )
     
+    # Quantization arguments
+    parser.add_argument(
+        "--quantize",
+        type=str,
+        default="none",
+        choices=["none", "dynamic", "static"],
+        help="Also write an INT8 variant (*.int8.onnx): dynamic (weights only) or static (calibrated)",
+    )
+    parser.add_argument(
+        "--calibration_dir",
+        type=str,
+        help="Images for static calibration and the fp32/int8 comparison (class sub-directories enable accuracy)",
+    )
+    parser.add_argument(
+        "--calibration_size",
+        type=int,
+        default=100,
+        help="Maximum number of calibration images",
+    )
+    parser.add_argument(
+        "--seg_method",
+        type=str,
+        default="u2netp",
+        help="Segmentation method used to compute MLP calibration features",
+    )
+    parser.add_argument(
+        "--no_brightness_contrast",
+        action="store_true",
+        help="Compute MLP calibration features without brightness/contrast + CLAHE",
+    )
+    
     args = parser.parse_args()
     
+    if args.onnx_input:
+        quantize_existing_onnx(args)
+        return
+    
+    if args.model_path is None:
+        parser.error("--model_path is required unless --onnx_input is given")
+    if args.model_type == "u2netp":
+        parser.error("u2netp can only be quantized from an existing ONNX model (--onnx_input)")
+    
     # Set output path
     if args.output_path is None:
         args.output_path = Path(args.model_path).with_suffix(".onnx")
@@ -349,6 +618,51 @@ def main():
     # Print model info
     model_size = os.path.getsize(args.output_path) / (1024 * 1024)
     print(f"  Model size: {model_size:.2f} MB")
+    
+    if args.quantize != "none":
+        quantize_and_report(args, args.output_path)
+
+
+def quantize_existing_onnx(args):
+    """Quantize the model given by --onnx_input"""
+    if args.quantize == "none":
+        print("Nothing to do: --onnx_input given without --quantize")
+        return
+    
+    quantize_and_report(args, args.onnx_input)
+
+
+def quantize_and_report(args, fp32_path):
+    """
+    Write the INT8 variant next to an fp32 ONNX model and compare both.
+    
+    Args:
+        args: Parsed command line arguments
+        fp32_path: Path to the fp32 ONNX model
+    """
+    int8_path = os.path.splitext(str(fp32_path))[0] + ".int8.onnx"
+    
+    inputs, labels = [], None
+    if args.calibration_dir:
+        image_paths, labels = load_calibration_images(args.calibration_dir, args.calibration_size)
+        print(f"\nPreparing {len(image_paths)} calibration images from {args.calibration_dir}")
+        inputs = build_model_inputs(
+            args.model_type,
+            image_paths,
+            seg_method=args.seg_method,
+            apply_brightness_contrast=not args.no_brightness_contrast,
+        )
+    
+    quantize_onnx_model(fp32_path, int8_path, args.quantize, calibration_inputs=inputs)
+    
+    if not inputs:
+        # Without real images only latency/size are meaningful
+        print("⚠ No --calibration_dir given, comparing on random inputs (accuracy not measured)")
+        import onnxruntime as ort
+        shape = [d if isinstance(d, int) else 1 for d in ort.InferenceSession(str(fp32_path)).get_inputs()[0].shape]
+        inputs = [np.random.randn(*shape).astype(np.float32) for _ in range(32)]
+    
+    compare_with_fp32(fp32_path, int8_path, args.model_type, inputs, labels=labels)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,345 @@
+"""
+Pre-fork launcher: load and warm the models once, then fork the API workers
+
+The parent imports the app, loads the classification models (and PaddleOCR), runs one
+warm-up prediction per model and freezes the garbage collector, then forks the uvicorn
+workers on a shared listening socket. Weights are read-only after loading, so the
+workers share those pages copy-on-write instead of each loading its own copy.
+
+Per-process RSS and PSS are printed from /proc. PSS splits shared pages between the
+processes mapping them, so the sum of PSS is the real memory use of the whole server
+(send SIGUSR1 to the parent for a report at any time).
+
+Usage:
+    python serve_prefork.py --workers 4
+    python serve_prefork.py --workers 4 --models mlpv2_auto-clahe efficientnetv2
+
+Linux only (fork, /proc). Set PROMETHEUS_MULTIPROC_DIR to aggregate /metrics over the workers.
+"""
+
+import os
+
+# One thread per worker for the math libraries and ONNX Runtime: thread pools do not
+# survive fork, and N workers already use N cores. Must be set before they are imported.
+for _var in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS"):
+    os.environ.setdefault(_var, "1")
+os.environ.setdefault("ONNX_INTRA_OP_THREADS", "1")
+
+import argparse
+import gc
+import glob
+import signal
+import socket
+import sys
+import time
+
+from api.configs.config import (
+    SERVER_HOST,
+    SERVER_PORT,
+    PREFORK_WORKERS,
+    PREFORK_MODELS,
+    PREFORK_MEMORY_REPORT_SECONDS
+)
+
+
+def read_memory(pid):
+    """
+    Memory of a process from /proc/<pid>/smaps_rollup
+
+    Args:
+        pid: Process id
+
+    Returns:
+        Dict with rss, pss, shared and private in MB, None if the process is gone
+    """
+    fields = {}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) >= 2 and parts[0].endswith(":") and parts[1].isdigit():
+                    fields[parts[0][:-1]] = int(parts[1]) / 1024
+    except (FileNotFoundError, ProcessLookupError, PermissionError):
+        return None
+
+    return {
+        "rss": fields.get("Rss", 0.0),
+        "pss": fields.get("Pss", 0.0),
+        "shared": fields.get("Shared_Clean", 0.0) + fields.get("Shared_Dirty", 0.0),
+        "private": fields.get("Private_Clean", 0.0) + fields.get("Private_Dirty", 0.0),
+    }
+
+
+def print_memory_report(workers):
+    """Print RSS/PSS of the parent and every worker"""
+    rows = [("parent", os.getpid())]
+    rows += [(f"worker {index}", pid) for pid, index in sorted(workers.items(), key=lambda item: item[1])]
+
+    print("-" * 60)
+    print(f"{'process':<10} {'pid':>8} {'RSS MB':>9} {'PSS MB':>9} {'shared MB':>10} {'private MB':>11}")
+    total_rss = total_pss = 0.0
+    for role, pid in rows:
+        memory = read_memory(pid)
+        if memory is None:
+            continue
+        total_rss += memory["rss"]
+        total_pss += memory["pss"]
+        print(
+            f"{role:<10} {pid:>8} {memory['rss']:>9.1f} {memory['pss']:>9.1f} "
+            f"{memory['shared']:>10.1f} {memory['private']:>11.1f}"
+        )
+    print(f"{'total':<10} {'':>8} {total_rss:>9.1f} {total_pss:>9.1f}")
+    if total_rss:
+        saved_mb = total_rss - total_pss
+        print(f"Shared copy-on-write saves ~{saved_mb:.1f} MB ({saved_mb / total_rss * 100:.0f}% of summed RSS)")
+    print("-" * 60)
+
+
+def limit_threads():
+    """Single-threaded OpenCV and torch in the parent, inherited by the workers"""
+    import cv2
+    cv2.setNumThreads(1)
+
+    from api.configs.pcvk_config import SLIM_RUNTIME
+    if SLIM_RUNTIME:
+        return
+    try:
+        import torch
+    except ImportError:
+        return
+    torch.set_num_threads(1)
+    torch.set_num_interop_threads(1)
+
+
+def warm_up(model_type):
+    """
+    Run one prediction on a synthetic image
+
+    Loads the lazily created parts (U2Net-P session, first-run allocations) in the
+    parent so the workers inherit them instead of building their own.
+    """
+    import numpy as np
+    from PIL import Image
+    from api.services.classification.inference import predict_image
+    from api.services.classification.model_loader import model_manager
+
+    image = Image.fromarray(np.random.default_rng(0).integers(0, 256, (224, 224, 3), dtype=np.uint8))
+    start_time = time.perf_counter()
+    predict_image(
+        model_manager.get_model(model_type),
+        image,
+        use_segmentation=True,
+        seg_method="u2netp",
+        model_type=model_type,
+        is_onnx=model_manager.get_model_type(model_type) == "onnx"
+    )
+    print(f"Warm-up {model_type}: {(time.perf_counter() - start_time) * 1000:.1f} ms")
+
+
+def preload(model_types, preload_ocr):
+    """
+    Import the app and load everything the workers should share
+
+    Args:
+        model_types: Classification models to load and warm
+        preload_ocr: Whether to load PaddleOCR as well
+
+    Returns:
+        The ASGI app
+    """
+    from api.app import app
+    from api.services.classification.model_loader import model_manager
+    from api.services.ocr_service import ocr_service
+
+    limit_threads()
+
+    for model_type in model_types:
+        if not model_manager.load_model(model_type):
+            print(f"WARNING: failed to load {model_type}, workers will load it on demand")
+            continue
+        try:
+            warm_up(model_type)
+        except Exception as e:
+            print(f"WARNING: warm-up of {model_type} failed: {e}")
+
+    if preload_ocr and not ocr_service.load_model():
+        print("WARNING: OCR model failed to load!")
+
+    # Objects alive now are never collected, so the GC does not write to (and unshare) their pages
+    gc.collect()
+    gc.freeze()
+    return app
+
+
+def create_socket(host, port):
+    """Listening socket shared by all workers"""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def spawn_worker(app, sock, index):
+    """
+    Fork one uvicorn worker serving on the shared socket
+
+    Returns:
+        Worker pid (in the parent only, the child never returns)
+    """
+    pid = os.fork()
+    if pid:
+        return pid
+
+    # Child: uvicorn installs its own SIGINT/SIGTERM handlers
+    for signum in (signal.SIGINT, signal.SIGTERM, signal.SIGUSR1):
+        signal.signal(signum, signal.SIG_DFL)
+
+    import uvicorn
+
+    exit_code = 0
+    try:
+        print(f"Worker {index} started (pid {os.getpid()})")
+        uvicorn.Server(uvicorn.Config(app, lifespan="on", log_level="info")).run(sockets=[sock])
+    except BaseException as e:
+        print(f"Worker {index} crashed: {e}")
+        exit_code = 1
+    finally:
+        sys.stdout.flush()
+        os._exit(exit_code)
+
+
+def prepare_prometheus_dir():
+    """Start from an empty PROMETHEUS_MULTIPROC_DIR, stale files of old pids would be aggregated"""
+    directory = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+    if not directory:
+        return
+    os.makedirs(directory, exist_ok=True)
+    for path in glob.glob(os.path.join(directory, "*.db")):
+        os.remove(path)
+
+
+def mark_worker_dead(pid):
+    """Drop live gauges of a dead worker from the aggregated metrics"""
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(pid)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the API with pre-forked workers sharing loaded models")
+    parser.add_argument("--host", type=str, default=SERVER_HOST, help="Bind address")
+    parser.add_argument("--port", type=int, default=SERVER_PORT, help="Bind port")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=PREFORK_WORKERS,
+        help="Number of worker processes (default: PREFORK_WORKERS or the CPU count)",
+    )
+    parser.add_argument(
+        "--models",
+        type=str,
+        nargs="+",
+        default=PREFORK_MODELS,
+        help="Classification models to load in the parent (default: PREFORK_MODELS)",
+    )
+    parser.add_argument(
+        "--no_ocr",
+        action="store_true",
+        help="Do not preload PaddleOCR (never preloaded with SLIM_RUNTIME)",
+    )
+    parser.add_argument(
+        "--memory_report_seconds",
+        type=float,
+        default=PREFORK_MEMORY_REPORT_SECONDS,
+        help="Interval of the RSS/PSS report, 0 for a single report after startup",
+    )
+
+    args = parser.parse_args()
+
+    if not hasattr(os, "fork"):
+        print("✗ serve_prefork.py needs os.fork (Linux), use app.py instead")
+        sys.exit(1)
+
+    prepare_prometheus_dir()
+
+    from api.configs.pcvk_config import SLIM_RUNTIME
+
+    print("=" * 60)
+    print(f"Pre-fork launcher: {args.workers} workers, models: {args.models}")
+    print("=" * 60)
+    app = preload(args.models, preload_ocr=not args.no_ocr and not SLIM_RUNTIME)
+    sock = create_socket(args.host, args.port)
+
+    workers = {}
+    for index in range(max(1, args.workers)):
+        workers[spawn_worker(app, sock, index)] = index
+    print(f"Serving on http://{args.host}:{args.port} (parent pid {os.getpid()})")
+
+    stopping = False
+    report_requested = False
+
+    def request_stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+
+    def request_report(signum, frame):
+        nonlocal report_requested
+        report_requested = True
+
+    signal.signal(signal.SIGINT, request_stop)
+    signal.signal(signal.SIGTERM, request_stop)
+    signal.signal(signal.SIGUSR1, request_report)
+
+    # First report once the workers have run their lifespan startup
+    next_report = time.monotonic() + 10
+    while not stopping:
+        try:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+        except ChildProcessError:
+            pid = 0
+
+        if pid and pid in workers:
+            index = workers.pop(pid)
+            mark_worker_dead(pid)
+            print(f"Worker {index} (pid {pid}) exited with status {status}, restarting")
+            time.sleep(1)
+            workers[spawn_worker(app, sock, index)] = index
+            continue
+
+        if report_requested or (next_report and time.monotonic() >= next_report):
+            report_requested = False
+            print_memory_report(workers)
+            next_report = time.monotonic() + args.memory_report_seconds if args.memory_report_seconds > 0 else 0
+
+        time.sleep(0.5)
+
+    print("Stopping workers...")
+    for pid in workers:
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+
+    deadline = time.monotonic() + 30
+    while workers and time.monotonic() < deadline:
+        try:
+            pid, _ = os.waitpid(-1, os.WNOHANG)
+        except ChildProcessError:
+            break
+        if pid:
+            workers.pop(pid, None)
+            mark_worker_dead(pid)
+        else:
+            time.sleep(0.2)
+
+    for pid in workers:
+        print(f"Worker pid {pid} did not stop, killing it")
+        os.kill(pid, signal.SIGKILL)
+    sock.close()
+    print("Shutdown complete")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,12 @@
+"""
+Shared test setup
+
+The services are imported in the slim runtime (no torch) with an unlimited model
+memory budget, and nothing under test loads model weights.
+"""
+
+import os
+
+os.environ.setdefault("SLIM_RUNTIME", "true")
+os.environ.setdefault("MODEL_MEMORY_BUDGET_MB", "0")
+os.environ.pop("PROMETHEUS_MULTIPROC_DIR", None)
@@ -0,0 +1,203 @@
+"""
+Tests for the admission limiter and middleware
+"""
+
+import asyncio
+
+import pytest
+
+from api.services.admission import (
+    MAX_RETRY_AFTER_SECONDS,
+    AdmissionController,
+    AdmissionLimiter,
+    AdmissionMiddleware,
+    AdmissionRejected
+)
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_acquires_up_to_concurrency_without_waiting():
+    async def scenario():
+        limiter = AdmissionLimiter("test", concurrency=2, queue=0, queue_timeout=1)
+        await limiter.acquire()
+        await limiter.acquire()
+        return limiter
+
+    limiter = run(scenario())
+
+    assert (limiter.active, limiter.queued) == (2, 0)
+
+
+def test_full_queue_is_refused_with_429():
+    async def scenario():
+        limiter = AdmissionLimiter("test", concurrency=1, queue=1, queue_timeout=5)
+        await limiter.acquire()
+        waiting = asyncio.create_task(limiter.acquire())
+        await asyncio.sleep(0)
+
+        with pytest.raises(AdmissionRejected) as raised:
+            await limiter.acquire()
+
+        waiting.cancel()
+        await asyncio.gather(waiting, return_exceptions=True)
+        return raised.value, limiter
+
+    rejection, limiter = run(scenario())
+
+    assert (rejection.status_code, rejection.reason) == (429, "queue_full")
+    assert 1 <= rejection.retry_after <= MAX_RETRY_AFTER_SECONDS
+    assert (limiter.active, limiter.queued) == (1, 0)
+
+
+def test_queue_timeout_is_refused_with_503_and_leaves_queue():
+    async def scenario():
+        limiter = AdmissionLimiter("test", concurrency=1, queue=4, queue_timeout=0.01)
+        await limiter.acquire()
+
+        with pytest.raises(AdmissionRejected) as raised:
+            await limiter.acquire()
+        return raised.value, limiter
+
+    rejection, limiter = run(scenario())
+
+    assert (rejection.status_code, rejection.reason) == (503, "queue_timeout")
+    assert (limiter.active, limiter.queued) == (1, 0)
+
+
+def test_release_hands_slot_to_waiters_in_fifo_order():
+    async def scenario():
+        limiter = AdmissionLimiter("test", concurrency=1, queue=4, queue_timeout=5)
+        order = []
+
+        async def wait(name):
+            await limiter.acquire()
+            order.append(name)
+
+        await limiter.acquire()
+        waiters = [asyncio.create_task(wait(name)) for name in ("first", "second")]
+        await asyncio.sleep(0)
+
+        limiter.release()
+        await asyncio.sleep(0)
+        limiter.release()
+        await asyncio.gather(*waiters)
+        limiter.release()
+        return order, limiter
+
+    order, limiter = run(scenario())
+
+    assert order == ["first", "second"]
+    assert (limiter.active, limiter.queued) == (0, 0)
+
+
+def test_cancelled_waiter_gives_up_its_place():
+    async def scenario():
+        limiter = AdmissionLimiter("test", concurrency=1, queue=4, queue_timeout=5)
+        await limiter.acquire()
+        waiting = asyncio.create_task(limiter.acquire())
+        await asyncio.sleep(0)
+
+        waiting.cancel()
+        await asyncio.gather(waiting, return_exceptions=True)
+        queued_after_cancel = limiter.queued
+        limiter.release()
+        return queued_after_cancel, limiter
+
+    queued_after_cancel, limiter = run(scenario())
+
+    assert queued_after_cancel == 0
+    assert limiter.active == 0
+
+
+def test_slot_is_released_when_the_block_raises():
+    async def scenario():
+        limiter = AdmissionLimiter("test", concurrency=1, queue=0, queue_timeout=1)
+        with pytest.raises(ValueError):
+            async with limiter.slot():
+                raise ValueError("boom")
+        return limiter
+
+    limiter = run(scenario())
+
+    assert (limiter.active, limiter.queued) == (0, 0)
+
+
+def test_retry_after_follows_service_time():
+    limiter = AdmissionLimiter("test", concurrency=1, queue=0, queue_timeout=1)
+    for _ in range(50):
+        limiter.active = 1
+        limiter.release(service_time=4.0)
+
+    assert limiter.retry_after() == 4
+
+
+class RecordingApp:
+    """ASGI app that records calls and answers 200"""
+
+    def __init__(self):
+        self.calls = 0
+
+    async def __call__(self, scope, receive, send):
+        self.calls += 1
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+
+
+def call_middleware(middleware, method, path):
+    sent = []
+
+    async def receive():
+        return {"type": "http.request", "body": b""}
+
+    async def send(message):
+        sent.append(message)
+
+    run(middleware({"type": "http", "method": method, "path": path}, receive, send))
+    return sent
+
+
+@pytest.fixture
+def controller():
+    return AdmissionController({
+        "predict": {"paths": ["/api/pcvk/predict"], "concurrency": 1, "queue": 0, "queue_timeout": 1}
+    })
+
+
+def test_middleware_refuses_with_retry_after(controller):
+    app = RecordingApp()
+    middleware = AdmissionMiddleware(app, controller)
+    controller.limiters["predict"].active = 1
+
+    sent = call_middleware(middleware, "POST", "/api/pcvk/predict/")
+
+    headers = dict(sent[0]["headers"])
+    assert sent[0]["status"] == 429
+    assert int(headers[b"retry-after"]) >= 1
+    assert app.calls == 0
+
+
+def test_middleware_releases_slot_after_response(controller):
+    app = RecordingApp()
+    middleware = AdmissionMiddleware(app, controller)
+
+    sent = call_middleware(middleware, "POST", "/api/pcvk/predict")
+
+    assert sent[0]["status"] == 200
+    assert controller.limiters["predict"].active == 0
+
+
+def test_middleware_lets_preflight_and_other_paths_through(controller):
+    app = RecordingApp()
+    middleware = AdmissionMiddleware(app, controller)
+    controller.limiters["predict"].active = 1
+
+    preflight = call_middleware(middleware, "OPTIONS", "/api/pcvk/predict")
+    other = call_middleware(middleware, "GET", "/api/pcvk/classes")
+
+    assert preflight[0]["status"] == 200
+    assert other[0]["status"] == 200
+    assert app.calls == 2
+    assert controller.limiters["predict"].active == 1
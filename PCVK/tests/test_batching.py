@@ -0,0 +1,157 @@
+"""
+Tests for the micro-batcher: batch window, error propagation and worker crash recovery
+"""
+
+import asyncio
+
+import pytest
+
+from api.services.classification.batching import MicroBatcher
+
+
+class EchoBatcher(MicroBatcher):
+    """Micro-batcher whose forward pass echoes the inputs and records the batch sizes"""
+
+    def __init__(self, *args, fail_with=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.batches = []
+        self.fail_with = fail_with
+
+    async def _run_batch(self, model_type, inputs, timings):
+        self.batches.append(len(inputs))
+        if self.fail_with is not None:
+            raise self.fail_with
+        return [(str(model_input), 1.0, {}) for model_input in inputs]
+
+
+class ExplodingTimings(dict):
+    """Timings dict whose batch_wait write raises inside the worker loop itself"""
+
+    def __setitem__(self, key, value):
+        if key == "batch_wait":
+            raise KeyError("worker crashed")
+        super().__setitem__(key, value)
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_concurrent_requests_share_one_forward_pass():
+    async def scenario():
+        batcher = EchoBatcher(max_batch_size=8, max_wait_ms=50)
+        results = await asyncio.gather(*(batcher.submit("mlpv2", i) for i in range(5)))
+        await batcher.shutdown()
+        return batcher, results
+
+    batcher, results = run(scenario())
+
+    assert [predicted for predicted, _, _ in results] == ["0", "1", "2", "3", "4"]
+    assert batcher.batches == [5]
+
+
+def test_full_batch_runs_before_the_window_closes():
+    async def scenario():
+        batcher = EchoBatcher(max_batch_size=4, max_wait_ms=10_000)
+        results = await asyncio.wait_for(
+            asyncio.gather(*(batcher.submit("mlpv2", i) for i in range(8))),
+            timeout=5
+        )
+        await batcher.shutdown()
+        return batcher, results
+
+    batcher, results = run(scenario())
+
+    assert len(results) == 8
+    assert batcher.batches == [4, 4]
+
+
+def test_requests_outside_the_window_get_their_own_batch():
+    async def scenario():
+        batcher = EchoBatcher(max_batch_size=8, max_wait_ms=1)
+        await batcher.submit("mlpv2", 0)
+        await batcher.submit("mlpv2", 1)
+        await batcher.shutdown()
+        return batcher
+
+    assert run(scenario()).batches == [1, 1]
+
+
+def test_model_types_are_batched_separately_and_record_batch_wait():
+    async def scenario():
+        batcher = EchoBatcher(max_batch_size=8, max_wait_ms=20)
+        timings = [{}, {}]
+        await asyncio.gather(
+            batcher.submit("mlpv2", 0, timings=timings[0]),
+            batcher.submit("efficientnetv2", 1, timings=timings[1])
+        )
+        await batcher.shutdown()
+        return batcher, timings
+
+    batcher, timings = run(scenario())
+
+    assert batcher.batches == [1, 1]
+    assert all("batch_wait" in sample for sample in timings)
+
+
+def test_forward_error_fails_the_batch_and_worker_keeps_serving():
+    async def scenario():
+        batcher = EchoBatcher(max_batch_size=8, max_wait_ms=5, fail_with=RuntimeError("forward failed"))
+        outcomes = await asyncio.gather(
+            *(batcher.submit("mlpv2", i) for i in range(3)),
+            return_exceptions=True
+        )
+        batcher.fail_with = None
+        after = await batcher.submit("mlpv2", 9)
+        await batcher.shutdown()
+        return outcomes, after
+
+    outcomes, after = run(scenario())
+
+    assert all(isinstance(outcome, RuntimeError) for outcome in outcomes)
+    assert after[0] == "9"
+
+
+def test_crashed_worker_fails_stranded_requests_and_restarts():
+    async def scenario():
+        batcher = EchoBatcher(max_batch_size=8, max_wait_ms=5)
+        requests = [
+            asyncio.create_task(batcher.submit("mlpv2", 0, timings=ExplodingTimings())),
+            asyncio.create_task(batcher.submit("mlpv2", 1)),
+        ]
+        await asyncio.sleep(0)
+        first_worker = batcher._workers["mlpv2"]
+
+        outcomes = await asyncio.gather(*requests, return_exceptions=True)
+        after = await asyncio.wait_for(batcher.submit("mlpv2", 2), timeout=5)
+        restarted = batcher._workers["mlpv2"] is not first_worker and first_worker.done()
+        await batcher.shutdown()
+        return outcomes, restarted, after
+
+    outcomes, restarted, after = run(scenario())
+
+    assert all(isinstance(outcome, KeyError) for outcome in outcomes)
+    assert restarted
+    assert after[0] == "2"
+
+
+def test_shutdown_fails_waiting_requests():
+    async def scenario():
+        batcher = EchoBatcher(max_batch_size=8, max_wait_ms=10_000)
+        waiting = asyncio.create_task(batcher.submit("mlpv2", 0))
+        await asyncio.sleep(0.01)
+        await batcher.shutdown()
+        with pytest.raises(RuntimeError, match="stopped"):
+            await asyncio.wait_for(waiting, timeout=1)
+        return batcher
+
+    assert run(scenario()).batches == []
+
+
+def test_disabled_batcher_runs_each_request_alone():
+    async def scenario():
+        batcher = EchoBatcher(max_batch_size=8, max_wait_ms=50, enabled=False)
+        await asyncio.gather(*(batcher.submit("mlpv2", i) for i in range(3)))
+        return batcher
+
+    assert run(scenario()).batches == [1, 1, 1]
@@ -0,0 +1,126 @@
+"""
+Tests for the LRU/TTL caches and prediction invalidation on model artifact changes
+"""
+
+import os
+
+import pytest
+
+from api.services.classification import cache
+from api.services.classification.cache import LRUCache, invalidate_model_predictions, prediction_cache_key
+from api.services.classification.model_loader import ModelManager
+
+
+class FakeClock:
+    """Stands in for time.monotonic so TTL tests do not sleep"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(cache.time, "monotonic", fake)
+    return fake
+
+
+@pytest.fixture
+def prediction_cache(monkeypatch):
+    """Empty global prediction cache, enabled even if disabled in the environment"""
+    fresh = LRUCache(max_size=16)
+    monkeypatch.setattr(cache, "prediction_cache", fresh)
+    return fresh
+
+
+def test_evicts_least_recently_used():
+    lru = LRUCache(max_size=2)
+    lru.set("a", 1)
+    lru.set("b", 2)
+    lru.get("a")
+    lru.set("c", 3)
+
+    assert lru.get("a") == 1
+    assert lru.get("b") is None
+    assert lru.get("c") == 3
+
+
+def test_set_existing_key_refreshes_position():
+    lru = LRUCache(max_size=2)
+    lru.set("a", 1)
+    lru.set("b", 2)
+    lru.set("a", 10)
+    lru.set("c", 3)
+
+    assert lru.get("a") == 10
+    assert lru.get("b") is None
+
+
+def test_entries_expire_after_ttl(clock):
+    lru = LRUCache(max_size=4, ttl_seconds=10)
+    lru.set("a", 1)
+
+    clock.now += 10
+    assert lru.get("a") == 1
+
+    clock.now += 0.5
+    assert lru.get("a") is None
+    assert lru.stats()["size"] == 0
+
+
+def test_zero_size_disables_cache():
+    lru = LRUCache(max_size=0)
+    lru.set("a", 1)
+
+    assert not lru.enabled
+    assert lru.get("a") is None
+
+
+def test_stats_count_hits_and_misses():
+    lru = LRUCache(max_size=4)
+    lru.set("a", 1)
+    lru.get("a")
+    lru.get("a")
+    lru.get("b")
+
+    stats = lru.stats()
+
+    assert (stats["hits"], stats["misses"], stats["size"]) == (2, 1, 1)
+    assert stats["hit_rate"] == pytest.approx(2 / 3)
+
+
+def test_invalidate_model_predictions_drops_only_that_model(prediction_cache):
+    kept = prediction_cache_key("img", "efficientnetv2", "u2netp", True, True)
+    dropped = [
+        prediction_cache_key("img", "mlpv2", "u2netp", True, True),
+        prediction_cache_key("other", "mlpv2", "hsv", False, False),
+    ]
+    for key in [kept, *dropped]:
+        prediction_cache.set(key, ("A", 1.0, {}))
+
+    assert invalidate_model_predictions("mlpv2") == 2
+    assert prediction_cache.get(kept) is not None
+    assert all(prediction_cache.get(key) is None for key in dropped)
+
+
+def test_changed_model_artifact_invalidates_its_predictions(tmp_path, prediction_cache):
+    manager = ModelManager()
+    artifact = tmp_path / "mlpv2.onnx"
+    artifact.write_bytes(b"v1")
+    key = prediction_cache_key("img", "mlpv2", "u2netp", True, True)
+
+    manager._record_artifact("mlpv2", "onnx", str(artifact))
+    prediction_cache.set(key, ("A", 1.0, {}))
+
+    # Reloading the same file keeps the cached predictions
+    manager._record_artifact("mlpv2", "onnx", str(artifact))
+    assert prediction_cache.get(key) is not None
+
+    # A new file (other mtime) drops them
+    stat = artifact.stat()
+    os.utime(artifact, (stat.st_atime, stat.st_mtime + 60))
+    manager._record_artifact("mlpv2", "onnx", str(artifact))
+    assert prediction_cache.get(key) is None
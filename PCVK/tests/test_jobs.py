@@ -0,0 +1,197 @@
+"""
+Tests for the SQLite job store and the failure handling of the job runner
+"""
+
+import asyncio
+import io
+import os
+import sqlite3
+import threading
+
+import pytest
+
+from api.services.classification import jobs
+from api.services.classification.jobs import (
+    JOB_COMPLETED,
+    JOB_FAILED,
+    JOB_QUEUED,
+    JOB_RUNNING,
+    JobRunner,
+    JobStore
+)
+
+PARAMS = {
+    "model_type": "mlpv2",
+    "seg_method": "hsv",
+    "use_segmentation": True,
+    "apply_brightness_contrast": True,
+}
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = JobStore(str(tmp_path))
+    yield store
+    store.close()
+
+
+def create(store, count=2):
+    return store.create_job(PARAMS, [(f"{i}.jpg", io.BytesIO(b"image %d" % i)) for i in range(count)])
+
+
+def test_create_job_stores_images_and_queues(store):
+    job = create(store, count=2)
+
+    assert job["status"] == JOB_QUEUED
+    assert (job["total"], job["completed"], job["failed"], job["attempts"]) == (2, 0, 0, 0)
+    with open(store.image_path(job["id"], 1), "rb") as f:
+        assert f.read() == b"image 1"
+    assert store.pending_items(job["id"]) == [(0, "0.jpg"), (1, "1.jpg")]
+
+
+def test_claims_oldest_queued_job_once(store):
+    first = create(store)
+    second = create(store)
+
+    claimed = [store.claim_next(), store.claim_next(), store.claim_next()]
+
+    assert [job["id"] for job in claimed[:2]] == [first["id"], second["id"]]
+    assert claimed[2] is None
+    assert claimed[0]["status"] == JOB_RUNNING
+    assert claimed[0]["attempts"] == 1
+
+
+def test_concurrent_stores_never_claim_the_same_job(store, tmp_path):
+    job_ids = {create(store, count=1)["id"] for _ in range(20)}
+    others = [JobStore(str(tmp_path)) for _ in range(4)]
+    claimed = []
+    lock = threading.Lock()
+
+    def drain(other):
+        while True:
+            job = other.claim_next()
+            if job is None:
+                return
+            with lock:
+                claimed.append(job["id"])
+
+    threads = [threading.Thread(target=drain, args=(other,)) for other in others]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    for other in others:
+        other.close()
+
+    assert sorted(claimed) == sorted(job_ids)
+
+
+def test_save_result_counts_each_item_once(store):
+    job = create(store, count=2)
+    store.claim_next()
+
+    store.save_result(job["id"], 0, {"filename": "0.jpg", "error": None})
+    store.save_result(job["id"], 0, {"filename": "0.jpg", "error": None})
+    store.save_result(job["id"], 1, {"filename": "1.jpg", "error": "bad image"})
+
+    saved = store.get_job(job["id"])
+    assert (saved["completed"], saved["failed"]) == (1, 1)
+    assert store.pending_items(job["id"]) == []
+    assert [result["filename"] for result in store.get_results(job["id"])] == ["0.jpg", "1.jpg"]
+
+
+def test_requeue_stale_resumes_remaining_items(store):
+    job = create(store, count=2)
+    store.claim_next()
+    store.save_result(job["id"], 0, {"filename": "0.jpg", "error": None})
+
+    assert store.requeue_stale(stale_seconds=-1, max_attempts=3) == (1, 0)
+
+    assert store.get_job(job["id"])["status"] == JOB_QUEUED
+    assert store.pending_items(job["id"]) == [(1, "1.jpg")]
+
+
+def test_requeue_stale_leaves_fresh_jobs_running(store):
+    job = create(store)
+    store.claim_next()
+
+    assert store.requeue_stale(stale_seconds=300, max_attempts=3) == (0, 0)
+    assert store.get_job(job["id"])["status"] == JOB_RUNNING
+
+
+def test_requeue_stale_fails_jobs_out_of_attempts(store):
+    job = create(store)
+    for _ in range(2):
+        store.claim_next()
+        store.requeue_stale(stale_seconds=-1, max_attempts=3)
+    store.claim_next()
+
+    assert store.requeue_stale(stale_seconds=-1, max_attempts=3) == (0, 1)
+
+    failed = store.get_job(job["id"])
+    assert failed["status"] == JOB_FAILED
+    assert failed["attempts"] == 3
+    assert "3" in failed["error"]
+    assert not os.path.exists(os.path.join(store.images_dir, job["id"]))
+    assert store.claim_next() is None
+
+
+def test_purge_finished_deletes_only_expired_finished_jobs(store):
+    finished = create(store)
+    running = create(store)
+    store.claim_next()
+    store.claim_next()
+    store.finish_job(finished["id"], JOB_COMPLETED)
+
+    assert store.purge_finished(retention_seconds=3600) == 0
+    assert store.purge_finished(retention_seconds=-1) == 1
+
+    assert store.get_job(finished["id"]) is None
+    assert store.get_results(finished["id"]) == []
+    assert store.get_job(running["id"])["status"] == JOB_RUNNING
+
+
+def test_opens_database_without_attempts_column(tmp_path):
+    os.makedirs(tmp_path / "images")
+    conn = sqlite3.connect(tmp_path / "jobs.sqlite3")
+    conn.execute(
+        "CREATE TABLE jobs (id TEXT PRIMARY KEY, status TEXT NOT NULL, params TEXT NOT NULL, "
+        "total INTEGER NOT NULL, completed INTEGER NOT NULL DEFAULT 0, failed INTEGER NOT NULL DEFAULT 0, "
+        "error TEXT, created_at REAL NOT NULL, started_at REAL, finished_at REAL, heartbeat_at REAL)"
+    )
+    conn.execute("INSERT INTO jobs (id, status, params, total, created_at) VALUES ('old', 'queued', '{}', 0, 0)")
+    conn.commit()
+    conn.close()
+
+    store = JobStore(str(tmp_path))
+    claimed = store.claim_next()
+    store.close()
+
+    assert (claimed["id"], claimed["attempts"]) == ("old", 1)
+
+
+def test_runner_fails_job_when_saving_a_result_raises(store, monkeypatch):
+    async def loaded(model_type):
+        return True
+
+    async def run_item(job_id, index, filename, params):
+        return {"filename": filename, "error": None}
+
+    def broken_save(job_id, index, result):
+        raise sqlite3.OperationalError("disk I/O error")
+
+    monkeypatch.setattr(jobs.model_manager, "ensure_loaded_async", loaded)
+    runner = JobRunner(store, workers=1)
+    monkeypatch.setattr(runner, "_run_item", run_item)
+    monkeypatch.setattr(store, "save_result", broken_save)
+    job = create(store)
+
+    async def scenario():
+        runner._changed = asyncio.Event()
+        await runner._run_job(store.claim_next())
+
+    asyncio.run(scenario())
+
+    failed = store.get_job(job["id"])
+    assert failed["status"] == JOB_FAILED
+    assert failed["error"] == "disk I/O error"
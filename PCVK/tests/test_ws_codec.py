@@ -0,0 +1,105 @@
+"""
+Tests for the WebSocket protocol v2 frame codec
+"""
+
+import pytest
+
+from api.services.classification import ws_codec
+
+
+def test_request_round_trip():
+    frame = ws_codec.encode_request(
+        42,
+        b"\xff\xd8jpeg",
+        model_type="efficientnetv2",
+        seg_method="hsv",
+        use_segmentation=False,
+        apply_brightness_contrast=True,
+        return_processed_image=True
+    )
+
+    request = ws_codec.decode_request(frame)
+
+    assert request == ws_codec.PredictRequestFrame(
+        request_id=42,
+        model_type="efficientnetv2",
+        seg_method="hsv",
+        use_segmentation=False,
+        apply_brightness_contrast=True,
+        return_processed_image=True,
+        image_bytes=b"\xff\xd8jpeg"
+    )
+
+
+@pytest.mark.parametrize("model_type", ws_codec.MODEL_CODES)
+@pytest.mark.parametrize("seg_method", ws_codec.SEG_METHOD_CODES)
+def test_request_round_trip_every_code(model_type, seg_method):
+    request = ws_codec.decode_request(ws_codec.encode_request(1, b"x", model_type=model_type, seg_method=seg_method))
+
+    assert (request.model_type, request.seg_method) == (model_type, seg_method)
+
+
+def test_result_round_trip():
+    confidences = [0.5, 0.25, 0.125, 0.0625, 0.0625]
+    frame = ws_codec.encode_result(
+        7, 0, confidences, 12.5, cached=True, processed_image=b"jpeg", escalated=True
+    )
+
+    response = ws_codec.decode_response(frame, class_names=["a", "b", "c", "d", "e"])
+
+    assert response == {
+        "type": "result",
+        "request_id": 7,
+        "class_index": 0,
+        "confidences": confidences,
+        "prediction_time_ms": 12.5,
+        "cached": True,
+        "escalated": True,
+        "processed_image": b"jpeg",
+        "predicted_class": "a",
+        "all_confidences": dict(zip(["a", "b", "c", "d", "e"], confidences)),
+    }
+
+
+def test_live_result_carries_dropped_frames():
+    frame = ws_codec.encode_result(3, 1, [0.0, 1.0], 1.0, dropped_frames=9)
+
+    response = ws_codec.decode_response(frame)
+
+    assert frame[3] == ws_codec.FRAME_LIVE_RESULT
+    assert response["dropped_frames"] == 9
+    assert response["processed_image"] is None
+    assert response["cached"] is False
+
+
+def test_error_round_trip():
+    frame = ws_codec.encode_error(5, ws_codec.ERROR_OVERLOADED, "Server busy, retry in 2 s")
+
+    assert ws_codec.decode_response(frame) == {
+        "type": "error",
+        "request_id": 5,
+        "code": ws_codec.ERROR_OVERLOADED,
+        "message": "Server busy, retry in 2 s",
+    }
+
+
+def _patched(offset: int, value: bytes) -> bytes:
+    """Valid one-byte-image request with the header byte at offset replaced"""
+    frame = ws_codec.encode_request(1, b"x")
+    return frame[:offset] + value + frame[offset + 1:]
+
+
+@pytest.mark.parametrize("frame, code", [
+    (b"PV\x02", ws_codec.ERROR_BAD_FRAME),
+    (_patched(0, b"X"), ws_codec.ERROR_BAD_FRAME),
+    (_patched(2, b"\x01"), ws_codec.ERROR_UNSUPPORTED_VERSION),
+    (_patched(8, b"\xff"), ws_codec.ERROR_INVALID_CONFIG),
+    (_patched(9, b"\xff"), ws_codec.ERROR_INVALID_CONFIG),
+    (ws_codec.encode_request(1, b"xyz")[:-1], ws_codec.ERROR_BAD_FRAME),
+    (ws_codec.encode_request(1, b""), ws_codec.ERROR_INVALID_IMAGE),
+])
+def test_decode_request_rejects_malformed_frames(frame, code):
+    with pytest.raises(ws_codec.ProtocolError) as raised:
+        ws_codec.decode_request(frame)
+
+    assert raised.value.code == code